@@ -0,0 +1,152 @@
+"""
+    Append-only article store.
+
+    Articles are written to a JSONL file (one JSON object per line) as soon as
+    they are scraped, instead of rewriting the whole merck-articles.json at the
+    end of a run. Every record is flushed to the OS right away and the file is
+    fsynced every `fsync_every` records or `fsync_interval` seconds.
+
+    `python article_store.py export` writes the legacy JSON array for consumers
+    such as test.py and json_tree_viewer.py, `python article_store.py import`
+    moves an existing merck-articles.json into the JSONL store and
+    `python article_store.py compact` keeps only the latest record of every link.
+"""
+
+import argparse
+import json
+import os
+import time
+
+from urls import canonicalize
+
+articles_path = './data/merck-articles.jsonl'
+legacy_path = './data/merck-articles.json'
+
+
+class ArticleStore:
+    def __init__(self, path=articles_path, fsync_every=20, fsync_interval=10):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.file = None
+        self.written = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def open(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def append(self, article):
+        self.file.write(json.dumps(article, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.written += 1
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_articles(path=articles_path):
+    """
+        Yields the articles of a JSONL store one at a time.
+        A truncated last line (e.g. after a hard kill) is skipped.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️ Skipping unreadable record on line {line_number} of {path}")
+
+
+def count_articles(path=articles_path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def export_json(path=articles_path, output_file=legacy_path):
+    """
+        Writes the store as the legacy JSON array, one article at a time.
+    """
+    count = 0
+    with open(output_file, "w", encoding="utf-8") as out:
+        out.write("[")
+        for article in iter_articles(path):
+            out.write(",\n" if count else "\n")
+            # Indent the article like json.dump(..., indent=4) would inside the array
+            out.write("    " + json.dumps(article, ensure_ascii=False, indent=4).replace("\n", "\n    "))
+            count += 1
+        out.write("\n]" if count else "]")
+    print(f"✅ Exported {count} articles to {output_file}")
+
+
+def compact(path=articles_path, drop=()):
+    """
+        Rewrites the store with the latest record of every link, in the order
+        the links first appeared. Links in `drop` are left out.
+        Returns the number of articles kept.
+    """
+    drop = set(drop)
+    articles = {}
+    for article in iter_articles(path):
+        link = canonicalize(article["link"])
+        if link not in drop:
+            articles[link] = article
+    temp_path = path + ".tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)  # left over from an interrupted run
+    with ArticleStore(temp_path, fsync_every=1000) as store:
+        for article in articles.values():
+            store.append(article)
+    os.replace(temp_path, path)
+    return len(articles)
+
+
+def import_json(json_file=legacy_path, path=articles_path):
+    """
+        Appends the articles of a legacy JSON array to the store.
+    """
+    with open(json_file, "r", encoding="utf-8") as f:
+        articles = json.load(f)
+    with ArticleStore(path) as store:
+        for article in articles:
+            store.append(article)
+    print(f"✅ Imported {len(articles)} articles from {json_file} into {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the JSONL article store.")
+    parser.add_argument("command", choices=["export", "import", "compact"])
+    parser.add_argument("--store", default=articles_path, help="JSONL article store.")
+    parser.add_argument("--json", default=legacy_path, help="Legacy JSON array file.")
+    args = parser.parse_args()
+    if args.command == "export":
+        export_json(args.store, args.json)
+    elif args.command == "compact":
+        before = count_articles(args.store)
+        print(f"✅ Kept {compact(args.store)} of {before} records in {args.store}")
+    else:
+        import_json(args.json, args.store)
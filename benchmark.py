@@ -0,0 +1,399 @@
+"""
+    Benchmarks for the scraping pipeline.
+
+    extract: compares scraper.element_to_markdown, extraction.extract_markdown and
+             extraction.html_to_markdown on saved article pages (*.html files in --pages,
+             searched recursively, so a fixture corpus works too), along with the
+             section tree layout (extraction.extract_sections, extraction.html_to_sections).
+             Use --record N to first save N pages from content_urls.txt.
+    links:   compares crawler.find_urls with one get_attribute call per anchor on the
+             saved hub pages in --pages.
+    crawl:   runs crawler.crawl against the offline fixture server, with --discover
+             sitemap from the fixture's robots.txt and sitemaps.
+    scrape:  runs scraper.scrape_article over every article of the fixture server.
+    viewer:  runs json_tree_viewer over copies of --source 1, 4, 16... times its
+             size (--sizes), streaming against loading the whole array, and
+             reports time and peak Python memory (tracemalloc) for each size.
+
+    Every browser benchmark reports pages/s, p50/p95 latency per page, browser
+    round trips (IPC calls) per page and peak RSS. Generate a corpus first with
+    `python fixture_server.py generate`.
+"""
+
+import asyncio
+import argparse
+import contextlib
+import glob
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import lxml.html
+from playwright.async_api import async_playwright
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+import crawler
+import scraper
+from extraction import extract_markdown, extract_sections, html_main_content, html_to_markdown, html_to_sections
+from blocking import BlockingPolicy
+from fetcher import Fetcher
+from fixture_server import corpus_path, start_paths, start_server, stop_server
+from corpus import iter_corpus
+from frontier import FileFrontier
+from json_tree_viewer import build_article_structure, save_structure_to_file
+from metrics import CountingProxy
+from rate_limit import RateLimiter
+from scraper import element_to_markdown
+
+main_content_selector = '[data-testid="topic-main-content"]'
+
+
+class RssSampler:
+    """
+        Samples the memory of the browser processes (children of this process)
+        while a benchmark runs. Needs psutil.
+    """
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak = 0
+        self.task = None
+
+    async def run(self):
+        process = psutil.Process()
+        while True:
+            rss = 0
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, rss)
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        if psutil:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return self
+
+    def __exit__(self, *exc):
+        if self.task:
+            self.task.cancel()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def report(name, latencies, calls, elapsed, browser_rss=None):
+    pages = len(latencies)
+    python_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    browser = f"{browser_rss / 2 ** 20:.0f} MB" if browser_rss else "n/a (needs psutil)"
+    print(f"\n{name}")
+    print(f"  pages:          {pages}")
+    print(f"  pages/s:        {pages / elapsed if elapsed else 0:.2f}")
+    print(f"  latency p50:    {1000 * percentile(latencies, 0.5):.1f} ms")
+    print(f"  latency p95:    {1000 * percentile(latencies, 0.95):.1f} ms")
+    print(f"  IPC calls/page: {calls / pages if pages else 0:.1f}")
+    print(f"  peak RSS:       python {python_rss:.0f} MB, browser {browser}")
+
+
+def timed(function, latencies):
+    """
+        Wraps a coroutine function so every call appends its duration to `latencies`.
+    """
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+async def record_pages(page, pages_dir, count):
+    """
+        Saves the HTML of the first `count` content URLs into pages_dir.
+    """
+    os.makedirs(pages_dir, exist_ok=True)
+    with open('./data/content_urls.txt', "r", encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()][:count]
+    for i, url in enumerate(urls):
+        response = await page.goto(url, wait_until="domcontentloaded")
+        if response.status != 200:
+            print(f"⚠️ Skipping {url}: HTTP {response.status}")
+            continue
+        with open(os.path.join(pages_dir, f"page_{i:04d}.html"), "w", encoding="utf-8") as f:
+            f.write(await page.content())
+    print(f"💾 Recorded {len(urls)} pages to {pages_dir}")
+
+
+def article_files(pages_dir):
+    files = sorted(glob.glob(os.path.join(pages_dir, "**", "*.html"), recursive=True))
+    articles = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            if 'data-testid="topic-main-content"' in f.read():
+                articles.append(path)
+    return articles
+
+
+async def benchmark_extract(page, pages_dir, repeat):
+    files = article_files(pages_dir)
+    if not files:
+        print(f"❌ No saved article pages found in {pages_dir}, run with --record first.")
+        return
+
+    extractors = {"element_to_markdown": element_to_markdown, "extract_markdown": extract_markdown,
+                  "extract_sections": lambda element: extract_sections(element, "Title")}
+    static_extractors = {"html_to_markdown": html_to_markdown,
+                         "html_to_sections": lambda element: html_to_sections(element, "Title")}
+    latencies = {name: [] for name in list(extractors) + list(static_extractors)}
+    counters = {name: {"calls": 0} for name in latencies}
+    mismatches = 0
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        await page.set_content(html, wait_until="domcontentloaded")
+        main_content = await page.query_selector(main_content_selector)
+        outputs = {}
+        for name, extractor in extractors.items():
+            element = CountingProxy(main_content, counters[name])
+            for _ in range(repeat):
+                start = time.perf_counter()
+                outputs[name] = await extractor(element)
+                latencies[name].append(time.perf_counter() - start)
+        for name, extractor in static_extractors.items():
+            for _ in range(repeat):
+                start = time.perf_counter()
+                extractor(html_main_content(lxml.html.fromstring(html)))
+                latencies[name].append(time.perf_counter() - start)
+        if outputs["element_to_markdown"] != outputs["extract_markdown"]:
+            mismatches += 1
+            print(f"❌ Output differs for {path}")
+
+    print(f"\nPages: {len(files)}, repeats per page: {repeat}")
+    for name, values in latencies.items():
+        report(name, values, counters[name]["calls"], sum(values))
+    print(f"\nMismatching outputs: {mismatches}")
+
+
+async def find_urls_per_anchor(page):
+    """
+        The previous crawler.find_urls: one round trip per anchor.
+    """
+    links = await page.query_selector_all("#mainContainer a")
+    hrefs = [await link.get_attribute("href") for link in links]
+    return crawler.clean_links(hrefs)
+
+
+async def benchmark_links(page, pages_dir, repeat):
+    files = sorted(glob.glob(os.path.join(pages_dir, "**", "*.html"), recursive=True))
+    hubs = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+        if 'id="mainContainer"' in html and 'data-testid="topic-main-content"' not in html:
+            hubs.append(html)
+    if not hubs:
+        print(f"❌ No saved hub pages found in {pages_dir}.")
+        return
+
+    finders = {"per anchor": find_urls_per_anchor, "crawler.find_urls": crawler.find_urls}
+    latencies = {name: [] for name in finders}
+    counters = {name: {"calls": 0} for name in finders}
+    mismatches = 0
+    for html in hubs:
+        await page.set_content(html, wait_until="domcontentloaded")
+        outputs = {}
+        for name, finder in finders.items():
+            proxy = CountingProxy(page, counters[name])
+            for _ in range(repeat):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(open(os.devnull, "w")):
+                    outputs[name] = await finder(proxy)
+                latencies[name].append(time.perf_counter() - start)
+        if outputs["per anchor"] != outputs["crawler.find_urls"]:
+            mismatches += 1
+
+    print(f"\nHub pages: {len(hubs)}, repeats per page: {repeat}")
+    for name, values in latencies.items():
+        report(name, values, counters[name]["calls"], sum(values))
+    print(f"\nMismatching outputs: {mismatches}")
+
+
+def use_fixture_site(server):
+    """
+        Points the crawler at the fixture server instead of the real site.
+    """
+    crawler.base_url = server.origin + "/"
+    crawler.start_urls = [server.origin + path for path in start_paths]
+
+
+async def benchmark_crawl(page, server, args):
+    use_fixture_site(server)
+    data_dir = tempfile.mkdtemp(prefix="crawl_benchmark_")
+    paths = {name: os.path.join(data_dir, f"{name}.txt") for name in ["visited", "to_explore", "content_urls"]}
+    for path in paths.values():
+        open(path, "w").close()
+    crawler.to_scrape_path = os.path.join(data_dir, "to_scrape.txt")
+    frontier = FileFrontier(crawler.start_urls, paths["visited"], paths["to_explore"], paths["content_urls"])
+    frontier.load()
+
+    latencies = []
+    counter = {"calls": 0}
+    crawler.visit = timed(crawler.visit, latencies)
+    limiter = RateLimiter(rate=args.rate, burst=args.rate, max_rate=args.rate, cooldown=args.cooldown)
+    start = time.perf_counter()
+    with RssSampler() as sampler, contextlib.redirect_stdout(open(os.devnull, "w")):
+        await crawler.crawl(CountingProxy(page, counter), concurrency=args.concurrency,
+                            fetch_mode=args.fetch, limiter=limiter, frontier=frontier, discovery=args.discover)
+    report(f"crawler.crawl ({args.fetch}, {args.discover}, concurrency {args.concurrency})",
+           latencies, counter["calls"], time.perf_counter() - start, sampler.peak)
+    print(f"  content URLs:   {len(frontier.content_urls)}")
+    print(f"  server:         {server.counts}")
+
+
+async def benchmark_scrape(page, server, args):
+    urls = []
+    for path in article_files(args.corpus):
+        relative = os.path.relpath(path, args.corpus)[:-len(".html")]
+        urls.append(f"{server.origin}/{relative}")
+
+    latencies = []
+    counter = {"calls": 0}
+    scraper.scrape_article = timed(scraper.scrape_article, latencies)
+    limiter = RateLimiter(rate=args.rate, burst=args.rate, max_rate=args.rate, cooldown=args.cooldown)
+    fetcher = await Fetcher(args.fetch, max_connections=args.concurrency, limiter=limiter).start()
+    articles = []
+    start = time.perf_counter()
+    try:
+        with RssSampler() as sampler, contextlib.redirect_stdout(open(os.devnull, "w")), \
+                contextlib.redirect_stderr(open(os.devnull, "w")):
+            await scraper.scrape_pool(CountingProxy(page, counter), fetcher, urls, articles,
+                                      set(urls), args.concurrency)
+    except scraper.AccessDenied as e:
+        print(f"❌ Access denied to {e.url}.")
+    finally:
+        await fetcher.close()
+    report(f"scraper.scrape_article ({args.fetch}, concurrency {args.concurrency})",
+           latencies, counter["calls"], time.perf_counter() - start, sampler.peak)
+    print(f"  articles:       {len(articles)}")
+    print(f"  server:         {server.counts}")
+
+
+def save_structure_in_memory(json_file, output_file):
+    """
+        The viewer before streaming: the whole array is loaded and every line
+        joined before writing. Kept as the reference for benchmark_viewer.
+    """
+    with open(json_file, "r", encoding="utf-8") as f:
+        articles = json.load(f)
+    all_lines = []
+    for article in articles:
+        all_lines.extend(build_article_structure(article))
+        all_lines.append("")
+    with open(output_file, "w", encoding="utf-8") as out:
+        out.write("\n".join(all_lines))
+
+
+def write_scaled_corpus(source, path, copies):
+    """
+        Writes `copies` copies of the articles of `source` as a JSON array, one article at a time.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for copy in range(copies):
+            for article in iter_corpus(source):
+                article["link"] = f"{article['link']}?copy={copy}"
+                out.write(",\n" if count else "\n")
+                out.write(json.dumps(article, ensure_ascii=False, indent=2))
+                count += 1
+        out.write("\n]")
+    return count
+
+
+def benchmark_viewer(source, sizes):
+    print(f"\njson_tree_viewer on copies of {source}")
+    print(f"  {'articles':>9} {'MB':>7}   {'json.load':>20}   {'streaming':>20}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.json")
+        output = os.path.join(directory, "structure.txt")
+        for copies in sizes:
+            count = write_scaled_corpus(source, path, copies)
+            results = []
+            for function in [save_structure_in_memory, save_structure_to_file]:
+                tracemalloc.start()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(None):
+                    function(path, output)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results.append(f"{elapsed:7.2f} s {peak / 2 ** 20:7.1f} MB")
+            print(f"  {count:>9} {os.path.getsize(path) / 2 ** 20:>7.1f}   {results[0]:>20}   {results[1]:>20}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the scraping pipeline.")
+    parser.add_argument("benchmark", choices=["extract", "links", "crawl", "scrape", "viewer"])
+    parser.add_argument("--pages", default="./data/pages", help="Directory with saved article pages.")
+    parser.add_argument("--record", type=int, default=0, help="Save this many live pages before benchmarking.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--corpus", default=corpus_path, help="Fixture corpus for crawl and scrape.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--fetch", choices=["auto", "http", "browser"], default="browser")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Requests per second allowed by the limiter.")
+    parser.add_argument("--cooldown", type=float, default=0.5, help="Limiter pause after an injected 403.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixture server latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--forbid-rate", type=float, default=0.0, help="Share of requests answered with 403.")
+    parser.add_argument("--discover", choices=["bfs", "sitemap"], default="bfs", help="Crawl discovery mode.")
+    parser.add_argument("--block", choices=["on", "off", "observe"], default="on",
+                        help="Request blocking in the browser, compare on and observe for the savings.")
+    parser.add_argument("--source", default="./data/dog-owners.json", help="Articles copied for the viewer.")
+    parser.add_argument("--sizes", default="1,4,16,64", help="Copies of --source per viewer run.")
+    args = parser.parse_args()
+
+    if args.benchmark == "viewer":
+        benchmark_viewer(args.source, [int(size) for size in args.sizes.split(",")])
+        return
+
+    playwright = await async_playwright().start()
+    browser = await playwright.chromium.launch(headless=True)
+    context = await browser.new_context(viewport={"width": 1200, "height": 800})
+    # The fixture server is the first-party site, localhost plays a third party
+    policy = BlockingPolicy(args.block, allowed_domains=["127.0.0.1"])
+    await policy.install(context)
+    page = await context.new_page()
+    server = None
+    try:
+        if args.benchmark == "extract":
+            if args.record:
+                await record_pages(page, args.pages, args.record)
+            await benchmark_extract(page, args.pages, args.repeat)
+        elif args.benchmark == "links":
+            await benchmark_links(page, args.pages, args.repeat)
+        else:
+            server = start_server(args.corpus, latency=args.latency, jitter=args.jitter,
+                                  forbid_rate=args.forbid_rate)
+            if args.benchmark == "crawl":
+                await benchmark_crawl(page, server, args)
+            else:
+                await benchmark_scrape(page, server, args)
+            policy.report()
+    finally:
+        if server:
+            stop_server(server)
+        await browser.close()
+        await playwright.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
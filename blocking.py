@@ -0,0 +1,94 @@
+"""
+    Request blocking for the browser.
+
+    A BlockingPolicy is installed once per browser context, so every page of
+    the crawler and scraper gets it. It aborts
+    - every request to a host outside `allowed_domains` (ads, analytics, tag managers),
+    - requests of the listed resource types (images, styles, fonts, media, beacons),
+    - requests whose URL matches one of `patterns` (first-party tracking endpoints).
+    Main-frame navigations are never blocked.
+
+    Mode "observe" blocks nothing but measures the requests and bytes that
+    blocking would save, to compare with a run in mode "on".
+"""
+
+import re
+from urllib.parse import urlparse
+
+default_resource_types = ["image", "stylesheet", "font", "media", "ping", "texttrack", "manifest"]
+default_allowed_domains = ["merckvetmanual.com", "msdvetmanual.com"]
+default_patterns = [r"google-analytics", r"googletagmanager", r"doubleclick", r"/collect\?",
+                    r"analytics", r"beacon", r"hotjar", r"adobedtm", r"onetrust", r"cookielaw"]
+
+
+class BlockingPolicy:
+    def __init__(self, mode="on", resource_types=None, allowed_domains=None, patterns=None):
+        self.mode = mode
+        self.resource_types = set(default_resource_types if resource_types is None else resource_types)
+        self.allowed_domains = list(default_allowed_domains if allowed_domains is None else allowed_domains)
+        self.patterns = [re.compile(p) for p in (default_patterns if patterns is None else patterns)]
+        self.counts = {"requests": 0, "blocked": 0, "bytes": 0, "bytes_blockable": 0, "reasons": {}}
+
+    def is_allowed_host(self, host):
+        return any(host == domain or host.endswith("." + domain) for domain in self.allowed_domains)
+
+    def block_reason(self, request):
+        """
+            Returns why the request should be blocked, or None to let it through.
+        """
+        parsed = urlparse(request.url)
+        if parsed.scheme not in ["http", "https"]:
+            return None
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            return None
+        if not self.is_allowed_host(parsed.hostname or ""):
+            return "third-party"
+        if request.resource_type in self.resource_types:
+            return request.resource_type
+        if any(pattern.search(request.url) for pattern in self.patterns):
+            return "pattern"
+        return None
+
+    async def handle(self, route, request):
+        self.counts["requests"] += 1
+        reason = self.block_reason(request)
+        if reason:
+            self.counts["reasons"][reason] = self.counts["reasons"].get(reason, 0) + 1
+        if reason and self.mode == "on":
+            self.counts["blocked"] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def on_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return  # the page went away before the sizes could be read
+        size = sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        self.counts["bytes"] += size
+        if self.block_reason(request):
+            self.counts["bytes_blockable"] += size
+
+    async def install(self, context):
+        """
+            Installs the policy on a browser context. Byte accounting costs one
+            extra round trip per request, so it is only done in observe mode.
+        """
+        if self.mode == "off":
+            return
+        await context.route("**/*", self.handle)
+        if self.mode == "observe":
+            context.on("requestfinished", self.on_request_finished)
+
+    def report(self):
+        if self.mode == "off":
+            return
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(self.counts["reasons"].items()))
+        if self.mode == "on":
+            print(f"🚫 Blocked {self.counts['blocked']} of {self.counts['requests']} browser requests "
+                  f"({reasons or 'none'}).")
+        else:
+            print(f"👀 Blocking would save {sum(self.counts['reasons'].values())} of {self.counts['requests']} "
+                  f"browser requests ({reasons or 'none'}) and {self.counts['bytes_blockable'] / 2 ** 20:.1f} "
+                  f"of {self.counts['bytes'] / 2 ** 20:.1f} MB downloaded.")
@@ -0,0 +1,179 @@
+"""
+    Browser lifecycle for long crawl and scrape runs.
+
+    A single Chromium page kept for hours grows steadily in memory, and a
+    renderer crash used to end the run. The BrowserManager hands out pages and
+    replaces them between URLs (see refresh):
+    - a page is recycled after `recycle_every` navigations,
+    - the context is recycled after `context_every` navigations in total,
+    - the whole browser is restarted when the browser processes use more than
+      `memory_limit` MB (measured with psutil, if installed),
+    - a crashed page or browser is replaced and the caller retries its URL.
+    Old contexts and browsers are retired rather than closed right away and
+    closed once their last page is returned, so a recycle never interrupts a
+    navigation of another worker.
+"""
+
+import asyncio
+
+from playwright.async_api import async_playwright
+
+from blocking import BlockingPolicy
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class BrowserManager:
+    def __init__(self, headless=True, policy=None, recycle_every=200, context_every=2000,
+                 memory_limit=2048, memory_check_every=20):
+        self.headless = headless
+        self.policy = policy or BlockingPolicy()
+        self.recycle_every = recycle_every
+        self.context_every = context_every
+        self.memory_limit = memory_limit if psutil else None
+        self.memory_check_every = memory_check_every
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.pages = {}  # page -> {"context", "browser", "navigations", "crashed"}
+        self.contexts = {}  # context -> pages still open in it
+        self.navigations = 0
+        self.context_navigations = 0
+        self.memory_checked = 0
+        self.lock = asyncio.Lock()  # one worker at a time launches or recycles
+        self.counts = {"launches": 0, "contexts": 0, "page_recycles": 0, "context_recycles": 0,
+                       "memory_restarts": 0, "crashes": 0}
+        if memory_limit and psutil is None:
+            print("⚠️ psutil not installed, the browser memory is not monitored.")
+
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        await self.launch()
+        return self
+
+    async def launch(self):
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        self.counts["launches"] += 1
+        await self.new_context()
+
+    async def new_context(self):
+        self.context = await self.browser.new_context(viewport={"width": 1200, "height": 800})
+        # Block images, styles, fonts, media and third-party scripts for every page
+        await self.policy.install(self.context)
+        self.contexts[self.context] = set()
+        self.context_navigations = 0
+        self.counts["contexts"] += 1
+
+    async def new_page(self):
+        async with self.lock:
+            if not self.browser.is_connected():
+                print("💥 The browser is gone, launching a new one.")
+                await self.launch()
+        page = await self.context.new_page()
+        info = {"context": self.context, "browser": self.browser, "navigations": 0, "crashed": False}
+        self.pages[page] = info
+        self.contexts[self.context].add(page)
+
+        def on_load(_):
+            info["navigations"] += 1
+            self.navigations += 1
+            self.context_navigations += 1
+
+        def on_crash(_):
+            info["crashed"] = True
+
+        page.on("domcontentloaded", on_load)
+        page.on("crash", on_crash)
+        return page
+
+    def is_crashed(self, page):
+        info = self.pages[page]
+        return info["crashed"] or page.is_closed() or not info["browser"].is_connected()
+
+    async def refresh(self, page):
+        """
+            Called by a worker between URLs. Returns (page, crashed): the page to
+            use next, a new one if the old one was due for recycling, and whether
+            the old one crashed, in which case its last URL should be retried.
+        """
+        info = self.pages[page]
+        crashed = self.is_crashed(page)
+        if crashed:
+            self.counts["crashes"] += 1
+            print("💥 The browser page crashed, starting a new one.")
+        async with self.lock:
+            if self.memory_limit and self.navigations - self.memory_checked >= self.memory_check_every:
+                self.memory_checked = self.navigations
+                if self.browser_memory() > self.memory_limit:
+                    print(f"♻️ Browser memory above {self.memory_limit} MB, restarting the browser.")
+                    self.counts["memory_restarts"] += 1
+                    await self.launch()
+            if self.context_navigations >= self.context_every:
+                self.counts["context_recycles"] += 1
+                await self.new_context()
+
+        if not crashed and info["context"] is self.context and info["navigations"] < self.recycle_every:
+            return page, False
+        if not crashed and info["context"] is self.context:
+            self.counts["page_recycles"] += 1
+        new_page = await self.new_page()
+        await self.release(page)
+        return new_page, crashed
+
+    async def release(self, page):
+        """
+            Closes a page, and its context and browser if they are retired and now unused.
+        """
+        info = self.pages.pop(page, None)
+        if info is None:
+            return
+        context, browser = info["context"], info["browser"]
+        try:
+            await page.close()
+        except Exception:
+            pass  # crashed or already gone with its browser
+        self.contexts[context].discard(page)
+        if context is not self.context and not self.contexts[context]:
+            del self.contexts[context]
+            try:
+                await context.close()
+            except Exception:
+                pass
+        if browser is not self.browser and not any(other["browser"] is browser for other in self.pages.values()):
+            try:
+                await browser.close()
+            except Exception:
+                pass
+
+    def browser_memory(self):
+        """
+            Returns the RSS of all browser processes (children of this process) in MB.
+        """
+        rss = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss / 2 ** 20
+
+    async def close(self):
+        for page in list(self.pages):
+            await self.release(page)
+        try:
+            await self.browser.close()
+        except Exception as e:
+            print(f"⚠️ Error while closing browser: {e}")
+        try:
+            await self.playwright.stop()
+        except Exception as e:
+            print(f"⚠️ Error while stopping playwright: {e}")
+
+    def report(self):
+        counts = self.counts
+        print(f"🧭 Browser: {counts['launches']} launches, {counts['contexts']} contexts, "
+              f"{counts['page_recycles']} page recycles, {counts['context_recycles']} context recycles, "
+              f"{counts['memory_restarts']} memory restarts, {counts['crashes']} crashes recovered.")
@@ -0,0 +1,91 @@
+"""
+    Crash-safe progress saving.
+
+    Progress files are replaced atomically (temp file + fsync + rename), so a
+    kill during a save leaves the previous version intact. A Checkpointer saves
+    every `every_pages` finished pages or `every_seconds` seconds, so a hard
+    kill loses at most one interval of work. SIGINT/SIGTERM set a stop event
+    the workers check between pages; a second signal cancels the run at once,
+    which still runs the final save.
+"""
+
+import asyncio
+import os
+import signal
+import tempfile
+import time
+
+
+def atomic_write(path, lines):
+    """
+        Writes one line per item to `path`, replacing the old file atomically.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class Checkpointer:
+    def __init__(self, save, every_pages=50, every_seconds=60):
+        self.save = save
+        self.every_pages = every_pages
+        self.every_seconds = every_seconds
+        self.pages = 0
+        self.last_save = time.monotonic()
+        self.saves = 0
+
+    def page_done(self):
+        self.pages += 1
+        if self.pages >= self.every_pages or time.monotonic() - self.last_save >= self.every_seconds:
+            self.checkpoint()
+
+    def checkpoint(self):
+        try:
+            self.save()
+        except Exception as e:
+            print(f"⚠️ Checkpoint failed: {e}")
+            return
+        self.saves += 1
+        self.pages = 0
+        self.last_save = time.monotonic()
+
+
+def install_stop_handlers(stop):
+    """
+        Makes SIGINT/SIGTERM set `stop` so the workers drain the pages in flight.
+        A second signal cancels the current task.
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+
+    def on_signal(name):
+        if stop.is_set():
+            print(f"🛑 {name} received again, stopping now.")
+            task.cancel()
+            return
+        print(f"🛑 {name} received, finishing the pages in flight and saving progress...")
+        stop.set()
+
+    for sig in [signal.SIGINT, signal.SIGTERM]:
+        try:
+            loop.add_signal_handler(sig, on_signal, sig.name)
+        except (NotImplementedError, RuntimeError):
+            pass  # not supported on this platform or outside the main thread
+
+
+def remove_stop_handlers():
+    loop = asyncio.get_running_loop()
+    for sig in [signal.SIGINT, signal.SIGTERM]:
+        try:
+            loop.remove_signal_handler(sig)
+        except (NotImplementedError, RuntimeError):
+            pass
@@ -0,0 +1,384 @@
+"""
+    Read-optimized article corpus.
+
+    The JSON array files (merck-articles.json, data/dog-owners.json) have to be
+    parsed in full to count the articles or to find one of them. A corpus file
+    (.corpus) holds the same articles as length-prefixed records:
+
+        header   8-byte magic, 1-byte codec, 3 padding bytes, 4-byte record count
+        record   4-byte length, then the article as JSON, or a zstd / gzip frame of it
+
+    Next to it, <name>.corpus.idx maps every canonical URL to the offset of its
+    record: a header (magic, entry count) and 16-byte entries (8-byte blake2b
+    key of the URL, 8-byte offset) sorted by key, so a lookup is a binary
+    search. All integers are little endian.
+
+    Corpus reads both through mmap: the count comes from the header, get(url)
+    decodes the one record it finds, iteration decodes one record at a time.
+    The page cache files of the OS are shared by every reader, nothing is
+    loaded up front.
+
+    iter_corpus() and count() read any of the formats: .corpus, the JSONL store
+    and JSON arrays, which are parsed one article at a time.
+
+    python corpus.py convert data/dog-owners.json [--compress]   writes data/dog-owners.corpus
+    python corpus.py count data/dog-owners.corpus
+    python corpus.py get data/dog-owners.corpus URL
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+from article_store import count_articles, iter_articles
+from urls import canonicalize
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+corpus_magic = b"MVMCORP1"
+index_magic = b"MVMINDX1"
+header = struct.Struct("<8sB3xI")
+index_header = struct.Struct("<8sI4x")
+record_length = struct.Struct("<I")
+index_entry = struct.Struct("<QQ")
+
+codecs = {"json": 0, "zst": 1, "gz": 2}
+codec_names = {number: name for name, number in codecs.items()}
+
+
+def url_key(url):
+    return int.from_bytes(hashlib.blake2b(canonicalize(url).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def encode(article, codec, compressor=None):
+    data = json.dumps(article, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if codec == "zst":
+        return compressor.compress(data)
+    if codec == "gz":
+        return gzip.compress(data, compresslevel=6)
+    return data
+
+
+def decode(data, codec, decompressor=None):
+    if codec == "zst":
+        data = decompressor.decompress(data)
+    elif codec == "gz":
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def default_codec(compress):
+    """
+        The codec for new corpora: zstd if installed, gzip otherwise, or no compression.
+    """
+    if not compress:
+        return "json"
+    return "zst" if zstandard is not None else "gz"
+
+
+class CorpusWriter:
+    """
+        Writes a corpus and its index. Both are written to temporary files
+        and renamed on close, a reader never sees a half-written corpus.
+        A link appended twice keeps its last record in the index.
+    """
+    def __init__(self, path, codec="json"):
+        if codec == "zst" and zstandard is None:
+            raise RuntimeError("zstd compression needs the zstandard package")
+        self.path = path
+        self.codec = codec
+        self.compressor = zstandard.ZstdCompressor(level=9) if codec == "zst" else None
+        self.file = None
+        self.offsets = {}  # url key -> offset of the last record
+        self.count = 0
+
+    def open(self):
+        self.file = open(self.path + ".tmp", "wb")
+        self.file.write(header.pack(corpus_magic, codecs[self.codec], 0))
+        return self
+
+    def append(self, article):
+        data = encode(article, self.codec, self.compressor)
+        self.offsets[url_key(article["link"])] = self.file.tell()
+        self.file.write(record_length.pack(len(data)))
+        self.file.write(data)
+        self.count += 1
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.seek(0)
+        self.file.write(header.pack(corpus_magic, codecs[self.codec], self.count))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        write_index(index_path(self.path), self.offsets)
+        os.replace(self.path + ".tmp", self.path)
+
+    def discard(self):
+        """
+            Drops the records written so far, the existing corpus stays as it was.
+        """
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        os.remove(self.path + ".tmp")
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def write_index(path, offsets):
+    with open(path + ".tmp", "wb") as f:
+        f.write(index_header.pack(index_magic, len(offsets)))
+        for key in sorted(offsets):
+            f.write(index_entry.pack(key, offsets[key]))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class Corpus:
+    """
+        Memory-mapped reader of a corpus file and its index.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.codec = None
+        self.count = 0
+        self.data = None
+        self.index = None
+        self.index_count = 0
+        self.decompressor = None
+
+    def open(self):
+        with open(self.path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, codec, self.count = header.unpack_from(self.data, 0)
+        if magic != corpus_magic:
+            raise ValueError(f"{self.path} is not a corpus file")
+        self.codec = codec_names[codec]
+        if self.codec == "zst":
+            if zstandard is None:
+                raise RuntimeError(f"{self.path} is zstd compressed but zstandard is not installed")
+            self.decompressor = zstandard.ZstdDecompressor()
+        if os.path.exists(index_path(self.path)):
+            with open(index_path(self.path), "rb") as f:
+                self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.index_count = index_header.unpack_from(self.index, 0)
+            if magic != index_magic:
+                raise ValueError(f"{index_path(self.path)} is not a corpus index")
+        return self
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def offsets(self):
+        """
+            Yields the offset of every record, without decoding any.
+        """
+        offset = header.size
+        for _ in range(self.count):
+            yield offset
+            offset += record_length.size + record_length.unpack_from(self.data, offset)[0]
+
+    def read(self, offset):
+        """
+            Returns the article of the record at `offset`.
+        """
+        (length,) = record_length.unpack_from(self.data, offset)
+        start = offset + record_length.size
+        return decode(self.data[start:start + length], self.codec, self.decompressor)
+
+    def __iter__(self):
+        for offset in self.offsets():
+            yield self.read(offset)
+
+    def find(self, key):
+        """
+            Returns the offsets of the index entries with `key`, by binary search.
+        """
+        low, high = 0, self.index_count
+        while low < high:
+            middle = (low + high) // 2
+            if index_entry.unpack_from(self.index, index_header.size + middle * index_entry.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        offsets = []
+        while low < self.index_count:
+            entry_key, offset = index_entry.unpack_from(self.index, index_header.size + low * index_entry.size)
+            if entry_key != key:
+                break
+            offsets.append(offset)
+            low += 1
+        return offsets
+
+    def get(self, url):
+        """
+            Returns the article of `url`, or None. Without an index the corpus is scanned.
+        """
+        url = canonicalize(url)
+        offsets = self.find(url_key(url)) if self.index is not None else self.offsets()
+        for offset in offsets:
+            article = self.read(offset)
+            # Another URL with the same key is possible, however unlikely
+            if canonicalize(article["link"]) == url:
+                return article
+        return None
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+
+def iter_json_array(path, chunk_size=2 ** 20):
+    """
+        Yields the elements of a JSON array file one at a time, reading
+        `chunk_size` characters at a time instead of the whole file.
+        The elements must be objects or arrays, as in the article files.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not hold a JSON array")
+        position = 1
+        eof = False
+        while True:
+            # Skip the separators up to the next element
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                buffer, position = f.read(chunk_size), 0
+                eof = not buffer
+            if position >= len(buffer):
+                raise ValueError(f"{path} ends before the end of the array")
+            if buffer[position] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The element goes on in the next chunk
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield element
+            position = end
+            if position > chunk_size:
+                buffer, position = buffer[position:], 0
+
+
+def iter_corpus(path):
+    """
+        Yields the articles of a .corpus file, a JSONL store or a JSON array file one at a time.
+    """
+    if path.endswith(".corpus"):
+        with Corpus(path) as corpus:
+            yield from corpus
+    elif path.endswith(".jsonl"):
+        yield from iter_articles(path)
+    else:
+        yield from iter_json_array(path)
+
+
+def count(path):
+    """
+        Returns the number of articles of a .corpus file (from its header), a JSONL store or a JSON array file.
+    """
+    if path.endswith(".corpus"):
+        with Corpus(path) as corpus:
+            return len(corpus)
+    if path.endswith(".jsonl"):
+        return count_articles(path)
+    return sum(1 for _ in iter_json_array(path))
+
+
+def convert(source, output=None, codec="json"):
+    """
+        Writes the articles of a JSON array file or a JSONL store to a corpus
+        file and its index, by default next to the source with the .corpus extension.
+    """
+    output = output or os.path.splitext(source)[0] + ".corpus"
+    with CorpusWriter(output, codec) as writer:
+        for article in iter_corpus(source):
+            writer.append(article)
+    size = os.path.getsize(output)
+    print(f"✅ Converted {writer.count} articles from {source} to {output} "
+          f"({codec}, {size / 2 ** 20:.1f} MB, {len(writer.offsets)} URLs indexed).")
+    return output
+
+
+def reindex(path):
+    """
+        Rebuilds the index of a corpus file.
+    """
+    with Corpus(path) as corpus:
+        offsets = {}
+        for offset in corpus.offsets():
+            offsets[url_key(corpus.read(offset)["link"])] = offset
+    write_index(index_path(path), offsets)
+    print(f"✅ Indexed {len(offsets)} URLs of {path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert, count and query article corpora.")
+    parser.add_argument("command", choices=["convert", "count", "get", "index"])
+    parser.add_argument("path", help="Corpus, JSONL store or JSON array file.")
+    parser.add_argument("url", nargs="?", help="get: the article to show.")
+    parser.add_argument("--output", default=None, help="convert: the corpus file, <source>.corpus by default.")
+    parser.add_argument("--compress", action="store_true",
+                        help="convert: compress every record (zstd if installed, gzip otherwise).")
+    args = parser.parse_args()
+    if args.command == "convert":
+        convert(args.path, args.output, default_codec(args.compress))
+    elif args.command == "count":
+        print(f"Number of articles in {args.path}: {count(args.path)}")
+    elif args.command == "index":
+        reindex(args.path)
+    else:
+        if not args.url:
+            parser.error("get needs a URL")
+        with Corpus(args.path) as corpus:
+            article = corpus.get(args.url)
+        if article is None:
+            print(f"❌ {args.url} is not in {args.path}")
+        else:
+            print(json.dumps(article, ensure_ascii=False, indent=4))
@@ -1,17 +1,24 @@
 import asyncio
-from playwright.async_api import async_playwright
-import sys, os
-from urllib.parse import urlparse, urlunparse, urljoin
-
-async def init_browser(headless=True):
-    playwright = await async_playwright().start()
-    browser = await playwright.chromium.launch(headless=headless)
-    context = await browser.new_context(viewport={"width": 1200, "height": 800})
-    page = await context.new_page()
-    return playwright, browser, page
-
-
-from urllib.parse import urlparse, urlunparse, urljoin
+import argparse
+import logging
+from urllib.parse import urlparse, urljoin
+from urls import canonicalize, same_site
+from frontier import FileFrontier, SqliteFrontier
+from fetcher import Fetcher, static_hrefs
+from extraction import extract_article, layouts
+from article_store import ArticleStore, articles_path, compact
+from freshness import FreshnessIndex
+from sitemap import discover, is_article_url, section
+from url_classifier import train_from_files
+from browser_manager import BrowserManager
+from rate_limit import RateLimiter, is_throttled, positive_rate
+from blocking import BlockingPolicy
+from checkpoint import Checkpointer, install_stop_handlers, remove_stop_handlers
+from page_cache import PageCache, cache_path
+import metrics
+from metrics import count_ipc, note, stage, traced
+from logger import log_levels, reporting, setup_logging, stop_logging
+from shards import shard_path
 
 base_url = "https://www.merckvetmanual.com/"
 
@@ -21,12 +28,16 @@ start_urls = ['https://www.merckvetmanual.com/resourcespages/pet-owners-overview
 paths_to_skip = ['/resource', '/authors', '/reference-values-and-conversion-tables/reference-guides', 
                  '/pages-with-widgets/quizzes','/resourcespages/about', '/resourcespages/glossary']
 
-sleep_time = 10000 
-consecutive_requests = 100
+# URLs left for scraper.py
+to_scrape_path = './data/to_scrape.txt'
+
+# Attempts per URL while the site answers 403, the rate limiter backs off in between
+max_attempts = 3
+
+log = logging.getLogger("crawler")
 
 
 """ TODO: 
-- add logic to log all prints in a separate file, 
 - check why this page: https://www.merckvetmanual.com/poultry/avian-influenza-in-poultry-and-wild-birds/avian-influenza-in-poultry-and-wild-birds
   is being being skipped in find_urls function
 """
@@ -40,23 +51,37 @@ async def find_urls(page):
     Finds all internal article links on the page and returns a list of unique relative URLs.
     Filters out external links and removes fragment identifiers.
     """
-    links = await page.query_selector_all("#mainContainer a")
+    # Collect every href in one round trip, filtering happens in clean_links
+    hrefs = await page.eval_on_selector_all(
+        "#mainContainer a", "(links) => links.map((link) => link.getAttribute('href'))"
+    )
+    return clean_links(hrefs)
+
+
+def clean_links(hrefs):
+    """
+    Turns raw hrefs into unique canonical URLs (see urls.canonicalize), preserving their order.
+    Skips empty, external and irrelevant links and removes fragment identifiers and queries.
+    """
     seen = set()
     unique_hrefs = []
 
-    for link in links:
-        href = await link.get_attribute("href")
-        if (not href or (not href.startswith("/") and not href.startswith(base_url))
-                        or any(href.startswith(skip_path) for skip_path in paths_to_skip)):
-            print(f"❌ Skipping link: {href}")
-            continue  # Skip empty, external and irrelevant links
+    for href in hrefs:
+        if not href:
+            log.debug(f"❌ Skipping link: {href}")
+            continue  # Skip empty links
 
         # Convert to absolute URL
         full_url = urljoin(base_url, href)
+        if not same_site(full_url, base_url):
+            log.debug(f"❌ Skipping link: {href}")
+            continue  # Skip external links
 
-        # Remove fragment identifiers (e.g., #section)
-        parsed = urlparse(full_url)
-        clean_url = urlunparse(parsed._replace(fragment=""))
+        # Remove fragment identifiers (e.g., #section), queries, host variants etc.
+        clean_url = canonicalize(full_url)
+        if any(urlparse(clean_url).path.startswith(skip_path) for skip_path in paths_to_skip):
+            log.debug(f"❌ Skipping link: {href}")
+            continue  # Skip irrelevant links
 
         # Deduplicate while preserving order
         if clean_url not in seen:
@@ -66,87 +91,421 @@ async def find_urls(page):
     return unique_hrefs
 
 
+class CrawlSession:
+    """
+        State shared by the crawl workers of one run.
+        `articles` is the ArticleStore when crawling and scraping in one pass, otherwise None.
+    """
+    def __init__(self, frontier, fetcher, articles=None):
+        self.frontier = frontier
+        self.fetcher = fetcher
+        self.articles = articles
+        self.scrape_failed = []
+        self.scrape_failed_saved = 0
+        self.changed = asyncio.Event()
+        self.stop = asyncio.Event()
+        self.checkpointer = None
+        self.covered_sections = set()  # sections listed in the sitemap, not crawled
+        self.classifier = None
+        self.classify_threshold = 0.95
+        self.routed = []  # predicted articles recorded without loading them
+        self.routed_saved = 0
+        self.manager = None  # browser_manager.BrowserManager that recycles the pages, if any
+        self.retries = {}  # URL -> retries after a browser crash
+        self.layout = "markdown"  # shape of the scraped article content, see extraction.layouts
+        self.to_scrape_path = to_scrape_path
+
+    def checkpoint(self):
+        """
+            Saves the frontier, the URLs left for scraper.py and, in one-pass mode, the articles.
+        """
+        self.frontier.save()
+        if self.articles is not None:
+            self.articles.sync()
+        with open(self.to_scrape_path, "a", encoding="utf-8") as f:
+            for url in self.scrape_failed[self.scrape_failed_saved:] + self.routed[self.routed_saved:]:
+                f.write(url + "\n")
+        self.scrape_failed_saved = len(self.scrape_failed)
+        self.routed_saved = len(self.routed)
 
-async def crawl(page):
-
-    # Retrieve visited and to_explore URLs from files
-    with open('./data/visited.txt', "r", encoding="utf-8") as f:
-        visited = set(line.strip() for line in f if line.strip())
-    with open('./data/to_explore.txt', "r", encoding="utf-8") as f:
-        if os.path.getsize('./data/to_explore.txt') == 0:
-            to_explore = set(start_urls)
-        else: 
-            to_explore = set(line.strip() for line in f if line.strip())
-    print(f"Urls to explore: {len(to_explore)}")
-    print(f"Urls already visited: {len(visited)}")
-    with open('./data/content_urls.txt', 'r', encoding='utf-8') as f:
-        num_lines = sum(1 for _ in f)
-    print(f"Number of Content Urls: {num_lines}")
-    content_urls = []
-    request_count = 0
-    try: 
-        while to_explore:
-            print(f"Number of URLs to explore: {len(to_explore)}")
-            current_url = to_explore.pop()
-            if current_url in visited:
-                continue
-
-            print(f"\nVisiting: {current_url}")
-            try:
-                response = await page.goto(current_url, wait_until="domcontentloaded")
-            except Exception as e:
-                print(f"❌ Failed to load {current_url}: {e}")
-                continue
-            if response.status == 403: 
-                print(f"HTTP error 403, requests are being blocked, terminating script for now.")
-                to_explore.add(current_url)
-                raise AccessDenied(current_url)
-            
-            request_count += 1
-            if (request_count % consecutive_requests) == 0:
-                print(f"✅ Requests made: {request_count}, sleeping for {sleep_time} ms")
-                await asyncio.sleep(sleep_time / 1000)  # Convert to seconds
-
-            main_content = await page.query_selector('[data-testid="topic-main-content"]')
-            if main_content:
-                print(f"✅ Content found at: {current_url}")
-                content_urls.append(current_url)
-                continue
-
-            print(f"🔍 No main content found, searching for more links on {current_url}...")
+
+async def visit(page, session, current_url):
+    """
+        Loads one URL and records the outcome in the frontier: content pages are
+        stored as content URLs (and scraped right away in one-pass mode), other
+        pages are searched for more links.
+        Raises AccessDenied on a 403 after putting the URL back into the queue.
+        403, 429 and 5xx answers are retried while the rate limiter backs off;
+        a URL still answering 429 goes back into the queue, any other error
+        marks it failed. Neither is searched for links or marked visited.
+    """
+    frontier = session.frontier
+    log.info(f"Visiting: {current_url}", extra={"url": current_url})
+    try:
+        for attempt in range(1, max_attempts + 1):
+            result = await session.fetcher.fetch(current_url, page)
+            if not is_throttled(result.status):
+                break
+            log.warning(f"HTTP error {result.status}, requests are being throttled "
+                        f"(attempt {attempt}/{max_attempts}).", extra={"url": current_url})
+    except Exception as e:
+        log.warning(f"❌ Failed to load {current_url}: {e}", extra={"url": current_url})
+        note(outcome="failed")
+        frontier.mark_failed(current_url)
+        return
+    if result.status == 403:
+        log.error("HTTP error 403, requests are being blocked, terminating script for now.",
+                  extra={"url": current_url})
+        note(outcome="denied")
+        frontier.release(current_url)
+        raise AccessDenied(current_url)
+    if result.status == 429:
+        # The limiter keeps the host paused, the URL is fetched again afterwards
+        log.warning("HTTP error 429, putting the URL back into the queue.", extra={"url": current_url})
+        note(outcome="throttled")
+        frontier.release(current_url)
+        return
+    if result.status != 200:
+        log.warning(f"❌ HTTP error {result.status} at {current_url}.", extra={"url": current_url})
+        note(outcome="failed")
+        frontier.mark_failed(current_url)
+        return
+
+    with stage("detect"):
+        has_content = await result.has_content()
+    if has_content:
+        log.info(f"✅ Content found at: {current_url}", extra={"url": current_url})
+        note(outcome="content")
+        if session.articles is not None:
+            await scrape_loaded_page(session, result)
+        frontier.mark_content(current_url)
+        return
+
+    log.info(f"🔍 No main content found, searching for more links on {current_url}...", extra={"url": current_url})
+    note(outcome="hub")
+    with stage("links"):
+        if result.engine == "http":
+            found_urls = clean_links(static_hrefs(result.tree)) if result.tree is not None else []
+        else:
             found_urls = await find_urls(page)
-            # add new URLS only if they are not in visited
-            unexplored = [url for url in found_urls if url not in visited]
-            print(f"✅ Found {len(unexplored)} new URLs to explore.")
-            to_explore.update(unexplored)
-            visited.add(current_url)
+    if session.covered_sections:
+        # Sections listed in the sitemap are not crawled again
+        found_urls = [url for url in found_urls if section(url) not in session.covered_sections]
+    if session.classifier is not None and session.articles is None:
+        found_urls = route_articles(session, found_urls)
+    # add new URLS only if they are not visited or being fetched
+    unexplored = frontier.add(found_urls)
+    log.info(f"✅ Found {len(unexplored)} new URLs to explore.", extra={"url": current_url})
+    frontier.mark_visited(current_url)
+
+
+def route_articles(session, urls):
+    """
+        Records the URLs the classifier is confident are articles as content URLs
+        and leaves them for scraper.py, so the crawl does not load them just to
+        find out they have no links. Returns the other URLs.
+    """
+    predicted = [url for url in urls if session.classifier.is_article(url, session.classify_threshold)]
+    session.routed.extend(session.frontier.add_content(predicted))
+    predicted = set(predicted)
+    return [url for url in urls if url not in predicted]
+
+
+async def scrape_loaded_page(session, result):
+    """
+        Extracts the article from a page the crawler has already loaded and stores it.
+        Failures are kept for a later retry with scraper.py.
+    """
+    try:
+        with stage("extract"):
+            article = await extract_article(result, session.layout)
+    except Exception as e:
+        log.warning(f"❌ Failed to scrape article at {result.url}: {e}", extra={"url": result.url})
+        article = None
+    if article is None:
+        session.scrape_failed.append(result.url)
+        return
+    freshness = session.fetcher.freshness
+    # Articles that did not change since the last run are not written again
+    with stage("store"):
+        if freshness is None or freshness.classify(result.url, article) != "unchanged":
+            session.articles.append(article)
+
+
+async def seed_from_sitemap(session):
+    """
+        Records the articles listed in the site's sitemaps, see sitemap.py.
+        New articles are queued when scraping in one pass and recorded as content
+        URLs otherwise. Known articles modified since their last scrape (lastmod)
+        are added to to_scrape.txt, as are new ones that will not be fetched now.
+        The crawl then only explores the sections the sitemap does not cover.
+    """
+    frontier = session.frontier
+    entries = await discover(session.fetcher, base_url, paths_to_skip)
+    if not entries:
+        log.warning("⚠️ No sitemap entries found, crawling the whole site.")
+        return
+    articles = [url for url in entries if is_article_url(url)]
+    if session.articles is not None:
+        new_urls = frontier.add(articles)
+    else:
+        new_urls = frontier.add_content(articles)
+    modified = []
+    freshness = session.fetcher.freshness
+    if freshness is not None:
+        new_set = set(new_urls)
+        modified = [url for url in articles if url not in new_set and freshness.is_stale(url, entries[url])]
+    with open(session.to_scrape_path, "a", encoding="utf-8") as f:
+        for url in modified + (new_urls if session.articles is None else []):
+            f.write(url + "\n")
+    session.covered_sections = set(section(url) for url in entries)
+    log.info(f"🗺️ Sitemap: {len(articles)} articles, {len(new_urls)} new, {len(modified)} modified since "
+          f"the last scrape. {len(session.covered_sections)} sections covered, the crawl explores the others.")
+
+
+async def crawl_worker(page, session):
+    """
+        Visits URLs from the shared frontier until it is exhausted or a worker was denied access.
+    """
+    frontier = session.frontier
+    while not session.stop.is_set():
+        current_url = frontier.next_url()
+        if current_url is None:
+            if not frontier.in_flight:
+                if frontier.pending_elsewhere():
+                    # Other processes of a sharded crawl may still find URLs of this shard
+                    await asyncio.sleep(1)
+                    continue
+                return
+            # Other workers may still find new links, wait for one of them to finish
+            session.changed.clear()
+            await session.changed.wait()
+            continue
+        log.debug(f"Number of URLs to explore: {frontier.num_queued()}")
+        try:
+            with traced(current_url, "crawl") as trace:
+                await visit(count_ipc(page, trace), session, current_url)
+        except Exception:
+            if session.manager is None or not session.manager.is_crashed(page):
+                # Stop the whole crawl, the URL is retried on the next run
+                frontier.release(current_url)
+                session.stop.set()
+                raise
+            frontier.mark_failed(current_url)
+        except BaseException:
+            frontier.release(current_url)
+            session.stop.set()
+            raise
+        finally:
+            session.changed.set()
+        if session.manager is not None:
+            with stage("recycle"):
+                page, crashed = await session.manager.refresh(page)
+            if crashed and session.retries.get(current_url, 0) < max_attempts:
+                # The page died under this URL, try it again with the new page
+                session.retries[current_url] = session.retries.get(current_url, 0) + 1
+                frontier.add([current_url])
+        session.checkpointer.page_done()
+
+
+def open_frontier(store, priority=None, max_depth=None, shard=None):
+    """
+        Returns the loaded frontier for the given store: "txt" for the files
+        under data/, "sqlite" for data/crawl.db.
+        See frontier.py for `priority` and `max_depth`. A `shard` (index, count)
+        always uses data/crawl.db, shared with the other processes, and a
+        content_urls file of its own that shards.py merges after the run.
+    """
+    if shard:
+        frontier = SqliteFrontier(start_urls, content_path=shard_path('./data/content_urls.txt', shard[0]),
+                                  priority=priority, max_depth=max_depth, shard=shard)
+    elif store == "sqlite":
+        frontier = SqliteFrontier(start_urls, priority=priority, max_depth=max_depth)
+    else:
+        frontier = FileFrontier(start_urls, priority=priority, max_depth=max_depth)
+    frontier.load()
+    return frontier
+
+
+async def crawl(page, concurrency=1, store="txt", fetch_mode="browser", scrape=False, limiter=None,
+                frontier=None, checkpoint_pages=50, checkpoint_seconds=60, cache=None, freshness=None,
+                discovery="bfs", classifier=None, classify=False, classify_threshold=0.95, max_depth=None,
+                manager=None, layout="markdown", shard=None):
+    """
+        Explores the site starting from start_urls (or the saved frontier) with
+        `concurrency` pages sharing the browser context of `page`.
+        Pages are fetched according to `fetch_mode`, see fetcher.Fetcher, at the
+        pace of `limiter` (a rate_limit.RateLimiter with default settings if None).
+        With `scrape` the articles are extracted from the content pages as they are
+        found, and only the failures are left in to_scrape.txt for scraper.py;
+        `layout` selects markdown or section tree content, see extraction.layouts.
+        A ready `frontier` can be passed instead of opening the one selected by `store`.
+        With a page_cache.PageCache as `cache` the HTML of every fetched page is kept,
+        with a freshness.FreshnessIndex the validators and article hashes are.
+        With `discovery` "sitemap" the articles are taken from the sitemaps first
+        and only the sections they miss are crawled, see seed_from_sitemap.
+        A url_classifier.UrlClassifier ranks the frontier, likely hubs first, and with
+        `classify` the links it predicts to be articles (probability >= classify_threshold)
+        are left for scraper.py without loading them. URLs deeper than `max_depth`
+        path segments are not crawled.
+        With a browser_manager.BrowserManager the pages are recycled between URLs and
+        replaced after a crash, the URL that was loading is retried.
+        With `shard` (index, count) this process crawls one shard of a sharded run
+        and writes its articles and to_scrape entries to files of its own, see shards.py.
+        Progress is saved every `checkpoint_pages` pages or `checkpoint_seconds` seconds,
+        and again whether the crawl finishes, fails or is interrupted.
+    """
+    # Retrieve visited and to_explore URLs from the store
+    frontier = frontier or open_frontier(store, classifier.probability if classifier else None, max_depth, shard)
+    log.info(f"Urls to explore: {frontier.num_queued()}")
+    log.info(f"Urls already visited: {frontier.num_visited()}")
+    log.info(f"Number of Content Urls: {frontier.num_content()}")
+
+    fetcher = await Fetcher(fetch_mode, max_connections=concurrency, limiter=limiter, cache=cache,
+                            freshness=freshness).start()
+    articles = ArticleStore(shard_path(articles_path, shard[0]) if shard else articles_path).open() if scrape else None
+    session = CrawlSession(frontier, fetcher, articles)
+    if shard:
+        session.to_scrape_path = shard_path(to_scrape_path, shard[0])
+    session.checkpointer = Checkpointer(session.checkpoint, checkpoint_pages, checkpoint_seconds)
+    if classify and classifier is not None:
+        session.classifier = classifier
+        session.classify_threshold = classify_threshold
+    session.manager = manager
+    session.layout = layout
+    install_stop_handlers(session.stop)
+    pages = [page]
+    try:
+        if discovery == "sitemap":
+            await seed_from_sitemap(session)
+        for _ in range(concurrency - 1):
+            pages.append(await manager.new_page() if manager else await page.context.new_page())
+        results = await asyncio.gather(
+            *(crawl_worker(p, session) for p in pages),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
     except KeyboardInterrupt:
-        if current_url:
-            to_explore.add(current_url)
+        log.warning("❌ Interrupted by user. Saving progress...")
     finally:
         # Always save progress whether stopped normally, due to an exception or with Ctrl+C
-        with open("./data/visited.txt", "w", encoding="utf-8") as f:
-            for url in visited:
-                f.write(url + "\n")
-        with open("./data/to_explore.txt", "w", encoding="utf-8") as f:
-            for url in to_explore:
-                f.write(url + "\n")
-        with open("./data/content_urls.txt", "a", encoding="utf-8") as f:
-            for url in content_urls:
-                f.write(url + "\n")
-        print(f"💾 Progress saved: \n")
-        print(f"Urls to explore: {len(to_explore)}")
-        print(f"Urls already visited: {len(visited)}")
-        print(f"Number of new content Urls: {len(content_urls)}")
+        remove_stop_handlers()
+        session.checkpoint()
+        if articles is not None:
+            articles.close()
+            if freshness is not None and freshness.counts["changed"]:
+                compact(articles.path)
+        await fetcher.close()
+        if manager is None:
+            for extra_page in pages[1:]:
+                await extra_page.close()
+        with reporting() as report:
+            report.info("💾 Progress saved:")
+            report.info(f"Urls to explore: {frontier.num_queued()}")
+            report.info(f"Urls already visited: {frontier.num_visited()}")
+            report.info(f"Number of new content Urls: {len(frontier.content_urls)}")
+            if articles is not None:
+                report.info(f"Articles scraped: {articles.written}, left for scraper.py: {len(session.scrape_failed)}")
+                if freshness is not None:
+                    freshness.report()
+            if session.classifier is not None:
+                report.info(f"⚡ Page loads saved by the URL classifier: {len(session.routed)} predicted articles "
+                            f"were left for scraper.py without loading them.")
+            fetcher.report()
+        frontier.close()
 
-async def main():
+async def main(concurrency=4, store="txt", fetch_mode="auto", scrape=False, rate=5.0, burst=10,
+               block_mode="on", checkpoint_pages=50, checkpoint_seconds=60, cache_dir=cache_path,
+               cache_size=2048, discovery="bfs", classify=False, classify_threshold=0.95, max_depth=None,
+               recycle_every=200, memory_limit=2048, layout="markdown", trace_path=None, metrics_port=None,
+               shard=None):
 
-    playwright, browser, page = await init_browser(headless=True)
+    # Per-URL stage timings and run-wide metrics, off unless asked for
+    await metrics.start_tracing(trace_path, metrics_port)
+    policy = BlockingPolicy(block_mode)
+    manager = await BrowserManager(headless=True, policy=policy, recycle_every=recycle_every,
+                                   memory_limit=memory_limit).start()
+    page = await manager.new_page()
+    cache = PageCache(cache_dir, max_bytes=cache_size * 2 ** 20).open() if cache_dir else None
+    freshness = FreshnessIndex().open()
+    classifier = train_from_files()
+    articles, hubs = classifier.trained_on
+    if articles and hubs:
+        log.info(f"🧭 URL classifier trained on {articles} articles and {hubs} hubs of previous crawls.")
+    else:
+        classifier = None  # nothing to learn from yet, the frontier is ranked by path depth
 
-    await crawl(page)
-
-    await browser.close()
-    await playwright.stop()
+    try:
+        await crawl(page, concurrency=concurrency, store=store, fetch_mode=fetch_mode, scrape=scrape,
+                    limiter=RateLimiter(rate=rate, burst=burst), checkpoint_pages=checkpoint_pages,
+                    checkpoint_seconds=checkpoint_seconds, cache=cache, freshness=freshness,
+                    discovery=discovery, classifier=classifier, classify=classify,
+                    classify_threshold=classify_threshold, max_depth=max_depth, manager=manager,
+                    layout=layout, shard=shard)
+    finally:
+        freshness.close()
+        if cache is not None:
+            cache.close()
+        with reporting():
+            policy.report()
+            manager.report()
+        await manager.close()
+        await metrics.stop_tracing()
+    # Changed articles have an older record in the store
+    return {"changed": freshness.counts["changed"]}
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crawl the site and collect the URLs of content pages.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of pages crawling in parallel.")
+    parser.add_argument("--store", choices=["txt", "sqlite"], default="txt",
+                        help="Where the crawl state is kept: the txt files or data/crawl.db.")
+    parser.add_argument("--fetch", choices=["auto", "http", "browser"], default="auto",
+                        help="auto: plain HTTP with browser fallback, http/browser: force one engine.")
+    parser.add_argument("--scrape", action="store_true",
+                        help="Extract articles while crawling instead of in a separate scraper.py run.")
+    parser.add_argument("--rate", type=positive_rate, default=5.0, help="Initial requests per second per host.")
+    parser.add_argument("--burst", type=int, default=10, help="Requests allowed in a burst per host.")
+    parser.add_argument("--block", choices=["on", "off", "observe"], default="on",
+                        help="Request blocking in the browser, observe only measures what it would save.")
+    parser.add_argument("--checkpoint-pages", type=int, default=50, help="Save progress every N pages.")
+    parser.add_argument("--checkpoint-seconds", type=float, default=60, help="Save progress every N seconds.")
+    parser.add_argument("--cache-dir", default=cache_path, help="Where the fetched HTML is kept.")
+    parser.add_argument("--cache-size", type=int, default=2048, help="Size cap of the HTML cache in MB.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not keep the fetched HTML.")
+    parser.add_argument("--discover", choices=["bfs", "sitemap"], default="bfs",
+                        help="sitemap: take the articles from robots.txt/sitemap.xml, crawl only what they miss.")
+    parser.add_argument("--classify", action="store_true",
+                        help="Leave links predicted to be articles for scraper.py without loading them.")
+    parser.add_argument("--classify-threshold", type=float, default=0.95,
+                        help="Article probability needed to skip loading a link.")
+    parser.add_argument("--max-depth", type=int, default=None, help="Do not crawl URLs with more path segments.")
+    parser.add_argument("--recycle-every", type=int, default=200, help="Open a fresh page after N navigations.")
+    parser.add_argument("--memory-limit", type=int, default=2048,
+                        help="Restart the browser above this many MB (needs psutil, 0 disables).")
+    parser.add_argument("--layout", choices=layouts, default="markdown",
+                        help="With --scrape: article content as markdown or as the nested section tree.")
+    parser.add_argument("--trace", default=None,
+                        help="Write per-URL stage timings to this JSONL file, metrics to the same name with .prom.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics while running.")
+    parser.add_argument("--profile", action="store_true", help="Profile the run, the report is saved to logs/.")
+    parser.add_argument("--log-level", choices=log_levels, default="INFO",
+                        help="DEBUG also logs every skipped link, WARNING only problems and reports.")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Format of logs/crawler.log.")
+    parser.add_argument("--log-max-mb", type=int, default=50, help="Rotate and compress the log file at this size.")
+    args = parser.parse_args()
+    # Queued logging with a background writer, prints of the other modules are captured too
+    setup_logging("crawler", args.log_level, args.log_format, args.log_max_mb * 2 ** 20)
+    try:
+        metrics.run(main(concurrency=max(1, args.concurrency), store=args.store, fetch_mode=args.fetch,
+                         layout=args.layout, trace_path=args.trace, metrics_port=args.metrics_port,
+                         discovery=args.discover, classify=args.classify, classify_threshold=args.classify_threshold,
+                         max_depth=args.max_depth, recycle_every=args.recycle_every, memory_limit=args.memory_limit,
+                         scrape=args.scrape, rate=args.rate, burst=args.burst, block_mode=args.block,
+                         checkpoint_pages=args.checkpoint_pages, checkpoint_seconds=args.checkpoint_seconds,
+                         cache_dir=None if args.no_cache else args.cache_dir, cache_size=args.cache_size),
+                    profile=args.profile)
+    finally:
+        stop_logging()
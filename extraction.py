@@ -0,0 +1,286 @@
+"""
+    In-page extraction of article content.
+
+    element_to_markdown in scraper.py walks the DOM from Python and pays one
+    Playwright round trip per child (tag name, attributes, inner text). The
+    functions here do the same walk inside the browser, so a whole article is
+    converted with a single page.evaluate call.
+
+    Two content layouts are supported:
+    - "markdown": the article body as one markdown string,
+    - "sections": the nested section tree of data/dog-owners.json, where every
+      section is {"title", "content", <subsection title>: {...}, ...}.
+    Both are built in a single walk over the DOM. For "sections" the walk
+    emits a flat list of (heading level, title, text) blocks in document order
+    and section_tree nests them by heading level, so no element ever needs its
+    depth looked up (the archived parse_element paid two round trips per section).
+"""
+
+layouts = ["markdown", "sections"]
+
+# Mirrors scraper.element_to_markdown rule for rule, the output must stay identical.
+MARKDOWN_JS = """
+(root) => {
+    const walk = (element) => {
+        let markdown = "";
+        for (const child of element.children) {
+            const tag = child.tagName.toLowerCase();
+
+            if (/^h[1-6]$/.test(tag)) {
+                const level = parseInt(tag[1]);
+                markdown += `\\n${"#".repeat(level)} ${child.innerText.trim()}\\n`;
+            } else if (tag === "p") {
+                if (child.getAttribute("data-testid") !== "topicPara") continue;
+                const paragraph = child.innerText.trim();
+                if (paragraph) markdown += `${paragraph}\\n\\n`;
+            } else if (tag === "div") {
+                const className = child.getAttribute("class") || "";
+                // Skip figures or other non-content divs
+                if (className.includes("Figure") || child.getAttribute("data-testid") === "baseillustrative") continue;
+                const inner = walk(child);
+                if (inner.trim()) markdown += inner + "\\n";
+            } else if (tag === "section") {
+                const inner = walk(child);
+                if (inner.trim()) markdown += inner + "\\n";
+            }
+        }
+        return markdown.trim();
+    };
+    return walk(root);
+}
+"""
+
+
+# Same walk and rules as MARKDOWN_JS, headings start a new block instead of a markdown line.
+BLOCKS_JS = """
+(root) => {
+    const blocks = [[0, null, []]];
+    const walk = (element) => {
+        for (const child of element.children) {
+            const tag = child.tagName.toLowerCase();
+
+            if (/^h[1-6]$/.test(tag)) {
+                blocks.push([parseInt(tag[1]), child.innerText.trim(), []]);
+            } else if (tag === "p") {
+                if (child.getAttribute("data-testid") !== "topicPara") continue;
+                const paragraph = child.innerText.trim();
+                if (paragraph) blocks[blocks.length - 1][2].push(paragraph);
+            } else if (tag === "div") {
+                const className = child.getAttribute("class") || "";
+                if (className.includes("Figure") || child.getAttribute("data-testid") === "baseillustrative") continue;
+                walk(child);
+            } else if (tag === "section") {
+                walk(child);
+            }
+        }
+    };
+    walk(root);
+    return blocks.map(([level, title, paragraphs]) => [level, title, paragraphs.join("\\n")]);
+}
+"""
+
+
+def section_tree(title, blocks):
+    """
+        Nests the (level, title, text) blocks of an article into the section tree.
+        The first block is the introduction before any heading and becomes the
+        content of the root, every heading opens a section under the closest
+        preceding heading of a higher level. Repeated titles among siblings get
+        a " (2)", " (3)"... suffix so no section is lost.
+    """
+    root = {"title": title, "content": blocks[0][2] if blocks else ""}
+    stack = [(0, root)]
+    for level, heading, text in blocks[1:]:
+        while stack[-1][0] >= level:
+            stack.pop()
+        parent = stack[-1][1]
+        heading = heading or "Untitled Section"
+        key = heading
+        number = 1
+        while key in parent or key in ["title", "content"]:
+            number += 1
+            key = f"{heading} ({number})"
+        section = {"title": heading, "content": text}
+        parent[key] = section
+        stack.append((level, section))
+    return root
+
+
+async def extract_markdown(element):
+    """
+        Converts the given element handle to markdown in one round trip.
+        Produces the same output as scraper.element_to_markdown.
+    """
+    return await element.evaluate(MARKDOWN_JS)
+
+
+async def extract_sections(element, title):
+    """
+        Builds the section tree of the given element handle in one round trip.
+    """
+    return section_tree(title, await element.evaluate(BLOCKS_JS))
+
+
+
+"""
+    Static HTML counterparts, used when a page was fetched over plain HTTP.
+    They take lxml elements and apply the same rules as MARKDOWN_JS.
+"""
+
+def html_inner_text(element):
+    """
+        Approximates innerText for static HTML: <br> becomes a line break and
+        other whitespace runs collapse to single spaces.
+    """
+    text = "".join(_text_parts(element))
+    lines = [" ".join(line.split()) for line in text.split("\n")]
+    return "\n".join(lines).strip()
+
+
+def _text_parts(element):
+    if element.tag in ["script", "style", "noscript"]:
+        return
+    if element.tag == "br":
+        yield "\n"
+    if element.text:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str):
+            yield from _text_parts(child)
+        if child.tail:
+            yield child.tail
+
+
+def html_to_markdown(element):
+    markdown = ""
+
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue  # comments and processing instructions
+        tag = child.tag.lower()
+
+        if tag in ["h1", "h2", "h3", "h4", "h5", "h6"]:
+            level = int(tag[1])
+            markdown += f"\n{'#' * level} {html_inner_text(child)}\n"
+
+        elif tag == "p":
+            if child.get("data-testid") != "topicPara":
+                continue
+            paragraph = html_inner_text(child)
+            if paragraph:
+                markdown += f"{paragraph}\n\n"
+
+        elif tag == "div":
+            class_name = child.get("class") or ""
+            # Skip figures or other non-content divs
+            if "Figure" in class_name or child.get("data-testid") == "baseillustrative":
+                continue
+            inner_markdown = html_to_markdown(child)
+            if inner_markdown.strip():
+                markdown += inner_markdown + "\n"
+
+        elif tag == "section":
+            section_markdown = html_to_markdown(child)
+            if section_markdown.strip():
+                markdown += section_markdown + "\n"
+
+    return markdown.strip()
+
+
+def html_blocks(element, blocks=None):
+    """
+        Static counterpart of BLOCKS_JS. Returns the (level, title, text) blocks
+        of the element, the first one being the text before any heading.
+    """
+    if blocks is None:
+        blocks = [(0, None, [])]
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue
+        tag = child.tag.lower()
+
+        if tag in ["h1", "h2", "h3", "h4", "h5", "h6"]:
+            blocks.append((int(tag[1]), html_inner_text(child), []))
+
+        elif tag == "p":
+            if child.get("data-testid") != "topicPara":
+                continue
+            paragraph = html_inner_text(child)
+            if paragraph:
+                blocks[-1][2].append(paragraph)
+
+        elif tag == "div":
+            class_name = child.get("class") or ""
+            if "Figure" in class_name or child.get("data-testid") == "baseillustrative":
+                continue
+            html_blocks(child, blocks)
+
+        elif tag == "section":
+            html_blocks(child, blocks)
+    return blocks
+
+
+def html_to_sections(element, title):
+    blocks = [(level, heading, "\n".join(paragraphs)) for level, heading, paragraphs in html_blocks(element)]
+    return section_tree(title, blocks)
+
+
+def html_main_content(tree):
+    """
+        Returns the main content element of a parsed page, or None.
+    """
+    found = tree.xpath('//*[@data-testid="topic-main-content"]')
+    return found[0] if found else None
+
+
+def html_title(tree):
+    found = tree.xpath('//h1')
+    return html_inner_text(found[0]) if found else "Untitled"
+
+
+def article_from_tree(url, tree, layout="markdown"):
+    """
+        Builds the article dictionary from a parsed static page, or returns None
+        if the page has no main content.
+    """
+    main_content = html_main_content(tree)
+    if main_content is None:
+        return None
+    title = html_title(tree).strip()
+    if layout == "sections":
+        content = html_to_sections(main_content, title)
+    else:
+        content = html_to_markdown(main_content)
+    return {
+        "name": title,
+        "link": url,
+        "content": content
+    }
+
+
+async def extract_article(result, layout="markdown"):
+    """
+        Builds the article dictionary ('name', 'link', 'content') from a
+        fetcher.FetchResult, whichever engine loaded the page. `layout` picks
+        the shape of 'content', a markdown string or the section tree.
+        Returns None if the page has no main content.
+    """
+    if result.engine == "http":
+        if result.tree is None:
+            return None
+        return article_from_tree(result.url, result.tree, layout)
+    title_element = await result.page.query_selector("h1")
+    title = await title_element.inner_text() if title_element else "Untitled"
+    main_content = await result.page.query_selector('[data-testid="topic-main-content"]')
+    if main_content is None:
+        return None
+    title = title.strip()
+    if layout == "sections":
+        content = await extract_sections(main_content, title)
+    else:
+        content = await extract_markdown(main_content)
+    return {
+        "name": title,
+        "link": result.url,
+        "content": content
+    }
@@ -0,0 +1,218 @@
+"""
+    HTTP-first fetch engine with Playwright fallback.
+
+    Hub pages (#mainContainer) and articles (topic-main-content) are present in
+    the static HTML, so most pages can be fetched with a pooled HTTP client and
+    parsed with lxml. The browser is only used when the static HTML lacks both
+    markers or the HTTP request fails. A 403 or 429 answer is final: the site is
+    throttling us and the browser would only send the request again.
+
+    Modes: "auto" (HTTP first, browser fallback), "http" (never use the browser)
+    and "browser" (always use the browser, the old behaviour).
+
+    Every request of either engine goes through the fetcher's RateLimiter.
+    With a page_cache.PageCache the HTML of every page fetched with status 200
+    is saved, so articles can be re-extracted later without fetching them again.
+    With a freshness.FreshnessIndex the ETag/Last-Modified of every response are
+    kept, and fetch(..., conditional=True) sends them back so unchanged pages
+    answer 304 Not Modified without a body.
+    The wait, fetch, parse and cache stages are timed on the current
+    metrics trace when tracing is on.
+"""
+
+from metrics import note, stage
+from rate_limit import RateLimiter, parse_retry_after
+
+try:
+    import httpx
+    import lxml.html
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401, enables HTTP/2 in httpx
+    http2 = True
+except ImportError:
+    http2 = False
+
+user_agent = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+
+class StatusError(ConnectionError):
+    def __init__(self, url, status):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+
+
+class FetchResult:
+    """
+        Outcome of one fetch. For the HTTP engine `tree` holds the parsed page,
+        for the browser engine the page has been loaded into `page`.
+    """
+    def __init__(self, url, status, engine, tree=None, page=None, html=None):
+        self.url = url
+        self.status = status
+        self.engine = engine
+        self.tree = tree
+        self.page = page
+        self.html = html
+
+    async def has_content(self):
+        if self.tree is not None:
+            return bool(self.tree.xpath('//*[@data-testid="topic-main-content"]'))
+        if self.page is not None:
+            return await self.page.query_selector('[data-testid="topic-main-content"]') is not None
+        return False
+
+
+class Fetcher:
+    def __init__(self, mode="auto", max_connections=10, timeout=30, limiter=None, cache=None, freshness=None):
+        if mode != "browser" and httpx is None:
+            print("⚠️ httpx/lxml not installed, fetching every page with the browser.")
+            mode = "browser"
+        self.mode = mode
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.client = None
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.freshness = freshness
+        self.counts = {"http": 0, "browser": 0, "fallback": 0, "not_modified": 0}
+
+    async def start(self):
+        # The HTTP client is also used in browser mode, for robots.txt and sitemaps
+        if httpx is not None:
+            self.client = httpx.AsyncClient(
+                http2=http2,
+                follow_redirects=True,
+                timeout=self.timeout,
+                headers={"User-Agent": user_agent},
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self
+
+    async def close(self):
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def fetch(self, url, page, conditional=False):
+        """
+            Fetches the URL and returns a FetchResult.
+            With `conditional` the HTTP engine sends the stored validators and the
+            result has status 304 if the page did not change.
+            Network errors of the browser engine are raised like page.goto raises them.
+        """
+        result = await self.fetch_engine(url, page, conditional)
+        if self.cache is not None and result.status == 200:
+            with stage("cache"):
+                html = result.html if result.html is not None else await result.page.content()
+                self.cache.put(url, html)
+        return result
+
+    async def fetch_engine(self, url, page, conditional=False):
+        if self.mode != "browser":
+            result = await self.fetch_http(url, conditional)
+            if result is not None and (self.mode == "http" or result.status in [304, 403, 429]
+                                       or has_markers(result.tree)):
+                self.counts["http"] += 1
+                return result
+            if self.mode == "http":
+                raise ConnectionError(f"HTTP fetch of {url} failed")
+            self.counts["fallback"] += 1
+        return await self.fetch_browser(url, page)
+
+    async def fetch_http(self, url, conditional=False):
+        """
+            Returns a FetchResult, or None if the request failed.
+            In auto mode a non-200 answer also returns None so the browser gets a try,
+            except 304 Not Modified to a conditional request and 403/429.
+        """
+        headers = {}
+        if conditional and self.freshness is not None:
+            headers = self.freshness.conditional_headers(url)
+        with stage("wait"):
+            await self.limiter.acquire(url)
+        try:
+            with stage("fetch"):
+                response = await self.client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            print(f"⚠️ HTTP fetch failed for {url}: {e}")
+            return None
+        note(status=response.status_code, engine="http", size=len(response.content))
+        self.limiter.report(url, response.status_code, parse_retry_after(response.headers.get("retry-after")))
+        if response.status_code == 304 and headers:
+            self.counts["not_modified"] += 1
+            return FetchResult(url, 304, "http")
+        if response.status_code != 200:
+            if self.mode == "http" or response.status_code in [403, 429]:
+                return FetchResult(url, response.status_code, "http")
+            return None
+        if self.freshness is not None:
+            self.freshness.record_validators(url, response.headers)
+        with stage("parse"):
+            html = response.text
+            tree = lxml.html.fromstring(html)
+        return FetchResult(url, 200, "http", tree=tree, html=html)
+
+    async def stream_http(self, url):
+        """
+            Yields the body of a 200 response in chunks as it downloads.
+            Raises StatusError (a ConnectionError) for any other answer and
+            ConnectionError for a network error.
+        """
+        if self.client is None:
+            raise ConnectionError("httpx is not installed")
+        await self.limiter.acquire(url)
+        try:
+            async with self.client.stream("GET", url) as response:
+                self.limiter.report(url, response.status_code,
+                                    parse_retry_after(response.headers.get("retry-after")))
+                if response.status_code != 200:
+                    raise StatusError(url, response.status_code)
+                async for chunk in response.aiter_bytes():
+                    yield chunk
+        except httpx.HTTPError as e:
+            raise ConnectionError(f"HTTP fetch of {url} failed: {e}")
+
+    async def fetch_browser(self, url, page):
+        with stage("wait"):
+            await self.limiter.acquire(url)
+        with stage("fetch"):
+            response = await page.goto(url, wait_until="domcontentloaded")
+        self.counts["browser"] += 1
+        # The body stays in the browser, Content-Length is all there is without another round trip
+        note(status=response.status, engine="browser", size=int(response.headers.get("content-length") or 0))
+        self.limiter.report(url, response.status, parse_retry_after(response.headers.get("retry-after")))
+        if self.freshness is not None and response.status == 200:
+            self.freshness.record_validators(url, response.headers)
+        return FetchResult(url, response.status, "browser", page=page)
+
+    def report(self):
+        total = self.counts["http"] + self.counts["browser"]
+        print(f"📊 Fetches: {total} total, {self.counts['http']} over HTTP, "
+              f"{self.counts['browser']} with the browser ({self.counts['fallback']} fallbacks, "
+              f"{self.counts['not_modified']} not modified).")
+        self.limiter.report_stats()
+        if self.cache is not None:
+            self.cache.report()
+
+
+def has_markers(tree):
+    """
+        True if the static page has the hub or article container, i.e. the
+        browser is not needed to see it.
+    """
+    if tree is None:
+        return False
+    return bool(tree.xpath('//*[@id="mainContainer"] | //*[@data-testid="topic-main-content"]'))
+
+
+def static_hrefs(tree):
+    """
+        Returns the href of every anchor in #mainContainer, in document order.
+    """
+    return tree.xpath('//*[@id="mainContainer"]//a/@href')
@@ -0,0 +1,299 @@
+"""
+    Offline stand-in for merckvetmanual.com.
+
+    Serves a corpus of hub and article pages from a directory, with optional
+    latency and injected 403 answers (or scripted errors for given paths,
+    see start_server), so the crawler and scraper can be
+    benchmarked without hitting the real site. A URL path /a/b is served from
+    <corpus>/a/b.html. Absolute links to the real site are rewritten to the
+    fixture server when a page is served, links to a third-party tag manager to
+    the same server under the name localhost, so it looks like another domain.
+    Missing images, styles, fonts and scripts are answered with filler bytes.
+    Pages carry an ETag and Last-Modified and answer conditional requests with
+    304, like the real site, so incremental runs can be measured.
+    Other files of the corpus (robots.txt, sitemaps) are served as they are.
+
+    python fixture_server.py generate   writes a synthetic corpus with the
+                                        #mainContainer / topic-main-content structure
+    python fixture_server.py record     saves the real pages listed in visited.txt
+                                        and content_urls.txt
+    python fixture_server.py serve      serves a corpus until interrupted
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+site_origin = "https://www.merckvetmanual.com"
+third_party_origin = "https://www.googletagmanager.com"
+start_paths = ['/resourcespages/pet-owners-overview', '/veterinary-topics']
+corpus_path = './data/fixtures'
+
+# Content type and size of the filler served for missing assets
+asset_types = {".js": ("application/javascript", 40000), ".css": ("text/css", 30000),
+               ".png": ("image/png", 80000), ".jpg": ("image/jpeg", 120000),
+               ".woff2": ("font/woff2", 50000), ".mp4": ("video/mp4", 500000)}
+raw_types = {".txt": "text/plain", ".xml": "application/xml"}
+
+
+def page_file(corpus_dir, path):
+    return os.path.join(corpus_dir, path.strip("/") or "index") + ".html"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        with server.lock:
+            server.counts["requests"] += 1
+            forbidden = server.forbid_every and server.counts["requests"] % server.forbid_every == 0
+            forbidden = forbidden or random.random() < server.forbid_rate
+            if forbidden:
+                server.counts["forbidden"] += 1
+            url_path = urlparse(self.path).path
+            failures = server.failures.get(url_path)
+            failure = failures.pop(0) if failures else None
+        if forbidden:
+            self.send_error(403)
+            return
+        if failure:
+            self.send_error(failure)
+            return
+        path = page_file(server.corpus_dir, url_path)
+        extension = os.path.splitext(url_path)[1]
+        raw_path = os.path.join(server.corpus_dir, url_path.strip("/"))
+        validators = {}
+        if extension in raw_types and os.path.isfile(raw_path):
+            with open(raw_path, "rb") as f:
+                body = f.read().replace(site_origin.encode(), server.origin.encode())
+            content_type = raw_types[extension]
+        elif os.path.exists(path):
+            with open(path, "rb") as f:
+                body = f.read().replace(site_origin.encode(), server.origin.encode())
+            body = body.replace(third_party_origin.encode(), server.origin.replace("127.0.0.1", "localhost").encode())
+            content_type = "text/html; charset=utf-8"
+            validators = {"ETag": f'"{hashlib.md5(body).hexdigest()}"',
+                          "Last-Modified": formatdate(os.path.getmtime(path), usegmt=True)}
+            if self.headers.get("If-None-Match") == validators["ETag"]:
+                with server.lock:
+                    server.counts["not_modified"] += 1
+                self.send_response(304)
+                self.send_header("ETag", validators["ETag"])
+                self.end_headers()
+                return
+        elif extension in asset_types:
+            content_type, size = asset_types[extension]
+            body = b"0" * size
+        else:
+            self.send_error(404)
+            return
+        with server.lock:
+            server.counts["bytes"] += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in validators.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output readable
+
+
+def start_server(corpus_dir=corpus_path, port=0, latency=0.0, jitter=0.0, forbid_rate=0.0, forbid_every=0,
+                 failures=None):
+    """
+        Starts the fixture server in a background thread.
+        Returns the server; server.origin is its base URL and server.counts its request counters.
+        latency/jitter are in seconds, forbid_rate is the share of requests answered with 403,
+        forbid_every answers every n-th request with 403.
+        failures maps URL paths to the statuses their next requests are answered
+        with, e.g. {"/veterinary-topics": [429, 500]}, before the page is served.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+    server.daemon_threads = True
+    server.corpus_dir = corpus_dir
+    server.latency = latency
+    server.jitter = jitter
+    server.forbid_rate = forbid_rate
+    server.forbid_every = forbid_every
+    server.failures = {path: list(statuses) for path, statuses in (failures or {}).items()}
+    server.origin = f"http://127.0.0.1:{server.server_address[1]}"
+    server.counts = {"requests": 0, "forbidden": 0, "not_modified": 0, "bytes": 0}
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    server.shutdown()
+    server.server_close()
+
+
+def write_page(corpus_dir, path, html):
+    file_path = page_file(corpus_dir, path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def hub_html(title, links):
+    anchors = "\n".join(f'<li><a href="{path}">{name}</a></li>' for path, name in links)
+    return (f'<html><head><title>{title}</title>{assets_html()}</head><body>'
+            f'<nav><a href="/resourcespages/about">About</a></nav>'
+            f'<div id="mainContainer"><h1>{title}</h1><ul>\n{anchors}\n</ul></div>'
+            f'</body></html>')
+
+
+def article_html(title, rng, sections, paragraphs):
+    words = ["dogs", "cats", "horses", "treatment", "infection", "symptoms", "veterinarian",
+             "diagnosis", "disease", "owners", "signs", "may", "include", "the", "and", "of"]
+
+    def paragraph():
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(20, 80)))
+        return f'<p data-testid="topicPara">{text.capitalize()}.</p>'
+
+    body = ('<img src="/images/hero.jpg"><video src="/media/clip.mp4"></video>'
+            + "".join(paragraph() for _ in range(paragraphs)))
+    for i in range(sections):
+        inner = "".join(paragraph() for _ in range(paragraphs))
+        subsection = (f'<section><h3>Subsection {i}</h3><div class="TopicBody">'
+                      f'{"".join(paragraph() for _ in range(paragraphs))}</div></section>')
+        figure = (f'<div class="Figure_figure"><p data-testid="topicPara">Figure caption</p></div>'
+                  f'<div data-testid="baseillustrative"><p>Illustration</p></div>')
+        body += f'<section><h2>Section {i}</h2><div>{inner}</div>{figure}{subsection}</section>'
+    return (f'<html><head><title>{title}</title>{assets_html()}</head><body><h1>{title}</h1>'
+            f'<div data-testid="topic-main-content">{body}</div></body></html>')
+
+
+def assets_html():
+    return ('<link rel="stylesheet" href="/styles/main.css">'
+            '<link rel="preload" as="font" href="/fonts/text.woff2" crossorigin>'
+            '<script src="/scripts/app.js"></script>'
+            '<script src="/scripts/analytics.js" async></script>'
+            f'<script src="{third_party_origin}/gtm.js" async></script>')
+
+
+def write_file(corpus_dir, path, text):
+    file_path = os.path.join(corpus_dir, path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def write_sitemaps(corpus_dir, sections, lastmod):
+    """
+        Writes robots.txt, a sitemap index and one sitemap per section.
+        `sections` maps a section hub path to the paths of its pages.
+    """
+    namespace = "http://www.sitemaps.org/schemas/sitemap/0.9"
+    sitemaps = []
+    for section_path, paths in sections.items():
+        name = f"sitemaps{section_path}.xml"
+        entries = "".join(f"<url><loc>{site_origin}{path}</loc><lastmod>{lastmod}</lastmod></url>\n"
+                          for path in [section_path] + paths)
+        write_file(corpus_dir, name, f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                                     f'<urlset xmlns="{namespace}">\n{entries}</urlset>\n')
+        sitemaps.append(name)
+    entries = "".join(f"<sitemap><loc>{site_origin}/{name}</loc></sitemap>\n" for name in sitemaps)
+    write_file(corpus_dir, "sitemap_index.xml", f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                                                f'<sitemapindex xmlns="{namespace}">\n{entries}</sitemapindex>\n')
+    write_file(corpus_dir, "robots.txt", f"User-agent: *\nDisallow: /search\n\n"
+                                         f"Sitemap: {site_origin}/sitemap_index.xml\n")
+
+
+def generate_corpus(corpus_dir=corpus_path, sections=5, chapters=5, articles=10,
+                    article_sections=4, paragraphs=3, seed=0, unmapped_sections=1):
+    """
+        Writes a synthetic site: the start pages link to section hubs, those to
+        chapter hubs, and chapter hubs to articles.
+        The sitemaps list every section but the last `unmapped_sections`, so
+        sitemap discovery has to fall back to crawling for those.
+        Returns the list of article paths.
+    """
+    rng = random.Random(seed)
+    section_links = [(f"/section-{s}", f"Section {s}") for s in range(sections)]
+    for path in start_paths:
+        write_page(corpus_dir, path, hub_html(path, section_links + [("/authors", "Authors")]))
+    article_paths = []
+    sitemap_sections = {}
+    for section_path, section_name in section_links:
+        section_start = len(article_paths)
+        chapter_links = [(f"{section_path}/chapter-{c}", f"Chapter {c}") for c in range(chapters)]
+        write_page(corpus_dir, section_path, hub_html(section_name, chapter_links))
+        for chapter_path, chapter_name in chapter_links:
+            links = [(f"{chapter_path}/article-{a}", f"Article {a}") for a in range(articles)]
+            # Absolute links and fragments like on the real site
+            links += [(f"{site_origin}{chapter_path}/article-0#section", "Article 0, first section")]
+            write_page(corpus_dir, chapter_path, hub_html(chapter_name, links))
+            for article_path, article_name in links[:articles]:
+                write_page(corpus_dir, article_path,
+                           article_html(article_name, rng, article_sections, paragraphs))
+                article_paths.append(article_path)
+        chapter_paths = [path for path, _ in chapter_links]
+        sitemap_sections[section_path] = chapter_paths + article_paths[section_start:]
+    mapped = list(sitemap_sections)[:max(0, len(sitemap_sections) - unmapped_sections)]
+    write_sitemaps(corpus_dir, {path: sitemap_sections[path] for path in mapped}, "2024-01-01")
+    print(f"✅ Generated {len(article_paths)} articles in {corpus_dir}")
+    return article_paths
+
+
+async def record_corpus(corpus_dir=corpus_path, limit=None):
+    """
+        Saves the real hub and article pages listed in visited.txt and content_urls.txt.
+    """
+    from fetcher import Fetcher
+
+    urls = []
+    for path in ['./data/visited.txt', './data/content_urls.txt']:
+        with open(path, "r", encoding="utf-8") as f:
+            urls.extend(line.strip() for line in f if line.strip())
+    urls = list(dict.fromkeys(urls))[:limit]
+    fetcher = await Fetcher("http").start()
+    saved = 0
+    try:
+        for url in urls:
+            result = await fetcher.fetch_http(url)
+            if result is None or result.status != 200:
+                print(f"⚠️ Skipping {url}")
+                continue
+            write_page(corpus_dir, urlparse(url).path, result.html)
+            saved += 1
+    finally:
+        await fetcher.close()
+    print(f"💾 Recorded {saved} pages to {corpus_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline fixture server for the crawler and scraper.")
+    parser.add_argument("command", choices=["generate", "record", "serve"])
+    parser.add_argument("--corpus", default=corpus_path)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds per response.")
+    parser.add_argument("--forbid-rate", type=float, default=0.0, help="Share of requests answered with 403.")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of pages to record.")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate_corpus(args.corpus)
+    elif args.command == "record":
+        asyncio.run(record_corpus(args.corpus, args.limit))
+    else:
+        server = start_server(args.corpus, args.port, args.latency, args.jitter, args.forbid_rate)
+        print(f"Serving {args.corpus} at {server.origin}, start pages: "
+              + ", ".join(server.origin + path for path in start_paths))
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            stop_server(server)
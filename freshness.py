@@ -0,0 +1,150 @@
+"""
+    Per-URL freshness state for incremental recrawls.
+
+    For every fetched page the ETag and Last-Modified headers are kept, and for
+    every extracted article a hash of its content. A refresh run sends them back
+    as If-None-Match / If-Modified-Since, so unchanged pages answer 304 without a
+    body. Pages that are downloaded anyway (no validators, browser engine) are
+    compared by content hash, and unchanged articles are not written again.
+    The state lives in data/freshness.db.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+
+from urls import canonicalize
+
+freshness_path = './data/freshness.db'
+
+
+def content_hash(article):
+    data = json.dumps(article, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class FreshnessIndex:
+    def __init__(self, path=freshness_path):
+        self.path = path
+        self.conn = None
+        self.removed = set()
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0, "not_modified": 0, "removed": 0}
+
+    def open(self):
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, etag TEXT, "
+                          "last_modified TEXT, content_hash TEXT, checked_at REAL)")
+        self.conn.commit()
+        return self
+
+    def close(self):
+        if self.conn:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def conditional_headers(self, url):
+        """
+            Returns the If-None-Match / If-Modified-Since headers for the URL.
+            Only pages whose article was stored get them, a 304 is useless otherwise.
+        """
+        row = self.conn.execute("SELECT etag, last_modified FROM urls WHERE url = ? AND content_hash IS NOT NULL",
+                                (canonicalize(url),)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def record_validators(self, url, headers):
+        """
+            Keeps the ETag and Last-Modified of a 200 response.
+        """
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        self.conn.execute("INSERT INTO urls (url, etag, last_modified, checked_at) VALUES (?, ?, ?, ?) "
+                          "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, "
+                          "last_modified = excluded.last_modified, checked_at = excluded.checked_at",
+                          (canonicalize(url), etag, last_modified, time.time()))
+        self.conn.commit()
+
+    def classify(self, url, article):
+        """
+            Stores the content hash of a freshly extracted article and returns
+            "new", "changed" or "unchanged" compared to the previous run.
+        """
+        url = canonicalize(url)
+        new_hash = content_hash(article)
+        row = self.conn.execute("SELECT content_hash FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None or row[0] is None:
+            state = "new"
+        elif row[0] == new_hash:
+            state = "unchanged"
+        else:
+            state = "changed"
+        self.conn.execute("INSERT INTO urls (url, content_hash, checked_at) VALUES (?, ?, ?) "
+                          "ON CONFLICT(url) DO UPDATE SET content_hash = excluded.content_hash, "
+                          "checked_at = excluded.checked_at", (url, new_hash, time.time()))
+        self.conn.commit()
+        self.counts[state] += 1
+        return state
+
+    def is_stale(self, url, lastmod):
+        """
+            True if the article was scraped before `lastmod` (an aware datetime).
+            Articles without a recorded scrape or a lastmod are not stale, the
+            regular scrape or a --refresh run takes care of those.
+        """
+        if lastmod is None:
+            return False
+        row = self.conn.execute("SELECT checked_at FROM urls WHERE url = ? AND content_hash IS NOT NULL",
+                                (canonicalize(url),)).fetchone()
+        return row is not None and row[0] < lastmod.timestamp()
+
+    def not_modified(self, url):
+        """
+            Records a 304 answer: the article is unchanged and was not downloaded.
+        """
+        self.conn.execute("UPDATE urls SET checked_at = ? WHERE url = ?", (time.time(), canonicalize(url)))
+        self.conn.commit()
+        self.counts["unchanged"] += 1
+        self.counts["not_modified"] += 1
+
+    def remove(self, urls):
+        """
+            Forgets URLs that are gone from the site, they are collected in `removed`.
+        """
+        removed = set(canonicalize(url) for url in urls) - self.removed
+        self.conn.executemany("DELETE FROM urls WHERE url = ?", [(url,) for url in removed])
+        self.conn.commit()
+        self.removed |= removed
+        self.counts["removed"] += len(removed)
+
+    def known_articles(self):
+        rows = self.conn.execute("SELECT url FROM urls WHERE content_hash IS NOT NULL").fetchall()
+        return set(row[0] for row in rows)
+
+    def seed(self, articles):
+        """
+            Fills in the content hashes of articles scraped before the index
+            existed, so the first refresh can already tell unchanged articles apart.
+        """
+        rows = [(canonicalize(article["link"]), content_hash(article), time.time()) for article in articles]
+        self.conn.executemany("INSERT INTO urls (url, content_hash, checked_at) VALUES (?, ?, ?) "
+                              "ON CONFLICT(url) DO UPDATE SET content_hash = excluded.content_hash "
+                              "WHERE urls.content_hash IS NULL", rows)
+        self.conn.commit()
+
+    def report(self):
+        counts = self.counts
+        print(f"🔄 Articles: {counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged "
+              f"({counts['not_modified']} answered 304 Not Modified), {counts['removed']} removed.")
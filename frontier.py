@@ -0,0 +1,381 @@
+"""
+    Crawl frontier shared by the crawler workers.
+
+    A URL is either queued (to_explore), in flight (handed to a worker and not
+    finished yet) or done. Workers only ever receive URLs that are neither
+    visited nor in flight, so two workers never fetch the same page.
+
+    FileFrontier keeps the state in the txt files under data/, SqliteFrontier
+    in an SQLite database that is committed in small batches while crawling.
+    Run `python frontier.py import-txt` once to move the txt state into the database.
+
+    Both store URLs in canonical form (urls.canonicalize) and record every fetched
+    URL, content pages included, so hubs linking to a known page do not queue it again.
+
+    Queued URLs are handed out by priority, lowest first: by default the path
+    depth, so hubs near the top of the site come first, or any `priority`
+    function, e.g. the article probability of url_classifier. URLs deeper than
+    `max_depth` path segments are not queued at all.
+
+    A SqliteFrontier can be shared by the processes of a sharded crawl (see
+    shards.py): with `shard` (index, count) it only hands out the URLs whose
+    urls.url_bucket falls into its shard, while links to any shard are added
+    to the common table. Changes are committed right away in that mode, so
+    the other processes always see queued and in-flight URLs.
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import sqlite3
+import time
+
+from checkpoint import atomic_write
+from urls import canonicalize, url_bucket
+from url_classifier import path_depth
+
+
+class FileFrontier:
+    """
+        Frontier kept in memory and stored in the txt files under data/.
+        Files are read in full on load() and written in full on save().
+    """
+    def __init__(self, start_urls, visited_path='./data/visited.txt',
+                 to_explore_path='./data/to_explore.txt', content_path='./data/content_urls.txt',
+                 priority=None, max_depth=None):
+        self.start_urls = start_urls
+        self.visited_path = visited_path
+        self.to_explore_path = to_explore_path
+        self.content_path = content_path
+        self.visited = set()
+        self.to_explore = set()
+        self.in_flight = set()
+        self.fetched = set()  # every URL fetched in this session, content pages included
+        self.content_urls = []  # content URLs found in this session
+        self.content_saved = 0
+        self.priority = priority or path_depth
+        self.max_depth = max_depth
+        self.heap = []  # (priority, insertion order, url) of the queued URLs
+        self.order = itertools.count()
+
+    def load(self):
+        with open(self.visited_path, "r", encoding="utf-8") as f:
+            self.visited = set(canonicalize(line) for line in f if line.strip())
+        with open(self.to_explore_path, "r", encoding="utf-8") as f:
+            if os.path.getsize(self.to_explore_path) == 0:
+                self.to_explore = set(canonicalize(url) for url in self.start_urls)
+            else:
+                self.to_explore = set(canonicalize(line) for line in f if line.strip())
+        with open(self.content_path, 'r', encoding='utf-8') as f:
+            content_urls = set(canonicalize(line) for line in f if line.strip())
+        # Content pages count as visited, older runs did not record them there
+        self.visited |= content_urls
+        self.num_content_urls = len(content_urls)
+        for url in self.to_explore:
+            self.push(url)
+
+    def push(self, url):
+        heapq.heappush(self.heap, (self.priority(url), next(self.order), url))
+
+    def next_url(self):
+        """
+            Hands out the queued URL with the lowest priority and marks it as in flight.
+            Returns None if nothing is queued right now.
+        """
+        while self.heap:
+            url = heapq.heappop(self.heap)[2]
+            if url not in self.to_explore:
+                continue  # queued twice, e.g. released after a 403
+            self.to_explore.discard(url)
+            if url in self.visited or url in self.in_flight or url in self.fetched:
+                continue
+            self.in_flight.add(url)
+            return url
+        return None
+
+    def add(self, urls):
+        """
+            Queues the URLs that are not visited or already being fetched.
+            Returns the list of newly queued URLs.
+        """
+        new_urls = [url for url in dict.fromkeys(canonicalize(url) for url in urls)
+                    if url not in self.visited and url not in self.in_flight and url not in self.fetched
+                    and url not in self.to_explore and within_depth(url, self.max_depth)]
+        for url in new_urls:
+            self.to_explore.add(url)
+            self.push(url)
+        return new_urls
+
+    def add_content(self, urls):
+        """
+            Records URLs known to be content pages (e.g. from the sitemap) without fetching them.
+            Returns the list of URLs that were not known before.
+        """
+        new_urls = [url for url in dict.fromkeys(canonicalize(url) for url in urls)
+                    if url not in self.visited and url not in self.in_flight and url not in self.fetched]
+        for url in new_urls:
+            self.mark_content(url)
+        return new_urls
+
+    def mark_visited(self, url):
+        self.in_flight.discard(url)
+        self.fetched.add(url)
+        self.visited.add(url)
+
+    def mark_content(self, url):
+        self.in_flight.discard(url)
+        self.fetched.add(url)
+        self.visited.add(url)
+        self.content_urls.append(url)
+
+    def mark_failed(self, url):
+        self.in_flight.discard(url)
+
+    def release(self, url):
+        """
+            Puts an in-flight URL back into the queue, e.g. after a 403.
+        """
+        self.in_flight.discard(url)
+        self.to_explore.add(url)
+        self.push(url)
+
+    def release_all(self):
+        for url in list(self.in_flight):
+            self.release(url)
+
+    def num_queued(self):
+        return len(self.to_explore) + len(self.in_flight)
+
+    def pending_elsewhere(self):
+        return False  # never shared with other processes
+
+    def num_visited(self):
+        return len(self.visited)
+
+    def num_content(self):
+        return self.num_content_urls + len(self.content_urls) - self.content_saved
+
+    def save(self):
+        atomic_write(self.visited_path, self.visited)
+        # In-flight URLs are saved as queued so they are retried on the next run
+        atomic_write(self.to_explore_path, self.to_explore | self.in_flight)
+        with open(self.content_path, "a", encoding="utf-8") as f:
+            for url in self.content_urls[self.content_saved:]:
+                f.write(url + "\n")
+        self.num_content_urls += len(self.content_urls) - self.content_saved
+        self.content_saved = len(self.content_urls)
+
+    def close(self):
+        pass
+
+
+def within_depth(url, max_depth):
+    return max_depth is None or path_depth(url) <= max_depth
+
+
+class SqliteFrontier:
+    """
+        Frontier stored in an SQLite database (WAL mode) with one row per URL.
+        Every state change is written immediately and committed every `batch_size`
+        changes or `commit_interval` seconds, so a hard kill loses at most one batch.
+        Content URLs found in the session are also appended to content_urls.txt on save().
+    """
+    def __init__(self, start_urls, db_path='./data/crawl.db', content_path='./data/content_urls.txt',
+                 batch_size=50, commit_interval=5, priority=None, max_depth=None, shard=None):
+        self.start_urls = start_urls
+        self.db_path = db_path
+        self.content_path = content_path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.conn = None
+        self.in_flight = set()
+        self.content_urls = []  # content URLs found in this session
+        self.content_saved = 0
+        self.pending = 0
+        self.last_commit = time.monotonic()
+        self.priority = priority or path_depth
+        self.max_depth = max_depth
+        self.shard = shard
+        # SQL condition selecting the URLs of this process
+        self.mine = f"bucket % {shard[1]} = {shard[0]}" if shard else "1"
+        if shard:
+            self.batch_size = 1
+
+    def load(self):
+        self.conn = connect(self.db_path)
+        # URLs that were in flight when the last run died are queued again
+        self.conn.execute(f"UPDATE urls SET state = 'queued' WHERE state = 'in_flight' AND {self.mine}")
+        if self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0] == 0:
+            print(f"⚠️ {self.db_path} is empty, starting from start_urls. "
+                  f"Use `python frontier.py import-txt` to import the txt files.")
+            self.conn.executemany("INSERT OR IGNORE INTO urls (url, state, priority, bucket) "
+                                  "VALUES (?, 'queued', ?, ?)",
+                                  [(canonicalize(url), self.priority(url), url_bucket(url))
+                                   for url in self.start_urls])
+        self.commit()
+
+    def next_url(self):
+        row = self.conn.execute(f"SELECT url FROM urls WHERE state = 'queued' AND {self.mine} "
+                                f"ORDER BY priority LIMIT 1").fetchone()
+        if row is None:
+            return None
+        url = row[0]
+        self.set_state(url, 'in_flight')
+        self.in_flight.add(url)
+        return url
+
+    def add(self, urls):
+        new_urls = []
+        for url in dict.fromkeys(canonicalize(url) for url in urls):
+            if not within_depth(url, self.max_depth):
+                continue
+            # Failed URLs may be queued again, every other known URL is left alone
+            cursor = self.conn.execute(
+                "INSERT INTO urls (url, state, priority, bucket) VALUES (?, 'queued', ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET state = 'queued' WHERE state = 'failed'",
+                (url, self.priority(url), url_bucket(url))
+            )
+            if cursor.rowcount:
+                new_urls.append(url)
+        self.changed(len(new_urls))
+        return new_urls
+
+    def add_content(self, urls):
+        new_urls = []
+        for url in dict.fromkeys(canonicalize(url) for url in urls):
+            cursor = self.conn.execute(
+                "INSERT INTO urls (url, state, bucket) VALUES (?, 'content', ?) "
+                "ON CONFLICT(url) DO UPDATE SET state = 'content' WHERE state IN ('queued', 'failed')",
+                (url, url_bucket(url))
+            )
+            if cursor.rowcount:
+                new_urls.append(url)
+                self.content_urls.append(url)
+        self.changed(len(new_urls))
+        return new_urls
+
+    def mark_visited(self, url):
+        self.in_flight.discard(url)
+        self.set_state(url, 'visited')
+
+    def mark_content(self, url):
+        self.in_flight.discard(url)
+        self.set_state(url, 'content')
+        self.content_urls.append(url)
+
+    def mark_failed(self, url):
+        self.in_flight.discard(url)
+        self.set_state(url, 'failed')
+
+    def release(self, url):
+        self.in_flight.discard(url)
+        self.set_state(url, 'queued')
+
+    def release_all(self):
+        for url in list(self.in_flight):
+            self.release(url)
+
+    def set_state(self, url, state):
+        self.conn.execute("UPDATE urls SET state = ? WHERE url = ?", (state, url))
+        self.changed()
+
+    def changed(self, count=1):
+        self.pending += count
+        if self.pending >= self.batch_size or time.monotonic() - self.last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+        self.last_commit = time.monotonic()
+
+    def count(self, *states):
+        placeholders = ", ".join("?" for _ in states)
+        return self.conn.execute(f"SELECT COUNT(*) FROM urls WHERE state IN ({placeholders})", states).fetchone()[0]
+
+    def num_queued(self):
+        return self.count('queued', 'in_flight')
+
+    def num_visited(self):
+        return self.count('visited')
+
+    def pending_elsewhere(self):
+        """
+            True if URLs of other shards are queued or in flight. Their pages may
+            still link to URLs of this shard, so its workers should wait.
+        """
+        if not self.shard:
+            return False
+        return self.conn.execute(f"SELECT 1 FROM urls WHERE state IN ('queued', 'in_flight') AND NOT ({self.mine}) "
+                                 f"LIMIT 1").fetchone() is not None
+
+    def num_content(self):
+        return self.count('content')
+
+    def save(self):
+        self.commit()
+        with open(self.content_path, "a", encoding="utf-8") as f:
+            for url in self.content_urls[self.content_saved:]:
+                f.write(url + "\n")
+        self.content_saved = len(self.content_urls)
+
+    def close(self):
+        if self.conn:
+            self.release_all()
+            self.commit()
+            self.conn.close()
+            self.conn = None
+
+
+def connect(db_path):
+    # The processes of a sharded crawl write to the same database, wait for each other's commits
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                 "priority REAL NOT NULL DEFAULT 0, bucket INTEGER)")
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(urls)")]
+    if "priority" not in columns:
+        # Databases from before the priority frontier
+        conn.execute("ALTER TABLE urls ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+    if "bucket" not in columns:
+        # Databases from before sharded crawls
+        conn.execute("ALTER TABLE urls ADD COLUMN bucket INTEGER")
+        conn.create_function("url_bucket", 1, url_bucket, deterministic=True)
+        conn.execute("UPDATE urls SET bucket = url_bucket(url)")
+        conn.commit()
+    conn.execute("DROP INDEX IF EXISTS urls_state")
+    conn.execute("CREATE INDEX IF NOT EXISTS urls_state_priority ON urls (state, priority)")
+    return conn
+
+
+def import_txt(db_path='./data/crawl.db', visited_path='./data/visited.txt',
+               to_explore_path='./data/to_explore.txt', content_path='./data/content_urls.txt'):
+    """
+        One-time import of the txt crawl state into the SQLite database.
+        Content and visited URLs win over queued ones, existing rows are kept.
+    """
+    conn = connect(db_path)
+    counts = {}
+    for path, state in [(content_path, 'content'), (visited_path, 'visited'), (to_explore_path, 'queued')]:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            urls = [(canonicalize(line), state, path_depth(line), url_bucket(line)) for line in f if line.strip()]
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO urls (url, state, priority, bucket) VALUES (?, ?, ?, ?)", urls)
+        counts[state] = conn.total_changes - before
+    conn.commit()
+    conn.close()
+    for state, count in counts.items():
+        print(f"✅ Imported {count} {state} URLs into {db_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the SQLite crawl frontier.")
+    parser.add_argument("command", choices=["import-txt"])
+    parser.add_argument("--db", default="./data/crawl.db")
+    args = parser.parse_args()
+    if args.command == "import-txt":
+        import_txt(args.db)
@@ -1,39 +1,77 @@
-import json
+"""
+    Writes the article / section tree of a corpus to a text file.
 
-def build_article_structure(article, indent=0):
+    The articles are read and written one at a time (see corpus.iter_corpus),
+    from a JSON array file, the JSONL store or a .corpus file, so the memory
+    used does not grow with the size of the corpus.
+    By default the JSONL article store the scraper writes is read.
+    `--url-prefix` keeps the articles whose canonical link (see urls.canonicalize)
+    starts with the canonical form of the prefix, `--max-depth` the sections
+    down to that level (0: article names only).
+    `python benchmark.py viewer` measures time and peak memory as the corpus grows.
+"""
+
+import argparse
+
+from article_store import articles_path
+from corpus import iter_corpus
+from urls import canonicalize
+
+
+def build_article_structure(article, indent=0, max_depth=None):
     lines = []
     name = article.get("name", "Unnamed Article")
     lines.append("  " * indent + f"📘 {name}")
-    
+
     content = article.get("content", {})
-    lines.extend(build_section_tree(content, indent + 1))
-    
+    if isinstance(content, dict):  # markdown articles have no section tree
+        lines.extend(build_section_tree(content, indent + 1, max_depth))
+
     return lines
 
-def build_section_tree(section_dict, indent):
+def build_section_tree(section_dict, indent, max_depth=None):
     lines = []
+    if max_depth is not None and indent > max_depth:
+        return lines
     for key, value in section_dict.items():
         if key in ["title", "content"]:
             continue
         lines.append("  " * indent + f"📂 {key}")
         if isinstance(value, dict):
-            lines.extend(build_section_tree(value, indent + 1))
+            lines.extend(build_section_tree(value, indent + 1, max_depth))
     return lines
 
-def save_structure_to_file(json_file, output_file="article_structure.txt"):
-    with open(json_file, "r", encoding="utf-8") as f:
-        articles = json.load(f)
-
-    all_lines = []
-    for article in articles:
-        all_lines.extend(build_article_structure(article))
-        all_lines.append("")  # Add a blank line between articles
-
+def save_structure_to_file(json_file, output_file="article_structure.txt", url_prefix=None, max_depth=None):
+    """
+        Writes the tree of every article as soon as it is read, with a blank
+        line between articles. Returns the number of articles written.
+    """
+    if url_prefix:
+        # canonicalize drops the trailing slash that keeps /dog-owners/ from matching /dog-owners-guide
+        slash = "/" if url_prefix.endswith("/") else ""
+        url_prefix = canonicalize(url_prefix)
+        if not url_prefix.endswith("/"):
+            url_prefix += slash
+    count = 0
     with open(output_file, "w", encoding="utf-8") as out:
-        out.write("\n".join(all_lines))
+        for article in iter_corpus(json_file):
+            if url_prefix and not canonicalize(article.get("link", "")).startswith(url_prefix):
+                continue
+            lines = build_article_structure(article, max_depth=max_depth)
+            lines.append("")  # Add a blank line between articles
+            out.write(("\n" if count else "") + "\n".join(lines))
+            count += 1
 
-    print(f"Structure saved to: {output_file}")
+    print(f"Structure of {count} articles saved to: {output_file}")
+    return count
 
 if __name__ == "__main__":
-    # Replace with your actual file name
-    save_structure_to_file("merck_articles.json")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Write the article and section tree of a corpus to a text file.")
+    parser.add_argument("corpus", nargs="?", default=articles_path,
+                        help="JSON array file, JSONL store or .corpus file.")
+    parser.add_argument("--output", default="article_structure.txt", help="Where the tree is written.")
+    parser.add_argument("--url-prefix", default=None,
+                        help="Only the articles whose canonical link starts with this, e.g. .../dog-owners/.")
+    parser.add_argument("--max-depth", type=int, default=None, help="Deepest section level shown, 0 for names only.")
+    args = parser.parse_args()
+    save_structure_to_file(args.corpus, args.output, args.url_prefix, args.max_depth)
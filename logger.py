@@ -0,0 +1,197 @@
+"""
+    Logging for the crawler and scraper runs.
+
+    setup_logging() is called by the entry points, importing a module never
+    touches stdout. Log calls only put the record on a queue; a background
+    thread (logging.handlers.QueueListener) formats it and writes it to
+    - the terminal, the bare message as print would show it,
+    - logs/<name>.log, buffered and flushed at most every `flush_seconds`.
+      The file rotates at `max_bytes` and when a new run starts, rotated files
+      are gzip-compressed (<name>.log.1.gz is the previous one) and only
+      `backups` of them are kept.
+    The file format is "text" or "json" (one object per line with time, level,
+    logger, message and any `extra` fields such as the URL).
+
+    Levels: the per-link noise of the crawler is DEBUG, per-URL progress INFO,
+    so --log-level WARNING keeps only problems and the final reports.
+    Modules that still print (fetcher, freshness, ...) are captured while the
+    run lasts: their lines become INFO records of the "print" logger. The
+    end-of-run summaries are written inside `with reporting()`, which makes
+    them records of the "report" logger, kept at every --log-level.
+"""
+
+import contextlib
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import time
+
+log_dir = "logs"
+log_levels = ["DEBUG", "INFO", "WARNING", "ERROR"]
+# Logger of the end-of-run summaries, not filtered by the level of the run
+report_logger = "report"
+# Libraries whose DEBUG/INFO records would drown the run's own
+quiet_loggers = ["asyncio", "hpack", "httpcore", "httpx"]
+
+# Attributes every LogRecord has, anything else was passed with `extra`
+standard_attributes = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+listener = None
+captured_stdout = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in standard_attributes:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+        RotatingFileHandler that gzips the rotated files and flushes the current
+        one at most every `flush_seconds` instead of after every record.
+    """
+    def __init__(self, path, max_bytes, backups, flush_seconds=1.0):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.flush_seconds = flush_seconds
+        self.flushed = time.monotonic()
+        self.namer = lambda name: name + ".gz"
+        self.rotator = compress
+
+    def flush(self):
+        if time.monotonic() - self.flushed >= self.flush_seconds:
+            self.flush_now()
+
+    def flush_now(self):
+        self.flushed = time.monotonic()
+        super().flush()
+
+    def close(self):
+        self.acquire()
+        try:
+            if self.stream:
+                self.flush_now()
+        finally:
+            self.release()
+        super().close()
+
+
+def compress(source, destination):
+    with open(source, "rb") as f_in, gzip.open(destination, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class PrintCapture:
+    """
+        Stand-in for sys.stdout that turns every printed line into a log record.
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self.pending = ""
+
+    def write(self, text):
+        self.pending += text
+        while "\n" in self.pending:
+            line, self.pending = self.pending.split("\n", 1)
+            if line.strip():
+                self.logger.info(line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def setup_logging(name, level="INFO", log_format="text", max_bytes=50 * 2 ** 20, backups=10,
+                  flush_seconds=1.0, directory=log_dir, console=True):
+    """
+        Starts the background writer for a run of `name` ("crawler", "scraper")
+        and returns the path of the log file. Call stop_logging() at the end.
+        Without `console` the records only go to the file, e.g. in the worker
+        processes of a sharded run.
+    """
+    global listener, captured_stdout
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.log")
+
+    handlers = []
+    if console:
+        terminal = logging.StreamHandler(sys.__stdout__)
+        terminal.setFormatter(logging.Formatter("%(message)s"))
+        handlers.append(terminal)
+    file_handler = CompressedRotatingFileHandler(path, max_bytes, backups, flush_seconds)
+    if log_format == "json":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    if os.path.getsize(path) > 0:
+        file_handler.doRollover()  # every run starts a new file
+    handlers.append(file_handler)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
+    logging.getLogger(report_logger).setLevel(logging.INFO)
+    for name in quiet_loggers:
+        logging.getLogger(name).setLevel(max(logging.getLevelName(level), logging.WARNING))
+    listener = logging.handlers.QueueListener(records, *handlers)
+    listener.start()
+
+    captured_stdout = sys.stdout
+    sys.stdout = PrintCapture(logging.getLogger("print"))
+    return path
+
+
+@contextlib.contextmanager
+def reporting():
+    """
+        Within the block, printed lines are INFO records of the "report" logger
+        instead of the "print" logger. Yields that logger, for the summaries
+        logged rather than printed.
+    """
+    report = logging.getLogger(report_logger)
+    capture = sys.stdout if isinstance(sys.stdout, PrintCapture) else None
+    if capture is None:
+        yield report
+        return
+    previous, capture.logger = capture.logger, report
+    try:
+        yield report
+    finally:
+        capture.logger = previous
+
+
+def stop_logging():
+    """
+        Writes the queued records, closes the log file and gives stdout back.
+    """
+    global listener, captured_stdout
+    if captured_stdout is not None:
+        sys.stdout = captured_stdout
+        captured_stdout = None
+    if listener is not None:
+        listener.stop()  # processes what is left in the queue
+        for handler in listener.handlers:
+            handler.close()
+        listener = None
+        logging.getLogger().handlers = []
+
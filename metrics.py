@@ -0,0 +1,366 @@
+"""
+    Per-URL tracing, run-wide metrics and profiling.
+
+    Tracing is off unless a run asks for it (--trace, --metrics-port). Then every
+    URL a crawl or scrape worker handles gets a Trace with
+    - the time spent in each stage: "wait" (rate limiter), "fetch", "parse",
+      "cache", "detect" (content check), "links", "extract" and "store",
+    - the HTTP status, the engine and the bytes received,
+    - the browser round trips (IPC calls) made through the worker's page.
+    Finished traces are appended to a JSONL file and folded into counters and
+    histograms, served in the Prometheus text format on
+    http://127.0.0.1:<port>/metrics and written next to the trace at exit.
+
+    The trace of the URL being handled lives in a context variable, so the
+    fetcher and the extraction code record their stages without it being
+    passed around: every worker task sees its own.
+
+    run() wraps asyncio.run in a profiler for --profile: pyinstrument in async
+    mode if installed (await time is charged to the awaiting coroutine),
+    cProfile otherwise.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import cProfile
+import inspect
+import json
+import os
+import pstats
+import time
+from datetime import datetime
+
+from logger import reporting
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+current = contextvars.ContextVar("trace", default=None)
+tracer = None  # the Tracer of the run, None while tracing is off
+
+# Histogram buckets in seconds
+stage_buckets = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+descriptions = {
+    "scraper_urls_total": "URLs handled, by worker kind and outcome.",
+    "scraper_responses_total": "Responses received, by engine and HTTP status.",
+    "scraper_bytes_total": "Response bytes received.",
+    "scraper_ipc_calls_total": "Browser round trips made through the worker pages.",
+    "scraper_stage_seconds": "Time spent per URL in each stage.",
+    "scraper_url_seconds": "Total time spent per URL.",
+}
+
+
+class CountingProxy:
+    """
+        Wraps a Playwright object and counts the awaited calls made through it,
+        each of which is one round trip to the browser. Playwright objects it
+        returns (pages, element handles, responses) are wrapped as well.
+    """
+    def __init__(self, target, counter):
+        self._target = target
+        self._counter = counter
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if inspect.iscoroutinefunction(value):
+            async def counted(*args, **kwargs):
+                self._counter["calls"] += 1
+                return wrap(await value(*args, **kwargs), self._counter)
+            return counted
+        return wrap(value, self._counter)
+
+
+def wrap(value, counter):
+    if isinstance(value, list):
+        return [wrap(item, counter) for item in value]
+    if type(value).__module__.startswith("playwright."):
+        return CountingProxy(value, counter)
+    return value
+
+
+class Trace:
+    def __init__(self, url, kind):
+        self.url = url
+        self.kind = kind  # "crawl" or "scrape"
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.status = None
+        self.engine = None
+        self.bytes = 0
+        self.ipc = {"calls": 0}
+        self.outcome = None
+
+    def record(self):
+        return {
+            "url": self.url,
+            "kind": self.kind,
+            "started": round(self.started, 3),
+            "seconds": round(time.perf_counter() - self.start, 6),
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "status": self.status,
+            "engine": self.engine,
+            "bytes": self.bytes,
+            "ipc": self.ipc["calls"],
+            "outcome": self.outcome,
+        }
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+        Adds the time spent in the block to stage `name` of the current trace.
+    """
+    trace = current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages[name] = trace.stages.get(name, 0) + time.perf_counter() - start
+
+
+def note(status=None, engine=None, size=None, outcome=None):
+    """
+        Records the response or the outcome on the current trace, if any.
+    """
+    trace = current.get()
+    if trace is None:
+        return
+    if status is not None:
+        trace.status = status
+    if engine is not None:
+        trace.engine = engine
+    if size is not None:
+        trace.bytes += size
+    if outcome is not None:
+        trace.outcome = outcome
+
+
+@contextlib.contextmanager
+def traced(url, kind):
+    """
+        Traces the handling of one URL. Yields the Trace, or None while tracing is off.
+        A block left with an exception gets the outcome "error" unless one was noted.
+    """
+    if tracer is None:
+        yield None
+        return
+    trace = Trace(url, kind)
+    token = current.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        trace.outcome = trace.outcome or "error"
+        raise
+    finally:
+        current.reset(token)
+        tracer.finish(trace)
+
+
+def count_ipc(page, trace):
+    """
+        Returns the page wrapped so its round trips count towards `trace`.
+    """
+    if trace is None or page is None:
+        return page
+    return CountingProxy(page, trace.ipc)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """
+        Counters and cumulative histograms, keyed by name and sorted label pairs.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}  # key -> [count per bucket..., count, sum]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.setdefault(key, [0] * len(stage_buckets) + [0, 0.0])
+        for i, bound in enumerate(stage_buckets):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += value
+
+    def add_trace(self, trace):
+        self.inc("scraper_urls_total", kind=trace.kind, outcome=trace.outcome or "unknown")
+        if trace.status is not None:
+            self.inc("scraper_responses_total", engine=trace.engine, status=trace.status)
+        self.inc("scraper_bytes_total", trace.bytes)
+        self.inc("scraper_ipc_calls_total", trace.ipc["calls"])
+        for name, seconds in trace.stages.items():
+            self.observe("scraper_stage_seconds", seconds, kind=trace.kind, stage=name)
+        self.observe("scraper_url_seconds", time.perf_counter() - trace.start, kind=trace.kind)
+
+    def exposition(self):
+        """
+            Returns the metrics in the Prometheus text format.
+        """
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines += [f"# HELP {name} {descriptions.get(name, name)}", f"# TYPE {name} counter"]
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines += [f"# HELP {name} {descriptions.get(name, name)}", f"# TYPE {name} histogram"]
+            for bound, count in zip(stage_buckets, histogram):
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram[-2]}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram[-2]}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram[-1]:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def stage_totals(self):
+        """
+            Returns {stage: total seconds} over all traces.
+        """
+        totals = {}
+        for (name, labels), histogram in self.histograms.items():
+            if name == "scraper_stage_seconds":
+                stage_name = dict(labels)["stage"]
+                totals[stage_name] = totals.get(stage_name, 0) + histogram[-1]
+        return totals
+
+
+class Tracer:
+    """
+        Writes the finished traces to `path` (JSONL) and keeps the aggregated
+        Metrics, served on 127.0.0.1:`port` if a port is given.
+    """
+    def __init__(self, path=None, port=None):
+        self.path = path
+        self.port = port
+        self.file = None
+        self.server = None
+        self.metrics = Metrics()
+        self.traced = 0
+
+    async def start(self):
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, "a", encoding="utf-8")
+        if self.port:
+            self.server = await asyncio.start_server(self.serve, "127.0.0.1", self.port)
+            print(f"📈 Metrics on http://127.0.0.1:{self.port}/metrics")
+        return self
+
+    def finish(self, trace):
+        self.traced += 1
+        self.metrics.add_trace(trace)
+        if self.file:
+            self.file.write(json.dumps(trace.record(), ensure_ascii=False) + "\n")
+
+    async def serve(self, reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass  # skip the headers
+            if request.split()[1:2] == [b"/metrics"]:
+                body = self.metrics.exposition().encode("utf-8")
+                head = "HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            else:
+                body = b"Not found\n"
+                head = "HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n"
+            writer.write(f"{head}Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.file:
+            self.file.close()
+            metrics_path = os.path.splitext(self.path)[0] + ".prom"
+            with open(metrics_path, "w", encoding="utf-8") as f:
+                f.write(self.metrics.exposition())
+            print(f"📈 Traced {self.traced} URLs to {self.path}, metrics in {metrics_path}")
+        self.report()
+
+    def report(self):
+        totals = self.metrics.stage_totals()
+        spent = sum(totals.values())
+        if not spent:
+            return
+        shares = ", ".join(f"{name} {seconds / spent:.0%} ({seconds:.1f}s)"
+                           for name, seconds in sorted(totals.items(), key=lambda item: -item[1]))
+        print(f"⏱️ Time per stage: {shares}")
+
+
+async def start_tracing(path=None, port=None):
+    """
+        Turns tracing on for the run if a trace file or a metrics port is given.
+    """
+    global tracer
+    if path or port:
+        tracer = await Tracer(path, port).start()
+    return tracer
+
+
+async def stop_tracing():
+    global tracer
+    if tracer is not None:
+        with reporting():
+            await tracer.close()
+        tracer = None
+
+
+def run(coroutine, profile=False):
+    """
+        asyncio.run, with `profile` inside a profiler whose report is saved to logs/.
+    """
+    if not profile:
+        return asyncio.run(coroutine)
+    os.makedirs("logs", exist_ok=True)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    if pyinstrument is not None:
+        profiler = pyinstrument.Profiler(async_mode="enabled")
+
+        async def profiled():
+            with profiler:
+                return await coroutine
+
+        try:
+            return asyncio.run(profiled())
+        finally:
+            profile_path = f"logs/profile_{timestamp}.html"
+            with open(profile_path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            print(profiler.output_text(unicode=True, show_all=False))
+            print(f"🔬 Profile saved to {profile_path}")
+    print("⚠️ pyinstrument not installed, profiling with cProfile (awaits are not followed).")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return asyncio.run(coroutine)
+    finally:
+        profiler.disable()
+        profile_path = f"logs/profile_{timestamp}.prof"
+        profiler.dump_stats(profile_path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+        print(f"🔬 Profile saved to {profile_path}, open it with `python -m pstats {profile_path}`")
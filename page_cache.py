@@ -0,0 +1,336 @@
+"""
+    On-disk cache of the fetched HTML of every page.
+
+    Pages are stored content-addressed: the HTML is compressed (zstd if the
+    zstandard package is installed, gzip otherwise) into blobs/<hash>.html.zst
+    or .html.gz, where <hash> is the SHA-256 of the HTML. An SQLite index maps
+    each canonical URL to the hash of its last fetch, so identical pages share
+    one blob. When the blobs exceed `max_bytes` the least recently used ones are
+    evicted, pages older than `max_age` days can be dropped as well.
+    put() only queues the page: a writer thread compresses it, writes the blob
+    and commits the index every `batch_size` pages or `commit_interval`
+    seconds, so the event loop of the fetcher does not wait for the disk.
+
+    `python page_cache.py reextract` re-extracts the articles of the store from the
+    cache with several processes and without opening a browser, so a change to
+    the extraction rules does not require fetching the site again.
+    `python page_cache.py stats` shows the size of the cache.
+"""
+
+import argparse
+import gzip
+import hashlib
+import multiprocessing
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+
+from extraction import layouts
+from urls import canonicalize
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+cache_path = './data/html_cache'
+
+
+def compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=9).compress(data), "zst"
+    return gzip.compress(data, compresslevel=6), "gz"
+
+
+def decompress(data, codec):
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PageCache:
+    def __init__(self, path=cache_path, max_bytes=2 * 2 ** 30, max_age=None, batch_size=50, commit_interval=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.conn = None
+        self.writes = queue.SimpleQueue()
+        self.writer = None  # started by the first put
+        self.total = 0
+        self.counts = {"stored": 0, "unchanged": 0, "evicted": 0}
+
+    def connect(self):
+        return sqlite3.connect(os.path.join(self.path, "index.db"), timeout=30)
+
+    def open(self):
+        os.makedirs(os.path.join(self.path, "blobs"), exist_ok=True)
+        self.conn = self.connect()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS blobs "
+                          "(hash TEXT PRIMARY KEY, codec TEXT, size INTEGER, used_at REAL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pages "
+                          "(url TEXT PRIMARY KEY, hash TEXT, fetched_at REAL)")
+        self.conn.commit()
+        self.total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if self.max_age:
+            self.expire()
+        return self
+
+    def close(self):
+        if self.writer is not None:
+            self.writes.put(None)
+            self.writer.join()  # stores what is still queued
+            self.writer = None
+        if self.conn:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def blob_path(self, content_hash, codec):
+        return os.path.join(self.path, "blobs", content_hash[:2], f"{content_hash}.html.{codec}")
+
+    def put(self, url, html):
+        """
+            Queues the HTML of a page for the writer thread and returns right away.
+        """
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write_pages, name="page-cache-writer", daemon=True)
+            self.writer.start()
+        self.writes.put((url, html))
+
+    def write_pages(self):
+        """
+            Runs in the writer thread, with a connection of its own, until close().
+        """
+        conn = self.connect()
+        pending = 0
+        first_pending = 0
+        try:
+            while True:
+                try:
+                    item = self.writes.get(timeout=self.commit_interval)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    return
+                if item:
+                    try:
+                        self.store(conn, *item)
+                    except Exception as e:
+                        print(f"⚠️ Failed to cache {item[0]}: {e}")
+                        continue
+                    if not pending:
+                        first_pending = time.monotonic()
+                    pending += 1
+                if pending and (pending >= self.batch_size
+                                or time.monotonic() - first_pending >= self.commit_interval):
+                    conn.commit()
+                    pending = 0
+        finally:
+            conn.commit()
+            conn.close()
+
+    def store(self, conn, url, html):
+        """
+            Stores the HTML of a page and returns its content hash. Commits only when evicting.
+        """
+        data = html.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        row = conn.execute("SELECT codec FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            compressed, codec = compress(data)
+            write_blob(self.blob_path(content_hash, codec), compressed)
+            # OR IGNORE: another process of a sharded run may have stored the same snapshot meanwhile
+            conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+                         (content_hash, codec, len(compressed), now))
+            self.total += len(compressed)
+            self.counts["stored"] += 1
+        else:
+            conn.execute("UPDATE blobs SET used_at = ? WHERE hash = ?", (now, content_hash))
+            self.counts["unchanged"] += 1
+        conn.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (canonicalize(url), content_hash, now))
+        if self.total > self.max_bytes:
+            self.evict(conn)
+        return content_hash
+
+    def get(self, url):
+        """
+            Returns the cached HTML of the URL, or None.
+        """
+        row = self.conn.execute("SELECT blobs.hash, codec FROM pages JOIN blobs ON pages.hash = blobs.hash "
+                                "WHERE url = ?", (canonicalize(url),)).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE blobs SET used_at = ? WHERE hash = ?", (time.time(), row[0]))
+        self.conn.commit()
+        return read_blob(self.blob_path(*row), row[1])
+
+    def entries(self):
+        """
+            Returns (url, blob path, codec) of every cached page, sorted by URL.
+        """
+        rows = self.conn.execute("SELECT url, blobs.hash, codec FROM pages JOIN blobs ON pages.hash = blobs.hash "
+                                 "ORDER BY url").fetchall()
+        return [(url, self.blob_path(content_hash, codec), codec) for url, content_hash, codec in rows]
+
+    def evict(self, conn):
+        """
+            Deletes the least recently used blobs until the cache is below 90% of max_bytes.
+        """
+        target = self.max_bytes * 0.9
+        # Other processes may have added blobs since this one opened the cache
+        self.total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        rows = conn.execute("SELECT hash, codec, size FROM blobs ORDER BY used_at").fetchall()
+        for content_hash, codec, size in rows:
+            if self.total <= target:
+                break
+            self.delete_blob(conn, content_hash, codec, size)
+        conn.commit()
+
+    def expire(self):
+        """
+            Drops the pages fetched more than max_age days ago, and the blobs no page uses anymore.
+        """
+        cutoff = time.time() - self.max_age * 86400
+        self.conn.execute("DELETE FROM pages WHERE fetched_at < ?", (cutoff,))
+        rows = self.conn.execute("SELECT hash, codec, size FROM blobs "
+                                 "WHERE hash NOT IN (SELECT hash FROM pages)").fetchall()
+        for row in rows:
+            self.delete_blob(self.conn, *row)
+        self.conn.commit()
+
+    def delete_blob(self, conn, content_hash, codec, size):
+        try:
+            os.remove(self.blob_path(content_hash, codec))
+        except FileNotFoundError:
+            pass
+        conn.execute("DELETE FROM pages WHERE hash = ?", (content_hash,))
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (content_hash,))
+        self.total -= size
+        self.counts["evicted"] += 1
+
+    def report(self):
+        print(f"🗄️ Page cache: {self.counts['stored']} new snapshots, {self.counts['unchanged']} unchanged, "
+              f"{self.counts['evicted']} evicted, {self.total / 2 ** 20:.1f} MB on disk.")
+
+
+def write_blob(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def read_blob(path, codec):
+    try:
+        with open(path, "rb") as f:
+            return decompress(f.read(), codec).decode("utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def extract_entry(entry):
+    """
+        Runs in a worker process: extracts the article of one cached page.
+    """
+    import lxml.html
+    from extraction import article_from_tree
+
+    url, path, codec, layout = entry
+    html = read_blob(path, codec)
+    if not html:
+        return url, None
+    return url, article_from_tree(url, lxml.html.fromstring(html), layout)
+
+
+def reextract(cache_dir=cache_path, output='./data/merck-articles.jsonl', workers=None, layout="markdown"):
+    """
+        Extracts the article of every cached page with `workers` processes and
+        replaces their records in the article store at `output`. Articles
+        whose page is not cached (evicted or never fetched) are kept as they
+        are. Cached hub pages are skipped.
+        `layout` selects markdown or section tree content, see extraction.layouts.
+    """
+    from article_store import ArticleStore, iter_articles
+
+    with PageCache(cache_dir) as cache:
+        entries = [entry + (layout,) for entry in cache.entries()]
+    workers = workers or os.cpu_count() or 1
+    print(f"Re-extracting {len(entries)} cached pages with {workers} processes...")
+    start = time.perf_counter()
+    temp_output = output + ".tmp"
+    merged_output = output + ".merged.tmp"
+    for path in [temp_output, merged_output]:
+        if os.path.exists(path):
+            os.remove(path)  # left over from an interrupted run
+    skipped = 0
+    extracted = set()
+    with ArticleStore(temp_output, fsync_every=1000) as store:
+        with multiprocessing.Pool(workers) as pool:
+            for url, article in pool.imap(extract_entry, entries, chunksize=16):
+                if article is None:
+                    skipped += 1
+                    continue
+                store.append(article)
+                extracted.add(canonicalize(article["link"]))
+    # The records of the other articles are kept, the re-extracted ones replace theirs
+    kept = set()
+    with ArticleStore(merged_output, fsync_every=1000) as merged:
+        for article in iter_articles(output):
+            link = canonicalize(article["link"])
+            if link not in extracted:
+                kept.add(link)
+                merged.append(article)
+        for article in iter_articles(temp_output):
+            merged.append(article)
+    os.replace(merged_output, output)
+    os.remove(temp_output)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Wrote {store.written} articles to {output} in {elapsed:.1f}s "
+          f"({skipped} pages without main content skipped).")
+    if kept:
+        print(f"⚠️ {len(kept)} articles of the store have no cached page and were kept as they were.")
+    print("   Run `python article_store.py export` to refresh the JSON array.")
+
+
+def stats(cache_dir=cache_path):
+    with PageCache(cache_dir) as cache:
+        pages = cache.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        blobs = cache.conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+        print(f"{pages} pages in {blobs} snapshots, {cache.total / 2 ** 20:.1f} MB "
+              f"({'zstd' if zstandard else 'gzip'} for new snapshots).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache of the fetched HTML pages.")
+    parser.add_argument("command", choices=["reextract", "stats"])
+    parser.add_argument("--cache-dir", default=cache_path)
+    parser.add_argument("--output", default='./data/merck-articles.jsonl', help="Article store to update.")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes, all CPUs by default.")
+    parser.add_argument("--layout", choices=layouts, default="markdown",
+                        help="Article content as markdown or as the nested section tree.")
+    args = parser.parse_args()
+
+    if args.command == "reextract":
+        reextract(args.cache_dir, args.output, args.workers, args.layout)
+    else:
+        stats(args.cache_dir)
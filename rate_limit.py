@@ -0,0 +1,126 @@
+"""
+    Adaptive per-host rate limiting.
+
+    Each host gets a token bucket refilled at `rate` requests per second with
+    room for `burst` requests. The rate follows AIMD: every 403/429/5xx answer
+    halves it and blocks the host for a cooldown that doubles while the errors
+    continue (or for Retry-After if the server sends one). Answers to requests
+    that were already in flight when the host got blocked do not slow it down
+    again. Every successful request adds `increase` back, up to `max_rate`
+    (never below the initial `rate`).
+"""
+
+import argparse
+import asyncio
+import time
+from urllib.parse import urlparse
+
+
+def is_throttled(status):
+    return status in [403, 429] or status >= 500
+
+
+def positive_rate(value):
+    """
+        argparse type of the --rate options.
+    """
+    try:
+        rate = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate: {value!r}")
+    if not rate > 0:
+        raise argparse.ArgumentTypeError(f"the rate must be above 0 requests per second, got {value}")
+    return rate
+
+
+class HostBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.throttles = 0  # consecutive throttled answers
+        self.lock = asyncio.Lock()
+
+
+class RateLimiter:
+    def __init__(self, rate=5.0, burst=10, min_rate=0.2, max_rate=20.0, increase=0.1,
+                 decrease=0.5, cooldown=10, max_cooldown=300):
+        if not rate > 0 or burst < 1:
+            raise ValueError(f"The rate must be above 0 and the burst at least 1 (got {rate}, {burst})")
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        # A --rate above the default ceiling is not clamped back after the first success
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.buckets = {}
+        self.counts = {"requests": 0, "throttled": 0, "waited": 0.0}
+
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = HostBucket(self.rate, self.burst)
+        return self.buckets[host]
+
+    async def acquire(self, url):
+        """
+            Waits until a request to the host of `url` is allowed.
+        """
+        bucket = self.bucket(url)
+        start = time.monotonic()
+        async with bucket.lock:
+            while True:
+                now = time.monotonic()
+                if now < bucket.blocked_until:
+                    await asyncio.sleep(bucket.blocked_until - now)
+                    continue
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+                bucket.updated = now
+                if bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    break
+                await asyncio.sleep((1 - bucket.tokens) / bucket.rate)
+        self.counts["requests"] += 1
+        self.counts["waited"] += time.monotonic() - start
+
+    def report(self, url, status, retry_after=None):
+        """
+            Adjusts the rate of the host of `url` to the status of a finished request.
+        """
+        bucket = self.bucket(url)
+        if not is_throttled(status):
+            bucket.throttles = 0
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+            return
+        self.counts["throttled"] += 1
+        if time.monotonic() < bucket.blocked_until:
+            # Sent before the host was blocked, the backoff already accounts for it
+            return
+        cooldown = min(self.max_cooldown, self.cooldown * 2 ** bucket.throttles)
+        if retry_after is not None:
+            cooldown = max(cooldown, retry_after)
+        bucket.throttles += 1
+        bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+        bucket.tokens = 0
+        bucket.blocked_until = time.monotonic() + cooldown
+        print(f"🐢 HTTP {status} from {urlparse(url).netloc}, "
+              f"slowing down to {bucket.rate:.2f} requests/s and pausing for {cooldown:.0f} s")
+
+    def report_stats(self):
+        rates = ", ".join(f"{host}: {bucket.rate:.2f}/s" for host, bucket in self.buckets.items())
+        print(f"📊 Rate limiter: {self.counts['requests']} requests, {self.counts['throttled']} throttled, "
+              f"{self.counts['waited']:.0f} s waited in total. Current rates: {rates or 'none'}")
+
+
+def parse_retry_after(value):
+    """
+        Returns the Retry-After header in seconds, or None if it is missing or a date.
+    """
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
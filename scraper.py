@@ -1,100 +1,91 @@
 import asyncio
-import json
-from playwright.async_api import async_playwright
 import argparse
 import os
-import datetime
+import logging
 from tqdm import tqdm
+from extraction import extract_article, layouts
+from fetcher import Fetcher
+from rate_limit import RateLimiter, positive_rate
+from blocking import BlockingPolicy
+from urls import canonicalize
+from checkpoint import Checkpointer, atomic_write, install_stop_handlers, remove_stop_handlers
+from article_store import ArticleStore, articles_path, compact, count_articles, iter_articles
+from freshness import FreshnessIndex
+from page_cache import PageCache, cache_path
+from browser_manager import BrowserManager
+import metrics
+from metrics import count_ipc, note, stage, traced
+from logger import log_levels, reporting, setup_logging, stop_logging
+from shards import shard_path
 
 class AccessDenied(Exception):
     def __init__(self, url):
         super().__init__(f"403 Forbidden: Access denied to {url}")
         self.url = url
 
-sleep_time = 180 
-import sys
-import os
-from datetime import datetime
+class NotModified(Exception):
+    def __init__(self, url):
+        super().__init__(f"304 Not Modified: {url}")
+        self.url = url
 
-class DualLogger:
-    def __init__(self, log_path):
-        self.terminal = sys.stdout
-        self.log = open(log_path, "a", encoding="utf-8")
+class PageGone(Exception):
+    def __init__(self, url, status):
+        super().__init__(f"{status}: {url} no longer exists")
+        self.url = url
 
-    def write(self, message):
-        self.terminal.write(message)
-        self.log.write(message)
+# Attempts per article while the site answers 403, the rate limiter backs off in between
+max_attempts = 3
 
-    def flush(self):
-        # This is needed for compatibility with Python's logging system
-        self.terminal.flush()
-        self.log.flush()
+# URLs still to scrape, kept up to date while scraping
+to_scrape_path = './data/to_scrape.txt'
 
-# Create logs folder if not exist
-os.makedirs("logs", exist_ok=True)
+log = logging.getLogger("scraper")
 
-# Generate timestamped filename
-timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-log_file = f"logs/scraper_log_{timestamp}.txt"
 
-sys.stdout = DualLogger(log_file)
-sys.stderr = sys.stdout  # This sends error messages to the same log
-"""
-    Initializes the browser using Playwright with headless or non-headless mode.
-    Returns the browser context and page object.
-"""
-async def init_browser(headless=True):
-    playwright = await async_playwright().start()
-    browser = await playwright.chromium.launch(headless=headless)
-    context = await browser.new_context(viewport={"width": 1200, "height": 800})
-    page = await context.new_page()
-    # Block images, styles, fonts etc. to speed up scraping
-    async def block_resource(route, request):
-        if request.resource_type in ["image", "stylesheet", "font"]:
-            await route.abort()
-        else:
-            await route.continue_()
-
-    await page.route("**/*", block_resource)
-    return playwright, browser, page
-
-
-async def scrape_article(page, url):
+async def scrape_article(page, url, fetcher=None, conditional=False, layout="markdown"):
     """
         Scrapes the title and content of an article from the given URL.
-        Returns a dictionary with 'name', 'link', and 'content'.
+        Returns a dictionary with 'name', 'link', and 'content', the content
+        being markdown or the section tree depending on `layout`.
+        Without a fetcher the page is always loaded in the browser.
+        With `conditional` an unchanged page raises NotModified and a page
+        answering 404/410 raises PageGone.
     """
+    fetcher = fetcher or Fetcher("browser")
     try:
-        response = await page.goto(url, wait_until="domcontentloaded")
-        if response.status == 403: 
-            print(f"HTTP error 403, requests are being blocked, waiting for {sleep_time} seconds before retrying...")
-            await asyncio.sleep(sleep_time)  
-            response = await page.goto(url, wait_until="domcontentloaded")
-            if response.status == 403: 
-                print(f"HTTP error 403, requests are being blocked, terminating script for now.")
-                raise AccessDenied(url)
-        # Extract the title
-        title_element = await page.query_selector("h1")
-        title = await title_element.inner_text() if title_element else "Untitled"
-
-        # Extract the content
-        main_content = await page.query_selector('[data-testid="topic-main-content"]')
-        if main_content is None:
-            print(f"❌ No main content found at {url}.")
+        for attempt in range(1, max_attempts + 1):
+            result = await fetcher.fetch(url, page, conditional)
+            if result.status != 403:
+                break
+            log.warning(f"HTTP error 403, requests are being blocked (attempt {attempt}/{max_attempts}).",
+                        extra={"url": url})
+        if result.status == 403: 
+            log.error(f"HTTP error 403, requests are being blocked, terminating script for now.",
+                      extra={"url": url})
+            raise AccessDenied(url)
+        if result.status == 304:
+            raise NotModified(url)
+        if conditional and result.status in [404, 410]:
+            raise PageGone(url, result.status)
+        with stage("extract"):
+            article = await extract_article(result, layout)
+        if article is None:
+            log.warning(f"❌ No main content found at {url}.", extra={"url": url})
             return None
-        content = await element_to_markdown(main_content)
+    except (AccessDenied, NotModified, PageGone):
+        raise
     except:
-        print(f"❌ Failed to scrape article at {url}.")
-        await asyncio.sleep(sleep_time) 
+        log.warning(f"❌ Failed to scrape article at {url}.", extra={"url": url})
         return None
-    return {
-        "name": title.strip(),
-        "link": url,
-        "content": content
-    }
+    return article
 
 
 async def element_to_markdown(element):
+    """
+        Converts the element to markdown by walking its children from Python.
+        Kept as the reference implementation for extraction.extract_markdown,
+        which produces the same output in a single round trip.
+    """
     children = await element.query_selector_all(":scope > *")
     markdown = ""
 
@@ -135,69 +126,253 @@ async def element_to_markdown(element):
 
     return markdown.strip()
 
+async def scrape_worker(page, fetcher, queue, store, to_scrape, stop, progress, checkpointer=None,
+                        refresh=False, manager=None, layout="markdown"):
+    """
+        Scrapes URLs from the queue with its own page until the queue is empty,
+        another worker was denied access or a stop was requested.
+        Successful articles are appended to `store` and removed from `to_scrape`.
+        If the fetcher has a freshness index, articles that did not change since
+        the last run are not written again; with `refresh` they are not even
+        downloaded if the site answers the conditional request with 304.
+        With a browser_manager.BrowserManager the page is recycled between URLs,
+        and a URL whose page crashed is queued again.
+    """
+    freshness = fetcher.freshness
+    retries = {}
+    while not stop.is_set():
+        try:
+            url = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        # Also counted when the URL ends in a continue, or a refresh of unchanged pages never checkpoints
+        try:
+            with traced(url, "scrape") as trace:
+                crashed = False
+                try:
+                    article = await scrape_article(count_ipc(page, trace), url, fetcher, conditional=refresh,
+                                                   layout=layout)
+                except AccessDenied:
+                    note(outcome="denied")
+                    stop.set()
+                    raise
+                except NotModified:
+                    note(outcome="not_modified")
+                    freshness.not_modified(url)
+                    to_scrape.discard(url)
+                    continue
+                except PageGone as e:
+                    log.info(f"🗑️ {e}", extra={"url": url})
+                    note(outcome="gone")
+                    freshness.remove([url])
+                    to_scrape.discard(url)
+                    continue
+                finally:
+                    progress.update(1)
+                    if manager is not None:
+                        with stage("recycle"):
+                            page, crashed = await manager.refresh(page)
+                if crashed and retries.get(url, 0) < max_attempts:
+                    # The page died under this URL, try it again with the new page
+                    note(outcome="crashed")
+                    retries[url] = retries.get(url, 0) + 1
+                    queue.put_nowait(url)
+                    progress.total += 1
+                    continue
+                if not article:
+                    log.warning(f"⚠️ Failed to scrape article {url}", extra={"url": url})
+                    note(outcome="failed")
+                    continue
+                with stage("store"):
+                    if freshness is None or freshness.classify(url, article) != "unchanged":
+                        store.append(article)
+                        note(outcome="stored")
+                    else:
+                        note(outcome="unchanged")
+                to_scrape.discard(url)
+        finally:
+            if checkpointer:
+                checkpointer.page_done()
+
+
+async def scrape_pool(page, fetcher, urls, store, to_scrape, concurrency, stop=None, checkpointer=None,
+                      refresh=False, manager=None, layout="markdown", progress=None):
+    """
+        Scrapes all URLs with up to `concurrency` pages sharing the browser context of `page`.
+        Setting `stop` lets the workers finish their current page and return.
+        Progress goes to a tqdm bar unless another `progress` (update(), total) is given.
+        Raises AccessDenied once all workers have stopped if any of them was blocked.
+    """
+    queue = asyncio.Queue()
+    for url in urls:
+        queue.put_nowait(url)
+    stop = stop or asyncio.Event()
+
+    pages = [page]
+    for _ in range(min(concurrency, len(urls)) - 1):
+        pages.append(await manager.new_page() if manager else await page.context.new_page())
+
+    progress = progress or tqdm(total=len(urls), desc="Scraping articles")
+    try:
+        results = await asyncio.gather(
+            *(scrape_worker(p, fetcher, queue, store, to_scrape, stop, progress, checkpointer, refresh, manager,
+                            layout)
+              for p in pages),
+            return_exceptions=True
+        )
+    finally:
+        progress.close()
+    if manager is None:
+        for extra_page in pages[1:]:
+            await extra_page.close()
+
+    denied = None
+    for result in results:
+        if isinstance(result, AccessDenied):
+            denied = result
+        elif isinstance(result, BaseException):
+            log.error(f"❌ A scrape worker stopped unexpectedly: {result}", exc_info=result)
+    if denied:
+        raise denied
+
+
+def select_urls(freshness, refresh=False):
+    """
+        Returns the URLs of this run: with `refresh` every content URL (known
+        articles no longer listed are removed from `freshness`), otherwise the
+        ones in to_scrape.txt or, if it is empty, the content URLs not stored yet.
+    """
+    if refresh:
+        # Check every known article again, unchanged ones cost a 304 at most
+        with open('./data/content_urls.txt', "r", encoding="utf-8") as f:
+            urls = set(canonicalize(line) for line in f if line.strip())
+        freshness.seed(iter_articles())
+        freshness.remove(freshness.known_articles() - urls)
+    elif os.path.getsize(to_scrape_path) == 0:
+        with open('./data/content_urls.txt', "r", encoding="utf-8") as f:
+            urls = set(canonicalize(line) for line in f if line.strip())
+        # Articles already stored, e.g. by `crawler.py --scrape`, are not scraped again
+        urls -= set(canonicalize(article["link"]) for article in iter_articles())
+    else:
+        with open(to_scrape_path, "r", encoding="utf-8") as f:
+            urls = set(canonicalize(line) for line in f if line.strip())
+    return urls
+
+
 """
     Main function to launch browser, navigate to site, and run actions.
+    A sharded run (see shards.py) passes the `urls` of its `shard` (index, count)
+    and a `progress` reporting to the launcher; the articles and the URLs left
+    go to files of the shard. Returns the articles written and the URLs removed.
 """
-async def main():
-    playwright, browser, page = await init_browser(headless=True)
+async def main(concurrency=4, fetch_mode="auto", rate=5.0, burst=10, block_mode="on",
+               checkpoint_pages=50, checkpoint_seconds=60, cache_dir=cache_path, cache_size=2048,
+               refresh=False, recycle_every=200, memory_limit=2048, layout="markdown",
+               trace_path=None, metrics_port=None, urls=None, shard=None, progress=None):
+    # Per-URL stage timings and run-wide metrics, off unless asked for
+    await metrics.start_tracing(trace_path, metrics_port)
+    policy = BlockingPolicy(block_mode)
+    # Recycles the pages every `recycle_every` navigations and restarts crashed or bloated browsers
+    manager = await BrowserManager(headless=True, policy=policy, recycle_every=recycle_every,
+                                   memory_limit=memory_limit).start()
+    page = await manager.new_page()
+    limiter = RateLimiter(rate=rate, burst=burst)
+    # The fetched HTML is kept so `python page_cache.py reextract` can rebuild the articles offline
+    cache = PageCache(cache_dir, max_bytes=cache_size * 2 ** 20).open() if cache_dir else None
+    # ETag/Last-Modified and content hashes let later runs skip unchanged articles
+    freshness = FreshnessIndex().open()
+    fetcher = await Fetcher(fetch_mode, max_connections=concurrency, limiter=limiter, cache=cache,
+                            freshness=freshness).start()
 
-    size_to_scrape = os.path.getsize('./data/to_scrape.txt')
-    if size_to_scrape == 0:
-        with open('./data/content_urls.txt', "r", encoding="utf-8") as f:
-            urls = set(line.strip() for line in f if line.strip())
-    else: 
-        with open('./data/to_scrape.txt', "r", encoding="utf-8") as f:
-            urls = set(line.strip() for line in f if line.strip())
+    if urls is None:
+        urls = select_urls(freshness, refresh)
     to_scrape = set(urls)  # copy to track what still needs to be scraped
-    articles = []
+    to_scrape_file = shard_path(to_scrape_path, shard[0]) if shard else to_scrape_path
+    # Articles are appended to the JSONL store as soon as they are scraped
+    store = ArticleStore(shard_path(articles_path, shard[0]) if shard else articles_path).open()
 
+    def save_progress():
+        atomic_write(to_scrape_file, to_scrape)
+        store.sync()
+
+    stop = asyncio.Event()
+    install_stop_handlers(stop)
+    checkpointer = Checkpointer(save_progress, checkpoint_pages, checkpoint_seconds)
     try:
-        for i, url in enumerate(tqdm(urls, desc="Scraping articles\n")):
-            print('\n')
-            #print(f"\nScraping article {i + 1}/{len(urls)}: {url}")
-            article = await scrape_article(page, url)
-            if not article:
-                print(f"⚠️ Failed to scrape article {i + 1}")
-                continue
-            articles.append(article)
-            to_scrape.remove(url)
-            #if i%30 == 0:
-            #    await asyncio.sleep(sleep_time)  
+        await scrape_pool(page, fetcher, urls, store, to_scrape, concurrency, stop, checkpointer, refresh,
+                          manager, layout, progress)
     except KeyboardInterrupt:
-        print("❌ Interrupted by user. Saving progress...")
+        log.warning("❌ Interrupted by user. Saving progress...")
     except AccessDenied as e:
-        print(f"❌ Access denied to {e.url}.")
+        log.error(f"❌ Access denied to {e.url}.")
     except Exception as e:
-        print(f"❌ An unexpected error occurred: {e}")
+        log.exception(f"❌ An unexpected error occurred: {e}")
     finally:
+        remove_stop_handlers()
         try:
-            with open('./data/to_scrape.txt', "w", encoding="utf-8") as f:
-                for url in to_scrape:
-                    f.write(url + "\n")
-            # Update the merck-articles.json file with the new articles
-            if os.path.exists('./data/merck-articles.json'):
-                with open('./data/merck-articles.json', "r", encoding="utf-8") as f:
-                    merck_articles = json.load(f)
-            else:
-                merck_articles = []
-            merck_articles.extend(articles)
-            with open("./data/merck-articles.json", "w", encoding="utf-8") as f:
-                json.dump(merck_articles, f, ensure_ascii=False, indent=4)
-            print(f"✅ Scraped {len(articles)} new articles. Total: {len(merck_articles)}.")
+            atomic_write(to_scrape_file, to_scrape)
+            store.close()
+            if freshness.counts["changed"] or freshness.removed:
+                # Drop the outdated records of changed and removed articles
+                compact(store.path, drop=freshness.removed)
+            with reporting() as report:
+                report.info(f"✅ Scraped {store.written} new articles. Total: {count_articles(store.path)}.")
+                freshness.report()
+                fetcher.report()
+                policy.report()
+                manager.report()
         except Exception as e:
-            print(f"⚠️ Failed to save progress cleanly: {e}")
+            log.exception(f"⚠️ Failed to save progress cleanly: {e}")
         finally:
-            # Only try to close if initialized
-            if browser:
-                try:
-                    await browser.close()
-                except Exception as e:
-                    print(f"⚠️ Error while closing browser: {e}")
-            if playwright:
-                try:
-                    await playwright.stop()
-                except Exception as e:
-                    print(f"⚠️ Error while stopping playwright: {e}")
+            await fetcher.close()
+            freshness.close()
+            if cache is not None:
+                cache.close()
+            await manager.close()
+            await metrics.stop_tracing()
+    return {"written": store.written, "changed": freshness.counts["changed"], "removed": sorted(freshness.removed),
+            "left": len(to_scrape)}
    
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape the articles listed in to_scrape.txt or content_urls.txt.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of pages scraping in parallel.")
+    parser.add_argument("--fetch", choices=["auto", "http", "browser"], default="auto",
+                        help="auto: plain HTTP with browser fallback, http/browser: force one engine.")
+    parser.add_argument("--rate", type=positive_rate, default=5.0, help="Initial requests per second per host.")
+    parser.add_argument("--burst", type=int, default=10, help="Requests allowed in a burst per host.")
+    parser.add_argument("--block", choices=["on", "off", "observe"], default="on",
+                        help="Request blocking in the browser, observe only measures what it would save.")
+    parser.add_argument("--checkpoint-pages", type=int, default=50, help="Save progress every N articles.")
+    parser.add_argument("--checkpoint-seconds", type=float, default=60, help="Save progress every N seconds.")
+    parser.add_argument("--cache-dir", default=cache_path, help="Where the fetched HTML is kept.")
+    parser.add_argument("--cache-size", type=int, default=2048, help="Size cap of the HTML cache in MB.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not keep the fetched HTML.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Check all known articles for changes with conditional requests.")
+    parser.add_argument("--recycle-every", type=int, default=200, help="Open a fresh page after N navigations.")
+    parser.add_argument("--memory-limit", type=int, default=2048,
+                        help="Restart the browser above this many MB (needs psutil, 0 disables).")
+    parser.add_argument("--layout", choices=layouts, default="markdown",
+                        help="Article content as one markdown string or as the nested section tree.")
+    parser.add_argument("--trace", default=None,
+                        help="Write per-URL stage timings to this JSONL file, metrics to the same name with .prom.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics while running.")
+    parser.add_argument("--profile", action="store_true", help="Profile the run, the report is saved to logs/.")
+    parser.add_argument("--log-level", choices=log_levels, default="INFO",
+                        help="WARNING keeps only problems and the final reports.")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Format of logs/scraper.log.")
+    parser.add_argument("--log-max-mb", type=int, default=50, help="Rotate and compress the log file at this size.")
+    args = parser.parse_args()
+    # Queued logging with a background writer, prints of the other modules are captured too
+    setup_logging("scraper", args.log_level, args.log_format, args.log_max_mb * 2 ** 20)
+    try:
+        metrics.run(main(concurrency=max(1, args.concurrency), fetch_mode=args.fetch, refresh=args.refresh,
+                         layout=args.layout, trace_path=args.trace, metrics_port=args.metrics_port,
+                         recycle_every=args.recycle_every, memory_limit=args.memory_limit,
+                         rate=args.rate, burst=args.burst, block_mode=args.block,
+                         checkpoint_pages=args.checkpoint_pages, checkpoint_seconds=args.checkpoint_seconds,
+                         cache_dir=None if args.no_cache else args.cache_dir, cache_size=args.cache_size),
+                    profile=args.profile)
+    finally:
+        stop_logging()
@@ -0,0 +1,402 @@
+"""
+    Sharded crawl and scrape over several processes.
+
+    One event loop driving Chromium tops out at a few pages per second, so
+    `python shards.py scrape --workers K` and `python shards.py crawl --workers K`
+    start K processes, each with its own browser, fetcher and event loop.
+    URLs are partitioned by urls.shard_of, a stable hash, so a URL always
+    belongs to the same shard:
+    - scrape: the URLs scraper.select_urls picks are split up front,
+    - crawl: the processes share data/crawl.db (frontier.SqliteFrontier with
+      `shard`). Each takes the queued URLs of its shard and adds the links it
+      finds to the common table, whatever their shard, and waits while other
+      shards are still busy. If a shard dies with URLs left, the launcher
+      queues its in-flight URLs again and stops the others, which would
+      otherwise wait for it forever; the next run resumes.
+    The request rate and burst are divided between the processes, so the site
+    sees the same rate as from a single process.
+
+    Each process writes its articles, content URLs and the URLs left to scrape
+    to files of its own (see shard_path, e.g. data/merck-articles.shard-2.jsonl).
+    When all are done the launcher merges them into the shared files. The
+    article store is compacted only if a shard stored a changed article or
+    articles were removed, so every link is stored once without rewriting the
+    store after every run. Shard files left by an interrupted run are merged
+    (and the store compacted) before the next run starts, or with
+    `python shards.py merge`.
+
+    The scrape processes report every finished URL to the launcher, the crawl
+    progress is read from crawl.db; either way the progress and throughput
+    shown are those of the whole run. Every process logs to logs/<name>.shard-<i>.log.
+"""
+
+import argparse
+import asyncio
+import glob
+import multiprocessing
+import os
+import queue
+import signal
+import sqlite3
+import time
+
+from tqdm import tqdm
+
+from article_store import ArticleStore, articles_path, compact, iter_articles
+from checkpoint import atomic_write
+from extraction import layouts
+from logger import log_levels, setup_logging, stop_logging
+from rate_limit import positive_rate
+from urls import read_urls, shard_of
+
+content_path = './data/content_urls.txt'
+to_scrape_path = './data/to_scrape.txt'
+crawl_db_path = './data/crawl.db'
+
+
+def shard_path(path, index):
+    """
+        The file of shard `index` for a shared file, e.g. data/to_scrape.shard-0.txt.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard-{index}{extension}"
+
+
+def shard_files(path):
+    root, extension = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(root)}.shard-*{extension}"))
+
+
+def merge(removed=(), replace_to_scrape=False, outdated=True):
+    """
+        Merges the shard files into the shared files and deletes them.
+        Articles are appended to the store, which is then compacted without
+        the `removed` links if there are any or if the store may hold older
+        records of the merged articles (`outdated`, always the case when the
+        shards could not tell). Content URLs are appended to content_urls.txt.
+        The URLs left to scrape replace to_scrape.txt with `replace_to_scrape`
+        (a sharded scrape split it up) and are appended to it otherwise.
+        Returns the number of articles merged.
+    """
+    merged = 0
+    stores = shard_files(articles_path)
+    if stores or removed:
+        with ArticleStore(articles_path, fsync_every=1000) as store:
+            for path in stores:
+                for article in iter_articles(path):
+                    store.append(article)
+        merged = store.written
+        if outdated or removed:
+            # A link is also stored from an earlier run, keep its latest record only
+            compact(articles_path, drop=removed)
+        for path in stores:
+            os.remove(path)
+
+    paths = shard_files(content_path)
+    if paths:
+        with open(content_path, "a", encoding="utf-8") as f:
+            for path in paths:
+                for url in read_urls(path):
+                    f.write(url + "\n")
+        for path in paths:
+            os.remove(path)
+
+    paths = shard_files(to_scrape_path)
+    if paths:
+        left = [url for path in paths for url in read_urls(path)]
+        if replace_to_scrape:
+            atomic_write(to_scrape_path, left)
+        else:
+            with open(to_scrape_path, "a", encoding="utf-8") as f:
+                for url in left:
+                    f.write(url + "\n")
+        for path in paths:
+            os.remove(path)
+    return merged
+
+
+def shard_options(options, index, count):
+    """
+        The options of one process: its share of the rate limit, its own trace
+        file and metrics port.
+    """
+    options = dict(options)
+    options["rate"] = options["rate"] / count
+    options["burst"] = max(1, options["burst"] // count)
+    if options.get("trace_path"):
+        options["trace_path"] = shard_path(options["trace_path"], index)
+    if options.get("metrics_port"):
+        options["metrics_port"] += index
+    return options
+
+
+class QueueProgress:
+    """
+        Stand-in for the tqdm bar of scraper.scrape_pool in a shard process:
+        sends the progress to the launcher.
+    """
+    def __init__(self, messages, index, total):
+        self.messages = messages
+        self.index = index
+        self._total = total
+
+    @property
+    def total(self):
+        return self._total
+
+    @total.setter
+    def total(self, total):
+        # Retried URLs make the run longer
+        self.messages.put(("total", self.index, total - self._total))
+        self._total = total
+
+    def update(self, n=1):
+        self.messages.put(("done", self.index, n))
+
+    def close(self):
+        pass
+
+
+def scrape_shard(index, count, urls, options, messages, log_level, log_format):
+    """
+        Runs in a shard process: scrapes `urls` with its own browser.
+    """
+    setup_logging(f"scraper.shard-{index}", log_level, log_format, console=False)
+    try:
+        import scraper
+
+        progress = QueueProgress(messages, index, len(urls))
+        summary = asyncio.run(scraper.main(urls=urls, shard=(index, count), progress=progress, **options))
+        messages.put(("finished", index, summary))
+    finally:
+        stop_logging()
+
+
+def crawl_shard(index, count, options, messages, log_level, log_format):
+    """
+        Runs in a shard process: crawls the URLs of shard `index` with its own browser.
+    """
+    setup_logging(f"crawler.shard-{index}", log_level, log_format, console=False)
+    try:
+        import crawler
+
+        summary = asyncio.run(crawler.main(shard=(index, count), **options))
+        messages.put(("finished", index, summary))
+    finally:
+        stop_logging()
+
+
+def start_processes(target, args_per_process):
+    # Playwright and the event loops do not survive fork(), every process starts fresh
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=target, args=args, name=f"shard-{index}")
+                 for index, args in enumerate(args_per_process)]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def wait_for(processes):
+    """
+        Joins the processes. Ctrl+C reaches them too and they save their
+        progress, so the launcher keeps waiting for them to finish.
+    """
+    while True:
+        try:
+            for process in processes:
+                process.join()
+            return
+        except KeyboardInterrupt:
+            print("❌ Interrupted by user, waiting for the shards to save their progress...")
+
+
+def run_scrape(workers, options, log_level="INFO", log_format="text"):
+    import scraper
+    from freshness import FreshnessIndex
+
+    if merge(replace_to_scrape=True):
+        print("💾 Merged the articles of an interrupted sharded run.")
+    with FreshnessIndex() as freshness:
+        urls = scraper.select_urls(freshness, options.get("refresh", False))
+        removed = set(freshness.removed)  # known articles no longer listed, with `refresh`
+    shards = [[] for _ in range(workers)]
+    for url in sorted(urls):
+        shards[shard_of(url, workers)].append(url)
+    for index, shard_urls in enumerate(shards):
+        # Kept as they are if the process dies before its first checkpoint
+        atomic_write(shard_path(to_scrape_path, index), shard_urls)
+    print(f"Scraping {len(urls)} articles with {workers} processes: "
+          f"{', '.join(str(len(shard_urls)) for shard_urls in shards)} per shard.")
+
+    messages = multiprocessing.get_context("spawn").Queue()
+    start = time.perf_counter()
+    processes = start_processes(scrape_shard, [
+        (index, workers, shard_urls, shard_options(options, index, workers), messages, log_level, log_format)
+        for index, shard_urls in enumerate(shards)
+    ])
+    summaries = {}
+    with tqdm(total=len(urls), desc=f"Scraping articles ({workers} processes)") as progress:
+        try:
+            while any(process.is_alive() for process in processes) or not messages.empty():
+                try:
+                    kind, index, value = messages.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if kind == "done":
+                    progress.update(value)
+                elif kind == "total":
+                    progress.total += value
+                    progress.refresh()
+                else:
+                    summaries[index] = value
+        except KeyboardInterrupt:
+            print("❌ Interrupted by user, waiting for the shards to save their progress...")
+    wait_for(processes)
+    elapsed = time.perf_counter() - start
+
+    for index in range(workers):
+        summary = summaries.get(index)
+        if summary is None:
+            print(f"⚠️ Shard {index} stopped without a summary (exit code {processes[index].exitcode}), "
+                  f"its URLs stay in to_scrape.txt.")
+            continue
+        removed.update(summary["removed"])
+        print(f"   Shard {index}: {summary['written']} articles written, {summary['left']} left to scrape.")
+    outdated = len(summaries) < workers or any(summary["changed"] for summary in summaries.values())
+    merged = merge(removed, replace_to_scrape=True, outdated=outdated)
+    done = progress.n
+    print(f"✅ {done} URLs in {elapsed:.1f}s with {workers} processes: {done / elapsed if elapsed else 0:.2f} pages/s. "
+          f"{merged} articles merged into {articles_path}.")
+
+
+def crawl_counts(db_path=crawl_db_path):
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        return dict(conn.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+    except sqlite3.OperationalError:
+        return {}  # not created yet
+    finally:
+        conn.close()
+
+
+def requeue_dead_shard(index, count, db_path=crawl_db_path):
+    """
+        Queues the in-flight URLs of a shard whose process died again.
+        Returns whether the shard still has URLs to crawl.
+    """
+    conn = sqlite3.connect(db_path, timeout=60)
+    try:
+        with conn:
+            conn.execute("UPDATE urls SET state = 'queued' WHERE state = 'in_flight' AND bucket % ? = ?",
+                         (count, index))
+        return conn.execute("SELECT 1 FROM urls WHERE state = 'queued' AND bucket % ? = ? LIMIT 1",
+                            (count, index)).fetchone() is not None
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def receive_summaries(messages, summaries):
+    while True:
+        try:
+            _, index, summary = messages.get_nowait()
+        except queue.Empty:
+            return
+        summaries[index] = summary
+
+
+def stop_shards(processes):
+    # The shards save their progress on SIGINT, like on Ctrl+C
+    for process in processes:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGINT)
+
+
+def run_crawl(workers, options, log_level="INFO", log_format="text", report_every=5):
+    if merge():
+        print("💾 Merged the articles of an interrupted sharded run.")
+    print(f"Crawling with {workers} processes sharing {crawl_db_path}.")
+    counts = crawl_counts()
+    done_before = counts.get("visited", 0) + counts.get("content", 0) + counts.get("failed", 0)
+    start = time.perf_counter()
+    messages = multiprocessing.get_context("spawn").Queue()
+    processes = start_processes(crawl_shard, [
+        (index, workers, shard_options(options, index, workers), messages, log_level, log_format)
+        for index in range(workers)
+    ])
+    summaries = {}
+    stopping = False
+    try:
+        while any(process.is_alive() for process in processes):
+            time.sleep(report_every)
+            receive_summaries(messages, summaries)
+            for index, process in enumerate(processes):
+                # The other shards would wait forever for the URLs of a dead one
+                if not stopping and not process.is_alive() and requeue_dead_shard(index, workers):
+                    print(f"⚠️ Shard {index} stopped (exit code {process.exitcode}) with URLs left to crawl, "
+                          f"stopping the others. Run again to resume.")
+                    stop_shards(processes)
+                    stopping = True
+            counts = crawl_counts()
+            done = counts.get("visited", 0) + counts.get("content", 0) + counts.get("failed", 0) - done_before
+            elapsed = time.perf_counter() - start
+            print(f"🕸️ {done} pages in {elapsed:.0f}s ({done / elapsed:.2f} pages/s): "
+                  f"{counts.get('content', 0)} content, {counts.get('visited', 0)} hubs, "
+                  f"{counts.get('queued', 0) + counts.get('in_flight', 0)} queued.")
+    except KeyboardInterrupt:
+        print("❌ Interrupted by user, waiting for the shards to save their progress...")
+    wait_for(processes)
+    receive_summaries(messages, summaries)
+    elapsed = time.perf_counter() - start
+    counts = crawl_counts()
+    done = counts.get("visited", 0) + counts.get("content", 0) + counts.get("failed", 0) - done_before
+    merged = merge(outdated=len(summaries) < workers or any(summary["changed"] for summary in summaries.values()))
+    print(f"✅ {done} pages in {elapsed:.1f}s with {workers} processes: {done / elapsed if elapsed else 0:.2f} pages/s. "
+          f"{counts.get('content', 0)} content URLs, {merged} articles merged into {articles_path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the crawler or the scraper in several processes.")
+    parser.add_argument("command", choices=["scrape", "crawl", "merge"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of processes.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pages in parallel per process.")
+    parser.add_argument("--fetch", choices=["auto", "http", "browser"], default="auto",
+                        help="auto: plain HTTP with browser fallback, http/browser: force one engine.")
+    parser.add_argument("--rate", type=positive_rate, default=5.0, help="Initial requests per second per host, in total.")
+    parser.add_argument("--burst", type=int, default=10, help="Requests allowed in a burst per host, in total.")
+    parser.add_argument("--block", choices=["on", "off", "observe"], default="on",
+                        help="Request blocking in the browser, observe only measures what it would save.")
+    parser.add_argument("--layout", choices=layouts, default="markdown",
+                        help="Article content as markdown or as the nested section tree.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="scrape: check all known articles for changes with conditional requests.")
+    parser.add_argument("--scrape", action="store_true", help="crawl: also extract the articles while crawling.")
+    parser.add_argument("--classify", action="store_true",
+                        help="crawl: leave links predicted to be articles for the scraper without loading them.")
+    parser.add_argument("--recycle-every", type=int, default=200, help="Open a fresh page after N navigations.")
+    parser.add_argument("--memory-limit", type=int, default=2048,
+                        help="Restart a browser above this many MB (needs psutil, 0 disables).")
+    parser.add_argument("--trace", default=None, help="Per-URL trace file, one per shard.")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve the metrics of shard i on 127.0.0.1:PORT+i/metrics.")
+    parser.add_argument("--log-level", choices=log_levels, default="INFO", help="Level of the shard logs.")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text", help="Format of the log files.")
+    args = parser.parse_args()
+
+    setup_logging("shards")
+    try:
+        options = {"concurrency": max(1, args.concurrency), "fetch_mode": args.fetch, "rate": args.rate,
+                   "burst": args.burst, "block_mode": args.block, "layout": args.layout,
+                   "recycle_every": args.recycle_every, "memory_limit": args.memory_limit,
+                   "trace_path": args.trace, "metrics_port": args.metrics_port}
+        workers = max(1, args.workers)
+        if args.command == "scrape":
+            run_scrape(workers, dict(options, refresh=args.refresh), args.log_level, args.log_format)
+        elif args.command == "crawl":
+            run_crawl(workers, dict(options, scrape=args.scrape, classify=args.classify),
+                      args.log_level, args.log_format)
+        else:
+            print(f"✅ Merged {merge(replace_to_scrape=True)} articles.")
+    finally:
+        stop_logging()
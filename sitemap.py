@@ -0,0 +1,202 @@
+"""
+    Sitemap-driven discovery of content pages.
+
+    Reads robots.txt for Sitemap: lines (falling back to /sitemap.xml) and walks
+    the sitemaps and sitemap indexes it points to. Sitemaps are parsed while
+    they download, gzipped ones included, so even large sitemaps are never held
+    in memory in full. URLs are canonicalized and filtered by the robots.txt
+    rules and the crawler's paths_to_skip. Like urllib.robotparser, a robots.txt
+    answering 401 or 403 disallows everything, any other error allows everything.
+
+    Articles live at /<section>/<chapter>/<article>, so sitemap URLs of that
+    depth are recorded as content URLs without loading them, and their lastmod
+    tells which known articles need a new scrape. Sections the sitemap does not
+    mention are left to the regular BFS crawl.
+
+    `python sitemap.py <base url>` lists what discovery finds, e.g. against the fixture server.
+"""
+
+import argparse
+import asyncio
+import zlib
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree.ElementTree import XMLPullParser
+
+from fetcher import StatusError
+from urls import canonicalize, same_site
+from url_classifier import path_parts
+
+# Path depth of article pages, hubs are one or two levels deep
+article_depth = 3
+
+
+def is_article_url(url):
+    return len(path_parts(url)) == article_depth
+
+
+def section(url):
+    """
+        Returns the first path segment of the URL, e.g. "poultry".
+    """
+    parts = path_parts(url)
+    return parts[0] if parts else ""
+
+
+def parse_lastmod(text):
+    """
+        Parses a W3C datetime ("2024-05-01", "2024-05-01T10:00:00+00:00") to an
+        aware datetime. Returns None if it is missing or malformed.
+    """
+    if not text:
+        return None
+    try:
+        value = datetime.fromisoformat(text.strip())
+    except ValueError:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class SitemapParser:
+    """
+        Incremental parser for <urlset> and <sitemapindex> documents.
+        feed() takes the next chunk of the download and returns the entries
+        completed so far as (kind, loc, lastmod) with kind "url" or "sitemap".
+    """
+    def __init__(self):
+        self.parser = XMLPullParser(events=("start", "end"))
+        self.root = None
+        self.decompressor = None
+        self.started = False
+        self.loc = None
+        self.lastmod = None
+
+    def feed(self, chunk):
+        if not self.started:
+            self.started = True
+            if chunk[:2] == b"\x1f\x8b":
+                # A .xml.gz sitemap served without Content-Encoding
+                self.decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        if self.decompressor is not None:
+            chunk = self.decompressor.decompress(chunk)
+        self.parser.feed(chunk)
+        return self.read_entries()
+
+    def close(self):
+        self.parser.close()
+        return self.read_entries()
+
+    def read_entries(self):
+        entries = []
+        for event, element in self.parser.read_events():
+            tag = element.tag.rsplit("}", 1)[-1]
+            if event == "start":
+                if self.root is None:
+                    self.root = element
+                continue
+            if tag == "loc":
+                self.loc = (element.text or "").strip()
+            elif tag == "lastmod":
+                self.lastmod = parse_lastmod(element.text)
+            elif tag in ["url", "sitemap"]:
+                if self.loc:
+                    entries.append((tag, self.loc, self.lastmod))
+                self.loc = None
+                self.lastmod = None
+                # Finished entries are dropped so memory stays flat
+                self.root.clear()
+        return entries
+
+
+async def read_robots(fetcher, base_url):
+    """
+        Returns the robots.txt rules and the sitemap URLs listed there.
+    """
+    robots_url = urljoin(base_url, "/robots.txt")
+    robots = RobotFileParser(robots_url)
+    lines = []
+    try:
+        async for chunk in fetcher.stream_http(robots_url):
+            lines.append(chunk)
+        lines = b"".join(lines).decode("utf-8", errors="replace").splitlines()
+    except ConnectionError as e:
+        if isinstance(e, StatusError) and e.status in [401, 403]:
+            print(f"⚠️ robots.txt is forbidden ({e}), no URL of the sitemaps is allowed.")
+            robots.disallow_all = True
+        else:
+            print(f"⚠️ No robots.txt: {e}")
+        lines = []
+    robots.parse(lines)
+    sitemaps = robots.site_maps() or [urljoin(base_url, "/sitemap.xml")]
+    return robots, sitemaps
+
+
+def collect(found, sitemap_url, base_url, robots, paths_to_skip, queue, entries):
+    """
+        Queues the child sitemaps of `found` and adds the allowed page URLs to
+        `entries`. Returns the number of URLs skipped.
+    """
+    skipped = 0
+    for kind, loc, lastmod in found:
+        if kind == "sitemap":
+            queue.append(urljoin(sitemap_url, loc))
+            continue
+        url = urljoin(sitemap_url, loc)
+        if not same_site(url, base_url) or not robots.can_fetch("*", url):
+            skipped += 1
+            continue
+        url = canonicalize(url)
+        if any(urlsplit(url).path.startswith(skip_path) for skip_path in paths_to_skip):
+            skipped += 1
+            continue
+        entries[url] = lastmod
+    return skipped
+
+
+async def discover(fetcher, base_url, paths_to_skip=(), max_sitemaps=1000):
+    """
+        Walks the sitemaps of the site and returns {canonical URL: lastmod}.
+        Needs the fetcher's HTTP client, the browser is never used.
+    """
+    robots, queue = await read_robots(fetcher, base_url)
+    seen = set()
+    entries = {}
+    skipped = 0
+    while queue and len(seen) < max_sitemaps:
+        sitemap_url = queue.pop(0)
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+        parser = SitemapParser()
+        try:
+            async for chunk in fetcher.stream_http(sitemap_url):
+                skipped += collect(parser.feed(chunk), sitemap_url, base_url, robots, paths_to_skip, queue, entries)
+            skipped += collect(parser.close(), sitemap_url, base_url, robots, paths_to_skip, queue, entries)
+        except Exception as e:
+            print(f"⚠️ Failed to read sitemap {sitemap_url}: {e}")
+    print(f"🗺️ Read {len(seen)} sitemaps: {len(entries)} URLs, {skipped} skipped.")
+    return entries
+
+
+async def main(base_url, paths_to_skip):
+    from fetcher import Fetcher
+
+    fetcher = await Fetcher("http").start()
+    try:
+        entries = await discover(fetcher, base_url, paths_to_skip)
+    finally:
+        await fetcher.close()
+    articles = [url for url in entries if is_article_url(url)]
+    sections = sorted(set(section(url) for url in entries))
+    print(f"{len(articles)} articles in {len(sections)} sections: {', '.join(sections)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the pages found in the sitemaps of a site.")
+    parser.add_argument("base_url", nargs="?", default="https://www.merckvetmanual.com/")
+    args = parser.parse_args()
+    from crawler import paths_to_skip
+    asyncio.run(main(args.base_url, paths_to_skip))
@@ -1,9 +1,6 @@
-import json
+from corpus import count
 
-with open('merck-articles.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-    print(f"Number of merck articles: {len(data)}")
+# Counted one article at a time, or from the header of a .corpus file (see corpus.py)
+print(f"Number of merck articles: {count('merck-articles.json')}")
 
-with open('./data/dog-owners.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-    print(f"Number of dog owner articles: {len(data)}")
\ No newline at end of file
+print(f"Number of dog owner articles: {count('./data/dog-owners.json')}")
\ No newline at end of file
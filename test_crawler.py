@@ -0,0 +1,55 @@
+import asyncio
+
+import crawler
+from fixture_server import generate_corpus, start_server, start_paths, stop_server
+from frontier import FileFrontier
+from rate_limit import RateLimiter
+
+
+def crawl_fixture(tmp_path, failures):
+    """
+        Crawls a small generated site over HTTP, with the scripted `failures`
+        of the fixture server. Returns the frontier and the server counts.
+    """
+    corpus = str(tmp_path / "corpus")
+    generate_corpus(corpus, sections=3, chapters=2, articles=2)
+    server = start_server(corpus, failures=failures)
+    data = tmp_path / "data"
+    data.mkdir()
+    paths = [str(data / f"{name}.txt") for name in ["visited", "to_explore", "content_urls"]]
+    for path in paths:
+        open(path, "w").close()
+    crawler.base_url = server.origin + "/"
+    crawler.start_urls = [server.origin + path for path in start_paths]
+    crawler.to_scrape_path = str(data / "to_scrape.txt")
+    frontier = FileFrontier(crawler.start_urls, *paths)
+    frontier.load()
+    limiter = RateLimiter(rate=1000, burst=1000, cooldown=0.01, max_cooldown=0.1)
+    try:
+        asyncio.run(crawler.crawl(None, fetch_mode="http", limiter=limiter, frontier=frontier))
+    finally:
+        stop_server(server)
+    return server, frontier
+
+
+def test_throttled_hub_is_crawled_once_it_recovers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # More 429s than attempts per visit, the hub goes back into the queue
+    server, frontier = crawl_fixture(tmp_path, {"/section-1": [429] * (crawler.max_attempts + 1)})
+    assert server.origin + "/section-1" in frontier.visited
+    assert len(frontier.content_urls) == 3 * 2 * 2
+    assert not server.failures["/section-1"]
+
+
+def test_hub_with_server_error_is_retried(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server, frontier = crawl_fixture(tmp_path, {"/section-2/chapter-0": [500, 503]})
+    assert server.origin + "/section-2/chapter-0" in frontier.visited
+    assert len(frontier.content_urls) == 3 * 2 * 2
+
+
+def test_failing_hub_is_not_marked_visited(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server, frontier = crawl_fixture(tmp_path, {"/section-0": [500] * 100})
+    assert server.origin + "/section-0" not in frontier.visited
+    assert len(frontier.content_urls) == 2 * 2 * 2
@@ -0,0 +1,48 @@
+import asyncio
+import shutil
+
+import pytest
+
+from fetcher import Fetcher
+from fixture_server import generate_corpus, start_server, stop_server
+from rate_limit import RateLimiter
+from sitemap import discover
+
+
+def discover_fixture(tmp_path, failures):
+    """
+        Runs sitemap discovery against a small generated site with the scripted
+        `failures` of the fixture server. Returns the URLs found.
+    """
+    corpus = str(tmp_path / "corpus")
+    generate_corpus(corpus, sections=3, chapters=2, articles=2)
+    # Found without robots.txt too, the fallback of discovery
+    shutil.copy(tmp_path / "corpus" / "sitemap_index.xml", tmp_path / "corpus" / "sitemap.xml")
+    server = start_server(corpus, failures=failures)
+
+    async def run():
+        fetcher = await Fetcher("http", limiter=RateLimiter(rate=1000, burst=1000, cooldown=0.01)).start()
+        try:
+            return await discover(fetcher, server.origin + "/")
+        finally:
+            await fetcher.close()
+
+    try:
+        return asyncio.run(run())
+    finally:
+        stop_server(server)
+
+
+def test_sitemap_urls_are_found(tmp_path):
+    # Two of the three sections are in the sitemaps: hub, 2 chapters and 4 articles each
+    assert len(discover_fixture(tmp_path, {})) == 2 * (1 + 2 + 2 * 2)
+
+
+@pytest.mark.parametrize("status", [401, 403])
+def test_forbidden_robots_txt_disallows_everything(tmp_path, status):
+    assert discover_fixture(tmp_path, {"/robots.txt": [status]}) == {}
+
+
+@pytest.mark.parametrize("status", [404, 500])
+def test_missing_robots_txt_allows_everything(tmp_path, status):
+    assert len(discover_fixture(tmp_path, {"/robots.txt": [status]})) == 2 * (1 + 2 + 2 * 2)
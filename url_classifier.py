@@ -0,0 +1,115 @@
+"""
+    Predicts from its path alone whether a URL is an article or a hub.
+
+    Articles and hubs differ clearly in path shape: every URL in
+    content_urls.txt is three segments deep (/<section>/<chapter>/<article>),
+    hubs are one or two deep, and the few deep hubs sit under sections like
+    /news. The classifier counts articles and hubs of the previous crawls per
+    path feature, from the most specific (depth and first segment) to the most
+    general (depth), and predicts with the most specific feature seen at least
+    `min_support` times.
+
+    The crawler uses it to rank the frontier (likely hubs first) and, with
+    --classify, to record confidently predicted articles as content URLs without
+    loading them. `python url_classifier.py evaluate` shows how well it does on
+    the saved crawl state.
+"""
+
+import argparse
+import os
+import random
+from urllib.parse import urlsplit
+
+from urls import canonicalize, read_urls
+
+
+def path_parts(url):
+    return [part for part in urlsplit(url).path.split("/") if part]
+
+
+def path_depth(url):
+    return len(path_parts(url))
+
+
+def features(url):
+    """
+        Path features of the URL, most specific first.
+    """
+    parts = path_parts(url)
+    depth = len(parts)
+    first = parts[0] if parts else ""
+    return [("depth-section", depth, first), ("depth", depth)]
+
+
+class UrlClassifier:
+    def __init__(self, min_support=5):
+        self.min_support = min_support
+        self.counts = {}  # feature -> [articles, hubs]
+        self.trained_on = (0, 0)
+
+    def train(self, articles, hubs):
+        for urls, label in [(articles, 0), (hubs, 1)]:
+            for url in urls:
+                for feature in features(url):
+                    self.counts.setdefault(feature, [0, 0])[label] += 1
+        self.trained_on = (len(articles), len(hubs))
+        return self
+
+    def probability(self, url):
+        """
+            Returns the estimated probability that the URL is an article.
+            Unknown path shapes get 0.5.
+        """
+        for feature in features(url):
+            articles, hubs = self.counts.get(feature, (0, 0))
+            if articles + hubs >= self.min_support:
+                # Laplace smoothing keeps a few hubs from being ruled out entirely
+                return (articles + 1) / (articles + hubs + 2)
+        return 0.5
+
+    def is_article(self, url, threshold=0.95):
+        return self.probability(url) >= threshold
+
+
+def training_data(visited_path='./data/visited.txt', content_path='./data/content_urls.txt'):
+    """
+        Returns (articles, hubs) from the saved crawl state: content URLs are
+        articles, every other visited URL is a hub.
+    """
+    articles = set(canonicalize(url) for url in read_urls(content_path)) if os.path.exists(content_path) else set()
+    hubs = set(canonicalize(url) for url in read_urls(visited_path)) if os.path.exists(visited_path) else set()
+    hubs -= articles
+    return sorted(articles), sorted(hubs)
+
+
+def train_from_files(visited_path='./data/visited.txt', content_path='./data/content_urls.txt', min_support=5):
+    articles, hubs = training_data(visited_path, content_path)
+    return UrlClassifier(min_support).train(articles, hubs)
+
+
+def evaluate(threshold=0.95, test_share=0.2, seed=0):
+    """
+        Trains on part of the saved crawl state and reports how the held-out URLs
+        would have been routed.
+    """
+    articles, hubs = training_data()
+    rng = random.Random(seed)
+    labelled = [(url, True) for url in articles] + [(url, False) for url in hubs]
+    rng.shuffle(labelled)
+    split = int(len(labelled) * test_share)
+    test, train = labelled[:split], labelled[split:]
+    classifier = UrlClassifier().train([url for url, article in train if article],
+                                       [url for url, article in train if not article])
+    routed = [article for url, article in test if classifier.is_article(url, threshold)]
+    test_articles = sum(1 for _, article in test if article)
+    print(f"Trained on {len(train)} URLs, tested on {len(test)} ({test_articles} articles).")
+    print(f"✅ Routed without loading: {len(routed)} of {test_articles} articles "
+          f"({len(routed) / max(1, test_articles):.1%}), hubs routed by mistake: {routed.count(False)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="URL pattern classifier for articles and hubs.")
+    parser.add_argument("command", choices=["evaluate"])
+    parser.add_argument("--threshold", type=float, default=0.95, help="Article probability needed to route a URL.")
+    args = parser.parse_args()
+    evaluate(args.threshold)
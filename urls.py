@@ -0,0 +1,103 @@
+"""
+    Canonical form of site URLs.
+
+    The crawler frontier, content_urls.txt and the article links all use the
+    canonical form, so variants of one page are fetched once:
+    - the merckvetmanual/msdvetmanual hosts (with or without www) map to
+      https://www.merckvetmanual.com,
+    - scheme and host are lower case, default ports are dropped,
+    - the path is lower case with upper-case percent escapes, repeated slashes
+      are collapsed and a trailing slash is removed (except for the root),
+    - query strings (e.g. ?sccamp=sccamp) and fragments are dropped.
+
+    `python urls.py report` shows how many fetches dedup saves on the saved crawl state.
+"""
+
+import argparse
+import hashlib
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+canonical_host = "www.merckvetmanual.com"
+host_aliases = {"merckvetmanual.com", "www.merckvetmanual.com", "msdvetmanual.com", "www.msdvetmanual.com"}
+default_ports = {"http": "80", "https": "443"}
+
+
+def canonicalize(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = str(parts.port) if parts.port else ""
+    if host in host_aliases:
+        scheme, host, port = "https", canonical_host, ""
+    if port and port != default_ports.get(scheme):
+        host = f"{host}:{port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path.lower())
+    path = re.sub(r"%[0-9a-f]{2}", lambda match: match.group(0).upper(), path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+    return urlunsplit((scheme, host, path or "/", "", ""))
+
+
+def same_site(url, base_url):
+    """
+        True if the URL belongs to the site of base_url, host aliases included.
+    """
+    return urlsplit(canonicalize(url)).netloc == urlsplit(canonicalize(base_url)).netloc
+
+
+def url_bucket(url):
+    """
+        Stable 32-bit hash of the canonical URL, the same in every process and
+        run (unlike hash(), which is salted per process).
+    """
+    digest = hashlib.blake2b(canonicalize(url).encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_of(url, shards):
+    """
+        Returns the shard in range(shards) the URL belongs to.
+    """
+    return url_bucket(url) % shards
+
+
+def read_urls(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def dedup_report(visited_path='./data/visited.txt', content_path='./data/content_urls.txt'):
+    """
+        Prints how many entries of the saved crawl state collapse under canonicalization,
+        and how many content URLs the old crawler would fetch again because they were never
+        recorded as visited.
+    """
+    visited = read_urls(visited_path)
+    content = read_urls(content_path)
+    all_urls = visited + content
+    canonical_visited = set(canonicalize(url) for url in visited)
+    canonical_content = set(canonicalize(url) for url in content)
+    canonical_all = canonical_visited | canonical_content
+
+    print(f"visited.txt:       {len(visited)} lines, {len(set(visited))} unique, "
+          f"{len(canonical_visited)} canonical")
+    print(f"content_urls.txt:  {len(content)} lines, {len(set(content))} unique, "
+          f"{len(canonical_content)} canonical")
+    print(f"Both files:        {len(set(all_urls))} unique, {len(canonical_all)} canonical")
+    # A URL in both files was fetched once, only variants and repeated lines were fetched again
+    collapsed = len(set(all_urls)) - len(canonical_all)
+    repeated = len(visited) - len(set(visited)) + len(content) - len(set(content))
+    print(f"✅ Fetches saved by canonicalization: {collapsed} URL variants, {repeated} repeated lines")
+    never_visited = len(canonical_content - canonical_visited)
+    print(f"   Content URLs never recorded as visited (fetched again by the old crawler): {never_visited}")
+    changed = sum(1 for url in set(all_urls) if canonicalize(url) != url)
+    print(f"   URLs rewritten by canonicalization: {changed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Canonical URL helpers.")
+    parser.add_argument("command", choices=["report"])
+    args = parser.parse_args()
+    dedup_report()
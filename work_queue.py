@@ -0,0 +1,716 @@
+"""
+    Work queue for scraping from several machines.
+
+    The site answers 403 once one IP address sends too much, which ends a
+    scraper.py run. With the queue, workers on hosts with their own egress IP
+    share the URLs: a blocked worker pauses for `cooldown` seconds while the
+    others carry on.
+
+    The queue is a table in data/work_queue.db. A URL is queued, leased, done
+    or failed:
+    - a worker leases a URL for `visibility` seconds and extends the lease with
+      a heartbeat while it is still busy with it,
+    - it reports the outcome back, with the article, which the coordinator
+      appends to the article store,
+    - a lease that is not renewed expires (the worker died or lost its
+      connection) and the URL is queued again on the next lease. A URL is
+      failed after `max_attempts` leases, a 403 does not count as one.
+
+    Workers reach the queue in one of two ways:
+    - `--queue HOST:PORT`: the coordinator (`python work_queue.py serve`)
+      owns the database and answers one JSON object per line over TCP. It
+      listens on 127.0.0.1 unless told otherwise with --host. The queue is
+      open to anyone who can reach the port, so set the same token on the
+      coordinator and its workers (--token or WORK_QUEUE_TOKEN),
+    - `--queue PATH`: the SQLite database on a disk shared by the hosts (SQLite
+      locking over NFS is not reliable everywhere, the coordinator is safer).
+      `python work_queue.py collect` then moves the articles into the store.
+    Lease times are taken from the clock of the coordinator, or of each worker
+    with a shared database.
+
+    Usage:
+        python work_queue.py add                      # queue what scraper.py would scrape
+        python work_queue.py serve --host 0.0.0.0 --token SECRET   # coordinator, until the queue is drained
+        python work_queue.py work --queue host:8765 --token SECRET  # on every worker host
+        python work_queue.py status
+"""
+
+import argparse
+import asyncio
+import contextlib
+import hmac
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+from article_store import ArticleStore, articles_path, compact
+from browser_manager import BrowserManager
+from blocking import BlockingPolicy
+from checkpoint import atomic_write, install_stop_handlers, remove_stop_handlers
+from extraction import layouts
+from fetcher import Fetcher
+from freshness import FreshnessIndex
+from logger import log_levels, reporting, setup_logging, stop_logging
+from page_cache import PageCache, cache_path
+from rate_limit import RateLimiter, positive_rate
+from urls import canonicalize
+import metrics
+from metrics import count_ipc, note, stage, traced
+import scraper
+from scraper import AccessDenied, scrape_article
+
+queue_path = './data/work_queue.db'
+
+# Outcomes that finish a URL, the others give it back to the queue
+done_outcomes = {"stored"}
+# Outcomes that are not the URL's fault and do not use up an attempt
+free_outcomes = {"denied", "released"}
+
+log = logging.getLogger("work_queue")
+
+
+class WorkQueue:
+    """
+        The URLs of a distributed scrape and their leases, in SQLite.
+    """
+    def __init__(self, path=queue_path, visibility=300, max_attempts=3):
+        self.path = path
+        self.visibility = visibility
+        self.max_attempts = max_attempts
+        self.conn = None
+
+    def open(self):
+        # Workers sharing the database wait for each other's transactions
+        self.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS jobs (url TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                          "worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+                          "outcome TEXT, article TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until)")
+        return self
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # Takes the write lock up front, so two workers never lease the same URL
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def add(self, urls):
+        """
+            Queues the URLs not in the queue yet, failed ones are queued again.
+            Returns the number of URLs queued.
+        """
+        before = self.conn.total_changes
+        with self.transaction():
+            self.conn.executemany("INSERT INTO jobs (url, state) VALUES (?, 'queued') "
+                                  "ON CONFLICT(url) DO UPDATE SET state = 'queued', attempts = 0 "
+                                  "WHERE state = 'failed'", ((canonicalize(url),) for url in urls))
+        return self.conn.total_changes - before
+
+    def expire(self, now):
+        """
+            Queues the URLs whose lease ran out again, or fails them after max_attempts.
+        """
+        self.conn.execute("UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                          "worker = NULL, lease_until = NULL, outcome = 'expired' "
+                          "WHERE state = 'leased' AND lease_until < ?", (self.max_attempts, now))
+
+    def lease(self, worker, count=1):
+        """
+            Leases up to `count` queued URLs to `worker` for `visibility` seconds.
+        """
+        now = time.time()
+        with self.transaction():
+            self.expire(now)
+            urls = [row[0] for row in self.conn.execute(
+                "SELECT url FROM jobs WHERE state = 'queued' ORDER BY attempts, rowid LIMIT ?", (count,))]
+            self.conn.executemany("UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, "
+                                  "attempts = attempts + 1 WHERE url = ?",
+                                  ((worker, now + self.visibility, url) for url in urls))
+        return urls
+
+    def heartbeat(self, worker, urls):
+        """
+            Extends the leases `worker` still holds on `urls` and returns those URLs.
+            A URL missing from the result was lost to an expired lease.
+        """
+        held = []
+        with self.transaction():
+            for url in urls:
+                cursor = self.conn.execute("UPDATE jobs SET lease_until = ? WHERE url = ? AND worker = ? "
+                                           "AND state = 'leased'", (time.time() + self.visibility, url, worker))
+                if cursor.rowcount:
+                    held.append(url)
+        return held
+
+    def complete(self, worker, url, outcome, article=None):
+        """
+            Records the outcome of a leased URL. A stored article finishes the
+            URL even if the lease expired in the meantime; other outcomes only
+            count while `worker` still holds the lease and queue the URL again
+            (or fail it after max_attempts). Returns whether it was recorded.
+            An article whose link is not `url` is refused.
+        """
+        if outcome in done_outcomes and (not isinstance(article, dict)
+                                         or canonicalize(str(article.get("link", ""))) != canonicalize(url)):
+            return False
+        with self.transaction():
+            row = self.conn.execute("SELECT state, worker, attempts FROM jobs WHERE url = ?", (url,)).fetchone()
+            if row is None or row[0] == "done":
+                return False
+            state, holder, attempts = row
+            if outcome in done_outcomes:
+                self.conn.execute("UPDATE jobs SET state = 'done', worker = ?, lease_until = NULL, outcome = ?, "
+                                  "article = ? WHERE url = ?",
+                                  (worker, outcome, json.dumps(article, ensure_ascii=False), url))
+                return True
+            if state != "leased" or holder != worker:
+                return False
+            if outcome in free_outcomes:
+                attempts -= 1
+            self.conn.execute("UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, outcome = ?, "
+                              "attempts = ? WHERE url = ?",
+                              ("failed" if attempts >= self.max_attempts else "queued", outcome, attempts, url))
+        return True
+
+    def counts(self):
+        """
+            Returns the number of URLs per state, expired leases counted as queued.
+        """
+        counts = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        for state, count in self.conn.execute(
+                "SELECT CASE WHEN state = 'leased' AND lease_until < ? THEN 'queued' ELSE state END, COUNT(*) "
+                "FROM jobs GROUP BY 1", (time.time(),)):
+            counts[state] += count
+        return counts
+
+    def workers(self):
+        """
+            Returns {worker: URLs leased} of the workers holding live leases.
+        """
+        return dict(self.conn.execute("SELECT worker, COUNT(*) FROM jobs WHERE state = 'leased' "
+                                      "AND lease_until >= ? GROUP BY worker", (time.time(),)).fetchall())
+
+    def collect(self, store, freshness=None):
+        """
+            Appends the articles reported since the last collect to `store`,
+            skipping the ones `freshness` knows unchanged. Returns the number appended.
+        """
+        appended = 0
+        while True:
+            rows = self.conn.execute("SELECT url, article FROM jobs WHERE state = 'done' "
+                                     "AND article IS NOT NULL LIMIT 500").fetchall()
+            if not rows:
+                return appended
+            for url, article in rows:
+                article = json.loads(article)
+                if freshness is None or freshness.classify(url, article) != "unchanged":
+                    store.append(article)
+                    appended += 1
+            store.sync()
+            with self.transaction():
+                self.conn.executemany("UPDATE jobs SET article = NULL WHERE url = ?", ((url,) for url, _ in rows))
+
+    def left(self):
+        """
+            Returns the URLs not scraped yet: queued, leased and failed.
+        """
+        return [row[0] for row in self.conn.execute("SELECT url FROM jobs WHERE state != 'done' ORDER BY rowid")]
+
+
+def collect_into_store(work_queue, path=articles_path, to_scrape_path=scraper.to_scrape_path):
+    """
+        Moves the reported articles into the article store, compacted if some
+        of them changed, and writes the URLs not scraped yet to to_scrape.txt.
+        Returns the articles appended.
+    """
+    with FreshnessIndex() as freshness, ArticleStore(path) as store:
+        appended = work_queue.collect(store, freshness)
+    if freshness.counts["changed"]:
+        # Drop the older records of the changed articles
+        compact(path)
+    atomic_write(to_scrape_path, work_queue.left())
+    return appended
+
+
+class LocalQueue:
+    """
+        A worker's handle on a WorkQueue database on a shared disk.
+    """
+    def __init__(self, path, visibility=300, max_attempts=3):
+        self.work_queue = WorkQueue(path, visibility, max_attempts).open()
+
+    async def lease(self, worker, count=1):
+        return self.work_queue.lease(worker, count)
+
+    async def heartbeat(self, worker, urls):
+        return self.work_queue.heartbeat(worker, urls)
+
+    async def complete(self, worker, url, outcome, article=None):
+        return self.work_queue.complete(worker, url, outcome, article)
+
+    async def counts(self):
+        return self.work_queue.counts()
+
+    async def close(self):
+        self.work_queue.close()
+
+
+class RemoteQueue:
+    """
+        A worker's handle on the queue of a Coordinator, one JSON object per
+        line each way over a single connection. Reconnects after errors.
+    """
+    def __init__(self, address, token=None):
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self.token = token
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()  # one request at a time on the connection
+
+    async def call(self, op, **args):
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                request = dict(args, op=op, token=self.token)
+                self.writer.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+                await self.writer.drain()
+                line = await self.reader.readline()
+                if not line:
+                    raise ConnectionError("the coordinator closed the connection")
+            except (OSError, asyncio.IncompleteReadError):
+                await self.disconnect()
+                raise
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"Coordinator error: {reply['error']}")
+        return reply["result"]
+
+    async def disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def lease(self, worker, count=1):
+        return await self.call("lease", worker=worker, count=count)
+
+    async def heartbeat(self, worker, urls):
+        return await self.call("heartbeat", worker=worker, urls=urls)
+
+    async def complete(self, worker, url, outcome, article=None):
+        return await self.call("complete", worker=worker, url=url, outcome=outcome, article=article)
+
+    async def counts(self):
+        return await self.call("counts")
+
+    async def close(self):
+        await self.disconnect()
+
+
+def connect(target, visibility=300, max_attempts=3, token=None):
+    """
+        Returns the queue handle for `target`: HOST:PORT of a coordinator or the path of a database.
+    """
+    if os.path.exists(target) or target.endswith(".db"):
+        return LocalQueue(target, visibility, max_attempts)
+    return RemoteQueue(target, token)
+
+
+class Coordinator:
+    """
+        Serves a WorkQueue to the workers on host:port. With a `token`
+        every request has to carry it.
+    """
+    def __init__(self, work_queue, host="127.0.0.1", port=8765, token=None):
+        self.work_queue = work_queue
+        self.host = host
+        self.port = port
+        self.token = token
+        self.server = None
+        self.connections = {}  # handler task -> writer of every connected worker
+        self.requests = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.serve, self.host, self.port)
+        return self
+
+    async def close(self):
+        self.server.close()
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def handle(self, request):
+        if self.token and not hmac.compare_digest(str(request.get("token") or ""), self.token):
+            raise PermissionError("wrong or missing token")
+        op = request.get("op")
+        if op == "lease":
+            return self.work_queue.lease(request["worker"], request.get("count", 1))
+        if op == "heartbeat":
+            return self.work_queue.heartbeat(request["worker"], request["urls"])
+        if op == "complete":
+            return self.work_queue.complete(request["worker"], request["url"], request["outcome"],
+                                            request.get("article"))
+        if op == "counts":
+            return self.work_queue.counts()
+        raise ValueError(f"unknown operation {op!r}")
+
+    async def serve(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.requests += 1
+                try:
+                    reply = {"result": self.handle(json.loads(line))}
+                except Exception as e:
+                    log.warning(f"⚠️ Bad request from a worker: {e}")
+                    reply = {"error": str(e)}
+                writer.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # the worker went away, its leases expire
+        finally:
+            del self.connections[task]
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, path=queue_path, visibility=300, max_attempts=3,
+                report_every=10, until_done=True, linger=15, token=None):
+    """
+        Runs the coordinator. Every `report_every` seconds the reported articles
+        are appended to the store and the progress of the run is logged.
+        With `until_done` it stops once no URL is queued or leased any more,
+        after `linger` seconds in which the idle workers learn it and exit.
+    """
+    stop = asyncio.Event()
+    install_stop_handlers(stop)
+    with WorkQueue(path, visibility, max_attempts) as work_queue, \
+            FreshnessIndex() as freshness, ArticleStore(articles_path) as store:
+        coordinator = await Coordinator(work_queue, host, port, token).start()
+        if not token and host not in ["127.0.0.1", "localhost", "::1"]:
+            log.warning(f"⚠️ Listening on {host} without a token, anyone reaching port {port} can use the queue.")
+        counts = work_queue.counts()
+        done_before = counts["done"] + counts["failed"]
+        log.info(f"📮 Coordinator on {host}:{port}: {counts['queued'] + counts['leased']} URLs to scrape.")
+        start = time.perf_counter()
+        appended = 0
+        drained_at = None
+        try:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), report_every)
+                except asyncio.TimeoutError:
+                    pass
+                appended += work_queue.collect(store, freshness)
+                counts = work_queue.counts()
+                done = counts["done"] + counts["failed"] - done_before
+                elapsed = time.perf_counter() - start
+                workers = work_queue.workers()
+                log.info(f"📮 {done} URLs in {elapsed:.0f}s ({done / elapsed:.2f} pages/s) by {len(workers)} workers: "
+                         f"{counts['done']} done, {counts['failed']} failed, {counts['leased']} leased, "
+                         f"{counts['queued']} queued.")
+                if not until_done or counts["queued"] or counts["leased"]:
+                    drained_at = None
+                elif drained_at is None:
+                    drained_at = time.monotonic()
+                    log.info(f"📮 Queue drained, stopping in {linger}s.")
+                elif time.monotonic() - drained_at >= linger:
+                    break
+        finally:
+            remove_stop_handlers()
+            await coordinator.close()
+            appended += work_queue.collect(store, freshness)
+            atomic_write(scraper.to_scrape_path, work_queue.left())
+            with reporting():
+                freshness.report()
+    if freshness.counts["changed"]:
+        # Drop the older records of the changed articles
+        compact(articles_path)
+    with reporting() as report:
+        report.info(f"✅ {appended} articles added to {articles_path}, {counts['failed']} failed URLs "
+                    f"and {counts['queued'] + counts['leased']} unfinished ones left in to_scrape.txt.")
+
+
+async def call_with_retries(call, patience):
+    """
+        Awaits `call()`, retrying with backoff while the coordinator is
+        unreachable, for up to `patience` seconds.
+    """
+    delay = 1
+    deadline = time.monotonic() + patience
+    while True:
+        try:
+            return await call()
+        except OSError as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            log.warning(f"⚠️ Queue unreachable ({e}), retrying in {delay}s.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+class QueueWorker:
+    """
+        Scrapes the URLs leased from `work_queue` with `concurrency` pages.
+        Leases are renewed every visibility / 3 seconds while a URL is in hand.
+        After a 403 the worker stops leasing for `cooldown` seconds and gives
+        the URL back, so the other hosts scrape it in the meantime.
+    """
+    def __init__(self, work_queue, fetcher, manager, worker_id=None, concurrency=4, visibility=300,
+                 cooldown=600, layout="markdown", poll_seconds=5, patience=120):
+        self.work_queue = work_queue
+        self.fetcher = fetcher
+        self.manager = manager
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.visibility = visibility
+        self.cooldown = cooldown
+        self.layout = layout
+        self.poll_seconds = poll_seconds
+        self.patience = patience
+        self.held = set()
+        self.paused_until = 0
+        self.stop = asyncio.Event()
+        self.counts = {"stored": 0, "failed": 0, "crashed": 0, "denied": 0, "lost": 0}
+
+    async def call(self, method, *args):
+        return await call_with_retries(lambda: method(*args), self.patience)
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(self.visibility / 3)
+            if self.held:
+                urls = list(self.held)
+                held = await self.call(self.work_queue.heartbeat, self.worker_id, urls)
+                lost = (set(urls) - set(held)) & self.held
+                if lost:
+                    # Too slow, another worker may have it by now
+                    self.held -= lost
+                    self.counts["lost"] += len(lost)
+                    log.warning(f"⚠️ Lost the lease of {len(lost)} URLs.")
+
+    async def next_url(self):
+        """
+            Returns the next leased URL, or None once the queue is drained or the worker stops.
+        """
+        while not self.stop.is_set():
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(min(pause, self.poll_seconds))
+                continue
+            urls = await self.call(self.work_queue.lease, self.worker_id, 1)
+            if urls:
+                self.held.add(urls[0])
+                return urls[0]
+            counts = await self.call(self.work_queue.counts)
+            if not counts["queued"] and not counts["leased"]:
+                return None
+            # Leased by other workers, wait in case their leases expire
+            await asyncio.sleep(self.poll_seconds)
+        return None
+
+    async def run_page(self, page):
+        while True:
+            url = await self.next_url()
+            if url is None:
+                return
+            with traced(url, "scrape") as trace:
+                article = None
+                crashed = False
+                try:
+                    article = await scrape_article(count_ipc(page, trace), url, self.fetcher, layout=self.layout)
+                    outcome = "stored" if article else "failed"
+                except AccessDenied:
+                    outcome = "denied"
+                    if self.paused_until <= time.monotonic():
+                        log.error(f"🚫 This host is blocked, pausing for {self.cooldown}s while the others "
+                                  f"carry on.", extra={"url": url})
+                    self.paused_until = time.monotonic() + self.cooldown
+                finally:
+                    with stage("recycle"):
+                        page, crashed = await self.manager.refresh(page)
+                if crashed:
+                    outcome = "crashed"
+                note(outcome=outcome)
+                self.counts[outcome] += 1
+                with stage("store"):
+                    await self.call(self.work_queue.complete, self.worker_id, url, outcome,
+                                    article if outcome == "stored" else None)
+                self.held.discard(url)
+
+    async def run(self):
+        heartbeat = asyncio.create_task(self.heartbeat())
+        pages = [await self.manager.new_page() for _ in range(self.concurrency)]
+        try:
+            results = await asyncio.gather(*(self.run_page(page) for page in pages), return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+        for result in results:
+            if isinstance(result, BaseException):
+                log.error(f"❌ A queue worker stopped unexpectedly: {result}", exc_info=result)
+
+    def report(self):
+        counts = self.counts
+        with reporting() as report:
+            report.info(f"✅ Worker {self.worker_id}: {counts['stored']} articles reported, {counts['failed']} failed, "
+                        f"{counts['crashed']} crashed, {counts['denied']} denied, {counts['lost']} leases lost.")
+
+
+async def work(target, worker_id=None, concurrency=4, fetch_mode="auto", rate=5.0, burst=10, block_mode="on",
+               visibility=300, cooldown=600, cache_dir=cache_path, cache_size=2048, recycle_every=200,
+               memory_limit=2048, layout="markdown", trace_path=None, metrics_port=None, token=None):
+    """
+        Runs a worker on this host until the queue at `target` is drained.
+    """
+    await metrics.start_tracing(trace_path, metrics_port)
+    policy = BlockingPolicy(block_mode)
+    manager = await BrowserManager(headless=True, policy=policy, recycle_every=recycle_every,
+                                   memory_limit=memory_limit).start()
+    cache = PageCache(cache_dir, max_bytes=cache_size * 2 ** 20).open() if cache_dir else None
+    # The coordinator decides which articles changed, the worker always sends what it extracted
+    fetcher = await Fetcher(fetch_mode, max_connections=concurrency, limiter=RateLimiter(rate=rate, burst=burst),
+                            cache=cache).start()
+    work_queue = connect(target, visibility, token=token)
+    worker = QueueWorker(work_queue, fetcher, manager, worker_id, concurrency, visibility, cooldown, layout)
+    install_stop_handlers(worker.stop)
+    log.info(f"📮 Worker {worker.worker_id} taking URLs from {target}.")
+    try:
+        await worker.run()
+    finally:
+        remove_stop_handlers()
+        worker.report()
+        with reporting():
+            fetcher.report()
+            policy.report()
+            manager.report()
+        await work_queue.close()
+        await fetcher.close()
+        if cache is not None:
+            cache.close()
+        await manager.close()
+        await metrics.stop_tracing()
+
+
+def add(path=queue_path, urls_file=None, refresh=False):
+    """
+        Queues the URLs of `urls_file`, or the ones scraper.py would scrape.
+    """
+    if urls_file:
+        with open(urls_file, "r", encoding="utf-8") as f:
+            urls = set(canonicalize(line) for line in f if line.strip())
+    else:
+        with FreshnessIndex() as freshness:
+            urls = scraper.select_urls(freshness, refresh)
+            if freshness.removed:
+                compact(articles_path, drop=freshness.removed)
+    with WorkQueue(path) as work_queue:
+        added = work_queue.add(sorted(urls))
+        counts = work_queue.counts()
+    print(f"✅ Queued {added} of {len(urls)} URLs. Queue: {counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share the scraping between several hosts through a work queue.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="Queue URLs, by default the ones scraper.py would scrape.")
+    add_parser.add_argument("--file", default=None, help="Queue the URLs of this file instead.")
+    add_parser.add_argument("--refresh", action="store_true", help="Queue every content URL again.")
+
+    serve_parser = subparsers.add_parser("serve", help="Run the coordinator the workers connect to.")
+    serve_parser.add_argument("--host", default="127.0.0.1",
+                              help="Address to listen on, 0.0.0.0 for the workers on other hosts.")
+    serve_parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    serve_parser.add_argument("--keep-running", action="store_true",
+                              help="Keep serving when the queue is drained, e.g. to add more URLs.")
+
+    work_parser = subparsers.add_parser("work", help="Scrape URLs from the queue on this host.")
+    work_parser.add_argument("--queue", required=True, help="HOST:PORT of the coordinator or a shared database.")
+    work_parser.add_argument("--worker-id", default=None, help="Name of this worker, hostname-pid by default.")
+    work_parser.add_argument("--concurrency", type=int, default=4, help="Number of pages scraping in parallel.")
+    work_parser.add_argument("--fetch", choices=["auto", "http", "browser"], default="auto",
+                             help="auto: plain HTTP with browser fallback, http/browser: force one engine.")
+    work_parser.add_argument("--rate", type=positive_rate, default=5.0, help="Initial requests per second from this host.")
+    work_parser.add_argument("--burst", type=int, default=10, help="Requests allowed in a burst from this host.")
+    work_parser.add_argument("--block", choices=["on", "off", "observe"], default="on",
+                             help="Request blocking in the browser, observe only measures what it would save.")
+    work_parser.add_argument("--cooldown", type=float, default=600, help="Seconds to pause after a 403.")
+    work_parser.add_argument("--no-cache", action="store_true", help="Do not keep the fetched HTML.")
+    work_parser.add_argument("--recycle-every", type=int, default=200, help="Open a fresh page after N navigations.")
+    work_parser.add_argument("--memory-limit", type=int, default=2048,
+                             help="Restart the browser above this many MB (needs psutil, 0 disables).")
+    work_parser.add_argument("--layout", choices=layouts, default="markdown",
+                             help="Article content as one markdown string or as the nested section tree.")
+    work_parser.add_argument("--trace", default=None, help="Write per-URL stage timings to this JSONL file.")
+    work_parser.add_argument("--metrics-port", type=int, default=None,
+                             help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics while running.")
+
+    subparsers.add_parser("status", help="Show the state of the queue.")
+    subparsers.add_parser("collect", help="Move the reported articles of a shared database into the store.")
+
+    for subparser in [serve_parser, work_parser]:
+        subparser.add_argument("--token", default=os.environ.get("WORK_QUEUE_TOKEN"),
+                               help="Shared secret of the coordinator and its workers, WORK_QUEUE_TOKEN by default.")
+        subparser.add_argument("--visibility", type=float, default=300,
+                               help="Seconds a lease lasts without a heartbeat.")
+        subparser.add_argument("--log-level", choices=log_levels, default="INFO",
+                               help="WARNING keeps only problems and the final reports.")
+        subparser.add_argument("--log-format", choices=["text", "json"], default="text", help="Format of the log file.")
+    serve_parser.add_argument("--max-attempts", type=int, default=3, help="Leases per URL before it fails.")
+    parser.add_argument("--db", default=queue_path, help="The queue database.")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        add(args.db, args.file, args.refresh)
+    elif args.command == "status":
+        with WorkQueue(args.db) as work_queue:
+            print(f"📮 Queue: {work_queue.counts()}, workers holding leases: {work_queue.workers()}")
+    elif args.command == "collect":
+        with WorkQueue(args.db) as work_queue:
+            print(f"✅ Added {collect_into_store(work_queue)} articles to {articles_path}.")
+    else:
+        setup_logging(f"work_queue.{args.command}", args.log_level, args.log_format)
+        try:
+            if args.command == "serve":
+                asyncio.run(serve(args.host, args.port, args.db, args.visibility, args.max_attempts,
+                                  until_done=not args.keep_running, token=args.token))
+            else:
+                metrics.run(work(args.queue, worker_id=args.worker_id, concurrency=max(1, args.concurrency),
+                                 fetch_mode=args.fetch, rate=args.rate, burst=args.burst, block_mode=args.block,
+                                 visibility=args.visibility, cooldown=args.cooldown,
+                                 cache_dir=None if args.no_cache else cache_path, recycle_every=args.recycle_every,
+                                 memory_limit=args.memory_limit, layout=args.layout, trace_path=args.trace,
+                                 metrics_port=args.metrics_port, token=args.token))
+        finally:
+            stop_logging()